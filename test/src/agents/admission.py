@@ -0,0 +1,253 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+from utils.logger import LOG
+from utils.metrics import LATENCY_BUCKETS, metrics
+
+from .cancellation import GenerationCancelled, current_token
+
+# 优先级（从高到低）：交互请求（对话、单词、出题）、批量任务（作文精进、评分）、后台任务（预取、摘要）
+INTERACTIVE = "interactive"
+BULK = "bulk"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BULK, BACKGROUND)
+
+# 模型调用准入配置（可通过环境变量覆盖）
+# 同时发往模型的请求数上限，宜与 Ollama 的 OLLAMA_NUM_PARALLEL 一致；0 表示不限制
+MAX_CONCURRENCY = int(os.getenv("TIRO_LLM_MAX_CONCURRENCY", "4"))
+# 批量与后台任务最多占用的并发数，其余留给交互请求，使长时间的精进不会占满全部并发
+BULK_SLOTS = int(os.getenv("TIRO_LLM_BULK_SLOTS", str(max(MAX_CONCURRENCY - 1, 1))))
+BACKGROUND_SLOTS = int(os.getenv("TIRO_LLM_BACKGROUND_SLOTS", "1"))
+
+metrics.histogram("tiro_admission_wait_seconds", LATENCY_BUCKETS, "模型调用在准入队列中的等待时间")
+metrics.gauge("tiro_admission_queue_depth", "准入队列中等待的模型调用数")
+metrics.gauge("tiro_admission_active", "已准入、正在进行的模型调用数")
+
+def session_key(session_id: str) -> str:
+    """按用户公平排队：去掉 Agent 会话ID中的 Agent 前缀（"agent:用户会话"），同一用户的各个 Agent 共用一个队列"""
+    return (session_id or "").split(":", 1)[-1]
+
+
+class _Waiter:
+    """准入队列中的一次等待；wake 在准入或取消时被调用"""
+    __slots__ = ("priority", "session", "enqueued", "granted", "wake")
+
+    def __init__(self, priority: str, session: str):
+        self.priority = priority
+        self.session = session
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.wake = None
+
+
+class AdmissionController:
+    """
+    模型调用的准入控制：限制同时发往模型的请求数，按优先级放行，
+    同一优先级内按用户会话轮流放行，避免一位用户的多轮精进挤占其他用户的单轮对话。
+    同步调用（线程中）与异步调用（事件循环中）共用同一组队列。
+    """
+    def __init__(self, limit=MAX_CONCURRENCY, class_limits=None):
+        self.limit = limit
+        self.class_limits = class_limits or {INTERACTIVE: limit, BULK: BULK_SLOTS, BACKGROUND: BACKGROUND_SLOTS}
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}  # 会话 -> 等待者队列
+        self._active = {priority: 0 for priority in PRIORITIES}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    def configure(self, limit: int, class_limits: dict = None) -> None:
+        """
+        调整并发上限（如独立运行的批量脚本按自身的并发数设置），并放行因此可以开始的等待者。
+        交互请求的上限随之调整，class_limits 覆盖其他优先级的上限。
+        """
+        with self._lock:
+            self.limit = limit
+            self.class_limits = {**self.class_limits, INTERACTIVE: limit, **(class_limits or {})}
+            granted = self._dispatch()
+            self._publish()
+        for other in granted:
+            other.wake()
+
+    def snapshot(self) -> dict:
+        """各优先级的排队数与进行中的调用数"""
+        with self._lock:
+            return {
+                priority: {
+                    "queued": sum(len(waiters) for waiters in self._queues[priority].values()),
+                    "active": self._active[priority],
+                }
+                for priority in PRIORITIES
+            }
+
+    def _publish(self) -> None:
+        # 持有 self._lock 时调用
+        for priority in PRIORITIES:
+            queued = sum(len(waiters) for waiters in self._queues[priority].values())
+            metrics.set_gauge("tiro_admission_queue_depth", queued, priority=priority)
+            metrics.set_gauge("tiro_admission_active", self._active[priority], priority=priority)
+
+    def _dispatch(self) -> list:
+        """
+        按优先级放行等待者，直到达到并发上限（持有 self._lock 时调用）。
+        返回:
+            list: 本次放行的等待者（在锁外唤醒）
+        """
+        granted = []
+        while sum(self._active.values()) < self.limit:
+            for priority in PRIORITIES:
+                if self._queues[priority] and self._active[priority] < self.class_limits.get(priority, self.limit):
+                    break
+            else:
+                break
+            sessions = self._queues[priority]
+            session, waiters = next(iter(sessions.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                sessions.move_to_end(session)  # 该会话的下一个请求排到其他会话之后
+            else:
+                del sessions[session]
+            self._active[priority] += 1
+            waiter.granted = True
+            granted.append(waiter)
+        return granted
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._queues[waiter.priority].setdefault(waiter.session, deque()).append(waiter)
+            granted = self._dispatch()
+            self._publish()
+        for other in granted:
+            other.wake()
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """
+        放弃等待（被取消）。已在此之前被放行时返回 True，由调用方负责释放。
+        """
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiters = self._queues[waiter.priority].get(waiter.session)
+            if waiters is not None and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._queues[waiter.priority][waiter.session]
+            self._publish()
+        return False
+
+    def _admitted(self, waiter: _Waiter) -> None:
+        wait = time.monotonic() - waiter.enqueued
+        metrics.observe("tiro_admission_wait_seconds", wait, priority=waiter.priority)
+        metrics.inc("tiro_admission_total", priority=waiter.priority)
+        if wait >= 1:
+            LOG.debug(f"[Admission] {waiter.priority} 请求（会话 {waiter.session}）排队 {wait:.2f}s 后开始")
+
+    def _release(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._active[waiter.priority] -= 1
+            granted = self._dispatch()
+            self._publish()
+        for other in granted:
+            other.wake()
+
+    def _acquire(self, priority: str, session: str) -> _Waiter:
+        token = current_token()
+        if token is not None:
+            token.raise_if_cancelled()
+        waiter = _Waiter(priority, session_key(session))
+        event = threading.Event()
+        waiter.wake = event.set
+        self._enqueue(waiter)
+        if not waiter.granted:
+            remove = token.add_callback(event.set) if token is not None else (lambda: None)
+            try:
+                event.wait()
+            finally:
+                remove()
+            if not self._abandon(waiter):
+                raise GenerationCancelled(token.name if token is not None else "")
+        self._admitted(waiter)
+        return waiter
+
+    async def _aacquire(self, priority: str, session: str) -> _Waiter:
+        token = current_token()
+        if token is not None:
+            token.raise_if_cancelled()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve():
+            if not future.done():
+                future.set_result(None)
+
+        waiter = _Waiter(priority, session_key(session))
+        waiter.wake = lambda: loop.call_soon_threadsafe(resolve)
+        self._enqueue(waiter)
+        if not waiter.granted:
+            remove = token.add_callback(waiter.wake) if token is not None else (lambda: None)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if self._abandon(waiter):
+                    self._release(waiter)
+                raise
+            finally:
+                remove()
+            if not self._abandon(waiter):
+                raise GenerationCancelled(token.name if token is not None else "")
+        self._admitted(waiter)
+        return waiter
+
+    @contextmanager
+    def slot(self, priority: str = INTERACTIVE, session: str = None, held: _Waiter = None):
+        """
+        占用一个模型并发名额执行代码块（同步调用，排队时阻塞当前线程），代码块中可取得所占的名额。
+        排队期间当前请求被取消时抛出 GenerationCancelled。
+        held 为调用方已持有的名额（外层 slot 产出的值）：嵌套调用显式传入时直接复用、不再排队，
+        避免外层占着名额等待内层排队，名额被占满时互相等待；未传入的调用总是排队。
+        """
+        if not self.enabled or held is not None:
+            yield held
+            return
+        waiter = self._acquire(priority, session)
+        try:
+            yield waiter
+        finally:
+            self._release(waiter)
+
+    @asynccontextmanager
+    async def aslot(self, priority: str = INTERACTIVE, session: str = None, held: _Waiter = None):
+        """slot 的异步版本：排队时不占用线程"""
+        if not self.enabled or held is not None:
+            yield held
+            return
+        waiter = await self._aacquire(priority, session)
+        try:
+            yield waiter
+        finally:
+            self._release(waiter)
+
+    def admitted_stream(self, chunks, priority: str = INTERACTIVE, session: str = None, held: _Waiter = None):
+        """
+        在准入后才开始迭代模型的流式输出，流结束或提前关闭时释放名额（held 见 slot）。
+        """
+        with self.slot(priority, session, held):
+            yield from chunks
+
+    async def aadmitted_stream(self, chunks, priority: str = INTERACTIVE, session: str = None, held: _Waiter = None):
+        """admitted_stream 的异步版本"""
+        async with self.aslot(priority, session, held):
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()  # 提前关闭时一并关闭上游流
+
+
+# 进程内共享的准入控制
+admission = AdmissionController()
@@ -1,23 +1,51 @@
+import asyncio
 import json
+import os
+import time
 from abc import ABC, abstractmethod
+from contextlib import aclosing
 
-from langchain_ollama.chat_models import ChatOllama  # 导入 ChatOllama 模型
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder  # 导入提示模板相关类
-from langchain_core.messages import HumanMessage  # 导入消息类
+from langchain_core.messages import AIMessage, HumanMessage  # 导入消息类
+from langchain_core.runnables import RunnableLambda  # 导入按调用选择模型的可运行类
 from langchain_core.runnables.history import RunnableWithMessageHistory  # 导入带有消息历史的可运行类
 
 from .session_history import get_session_history  # 导入会话历史相关方法
+from .history_window import DEFAULT_TOKEN_BUDGET, HistoryWindow, estimate_tokens  # 导入历史窗口裁剪
+from .model_registry import (  # 导入共享模型客户端
+    DEFAULT_MODEL_SETTINGS,
+    SUPPORTS_REASONING_SWITCH,
+    get_chat_model,
+)
+from .model_routing import model_router  # 导入按 Agent 与任务的模型路由
+from .model_lifecycle import model_lifecycle  # 导入模型预热与常驻管理
+from .reasoning import create_think_filter  # 导入推理片段过滤
+from .response_cache import cache_scope, make_cache_key, response_cache  # 导入响应缓存
+from .prefetch import activity  # 导入前台活跃度（供后台预取判断空闲）
+from .refinement import RefinementStopper, parse_score  # 导入多轮精进的提前停止
+from .call_metrics import LLMCallTracker, atracked_stream, tracked_stream  # 导入调用指标
+from .cancellation import acancellable_stream, cancellable_stream, raise_if_cancelled  # 导入请求取消
+from .admission import admission  # 导入模型调用准入控制
+from .deadlines import aguarded_stream, guarded_stream, is_partial  # 导入调用时限、降级与熔断
 from utils.logger import LOG  # 导入日志工具
 
 class AgentBase(ABC):
     """
     抽象基类，提供代理的共有功能。
     """
+    # 每次调用随提示发送的历史 token 上限，子类可按需覆盖；None 表示不裁剪
+    history_token_budget = DEFAULT_TOKEN_BUDGET
+    # 是否让模型输出推理过程（<think>），子类可按需覆盖；关闭时可大幅减少生成的 token
+    reasoning = os.getenv("TIRO_REASONING", "0") == "1"
+    # 调用未指定任务时使用的路由任务（决定模型与生成 token 上限），子类可按需覆盖
+    default_task = "chat"
+
     def __init__(self, name, prompt_file,  session_id=None):
         self.name = name
         self.prompt_file = prompt_file
         self.session_id = session_id if session_id else self.name
         self.prompt = self.load_prompt()
+        self.history_window = HistoryWindow(self.history_token_budget, summarizer=self.summarize)
         self.create_chatbot()
 
     def load_prompt(self):
@@ -30,27 +58,131 @@ class AgentBase(ABC):
         except FileNotFoundError:
             raise FileNotFoundError(f"找不到提示文件 {self.prompt_file}!")
 
+    def session_for(self, user_session=None):
+        """
+        根据浏览器会话标识生成本 Agent 使用的历史会话ID，使不同用户的历史互不混淆。
+        参数:
+            user_session (str, optional): 用户（浏览器）会话标识
+        返回:
+            str: 本 Agent 在该用户下的会话ID；未提供时退回默认会话ID
+        """
+        if not user_session:
+            return self.session_id
+        return f"{self.name}:{user_session}"
+
+    def get_history(self, session_id: str):
+        """
+        获取发送给模型的会话历史：超出 token 预算的旧对话以摘要代替。
+        """
+        return self.history_window.wrap(get_session_history(session_id))
+
     def create_chatbot(self):
         """
         初始化聊天机器人，包括系统提示和消息历史记录。
         """
+        self.model_name = self.model_for(self.default_task)
+        self.model_settings = {**DEFAULT_MODEL_SETTINGS, "reasoning": self.reasoning}
+        model_lifecycle.register(self.model_name)  # 保持该模型常驻内存
+
+        system_text = self.prompt
+        if not self.reasoning and not SUPPORTS_REASONING_SWITCH and self.model_name.startswith("qwen3"):
+            # 后端不支持关闭推理时，使用 qwen3 的 /no_think 软开关
+            system_text += "\n/no_think"
+
         # 创建聊天提示模板，包括系统提示和消息占位符
         system_prompt = ChatPromptTemplate.from_messages([
-            ("system", self.prompt),  # 系统提示部分
+            ("system", system_text),  # 系统提示部分
             MessagesPlaceholder(variable_name="messages"),  # 消息占位符
         ])
 
-        # 初始化 ChatOllama 模型，配置参数
-        self.chatbot = system_prompt | ChatOllama(
-            model="qwen3:latest",  # 使用的模型名称
-            max_tokens=8192,  # 最大生成的 token 数
-            temperature=0.8,  # 随机性配置
+        # 每次调用按任务与提示长度从共享注册表借用 ChatOllama 模型（复用连接池），
+        # 并在模型之后流式去掉 <think> 片段，使其不进入历史、日志与界面
+        self.chatbot = (
+            system_prompt
+            | RunnableLambda(self._route_model)
+            | create_think_filter()
+        )
+
+        # 历史摘要不带本 Agent 的系统提示，同样按 summary 任务路由
+        self.summary_chain = (
+            ChatPromptTemplate.from_messages([MessagesPlaceholder(variable_name="messages")])
+            | RunnableLambda(self._route_model)
+            | create_think_filter()
         )
 
         # 将聊天机器人与消息历史记录关联
-        self.chatbot_with_history = RunnableWithMessageHistory(self.chatbot, get_session_history)
+        self.chatbot_with_history = RunnableWithMessageHistory(self.chatbot, self.get_history)
+
+    def route(self, task: str = None, prompt_tokens: int = None, model: str = None):
+        """
+        按任务选择模型与生成参数；model 用于改用其他模型（如降级重试）。
+        返回:
+            tuple: (模型名称, 生成参数)；参数中的 num_ctx 为该模型的固定值或按提示 token 数估算的值
+        """
+        model, settings = model_router.settings_for(
+            self.name, task or self.default_task, prompt_tokens, self.reasoning, model
+        )
+        return model, {**self.model_settings, **settings}
+
+    def model_for(self, task: str = None) -> str:
+        return model_router.resolve(self.name, task or self.default_task)["model"]
+
+    def _route_model(self, prompt_value, config):
+        """
+        链中的模型选择：按调用配置中的任务与完整提示（含系统提示与历史）的长度借用模型；
+        配置中指定了 model（如降级重试）时改用该模型，生成参数沿用该任务的设置（num_ctx 按实际使用的模型确定）。
+        """
+        configurable = config.get("configurable", {})
+        prompt_tokens = sum(estimate_tokens(str(message.content)) for message in prompt_value.to_messages())
+        model, settings = self.route(configurable.get("task"), prompt_tokens, configurable.get("model"))
+        model_lifecycle.register(model)
+        return get_chat_model(model, **settings)
+
+    def new_tracker(self, session_id: str, kind: str, messages=None, task: str = None, model: str = None,
+                    created: float = None) -> LLMCallTracker:
+        """
+        为一次模型调用创建指标记录（等待、首 token、总耗时与 token 用量）。
+        """
+        return LLMCallTracker(self.name, session_id, model or self.model_for(task), kind, messages, created)
+
+    def priority_for(self, task: str = None) -> str:
+        """准入优先级：按任务路由（如作文与点评为批量任务、摘要为后台任务）"""
+        return model_router.priority_for(self.name, task or self.default_task)
+
+    def _stream(self, runnable, messages: list, config: dict, kind: str, session_id: str = None, task: str = None,
+                priority: str = None, held=None):
+        """
+        发起一次流式模型调用：准入排队后才发出请求，按任务的时限降级或返回部分结果，逐块响应取消并记录指标。
+        priority 为空时按任务路由的优先级排队；held 为调用方已持有的准入名额（嵌套调用时显式传入，不再排队）。
+        """
+        route = model_router.resolve(self.name, task or self.default_task)
+        created = time.monotonic()
+
+        def attempt(model):
+            tracker = self.new_tracker(session_id, kind, messages, task, model, created)
+            attempt_config = {**config, "configurable": {**config["configurable"], "model": model}}
+            return tracked_stream(cancellable_stream(runnable.stream(messages, attempt_config)), tracker), tracker
+
+        chunks = guarded_stream(attempt, route["model"], route["fallback"], route["ttft_timeout"], route["timeout"])
+        return admission.admitted_stream(chunks, priority or route["priority"], session_id, held)
+
+    def _astream(self, runnable, messages: list, config: dict, kind: str, session_id: str = None, task: str = None,
+                 priority: str = None, held=None):
+        """
+        _stream 的异步版本，返回异步生成器。
+        """
+        route = model_router.resolve(self.name, task or self.default_task)
+        created = time.monotonic()
+
+        def attempt(model):
+            tracker = self.new_tracker(session_id, kind, messages, task, model, created)
+            attempt_config = {**config, "configurable": {**config["configurable"], "model": model}}
+            return atracked_stream(acancellable_stream(runnable.astream(messages, attempt_config)), tracker), tracker
 
-    def chat_with_history(self, user_input, session_id=None):
+        chunks = aguarded_stream(attempt, route["model"], route["fallback"], route["ttft_timeout"], route["timeout"])
+        return admission.aadmitted_stream(chunks, priority or route["priority"], session_id, held)
+
+    def chat_with_history(self, user_input, session_id=None, task=None):
         """
         处理用户输入，生成包含聊天历史的回复。
         参数:
@@ -64,18 +196,22 @@ class AgentBase(ABC):
             session_id = self.session_id
         
 
-        response = self.chatbot_with_history.invoke(
-            [HumanMessage(content=user_input)],  # 将用户输入封装为 HumanMessage
-            {"configurable": {"session_id": session_id}, # 传入配置，包括会话ID
-             "hide_chain_of_thought": True  # 强制隐藏思维链
-            }, 
-        )
+        messages = [HumanMessage(content=user_input)]  # 将用户输入封装为 HumanMessage
+        raise_if_cancelled()
+        with activity.track():
+            # 以流式调用并拼接，与流式接口共用时限、降级与熔断
+            chunks = self._stream(
+                self.chatbot_with_history, messages,
+                {"configurable": {"session_id": session_id, "task": task}},  # 传入配置，包括会话ID与任务
+                "invoke", session_id, task,
+            )
+            content = "".join(chunk.content for chunk in chunks)
 
-        LOG.debug(f"[ChatBot][{self.name}] {response.content}")  # 记录调试日志
-        return response.content  # 返回生成的回复内容
+        LOG.debug(f"[ChatBot][{self.name}] {content}")  # 记录调试日志
+        return content  # 返回生成的回复内容
 
 
-    def stream_with_history(self, messages: list, session_id: str = None):
+    def stream_with_history(self, messages: list, session_id: str = None, task: str = None):
         """
         以流式方式处理用户输入，返回生成器形式的逐步输出。
         """
@@ -84,29 +220,34 @@ class AgentBase(ABC):
             session_id = self.session_id
 
         # 生成器返回逐块结果
-        stream = self.chatbot_with_history.stream(
-            messages,
-            {
-                "configurable": {"session_id": session_id},
-                "hide_chain_of_thought": True
-            }
-        )
+        with activity.track():
+            stream = self._stream(
+                self.chatbot_with_history, messages, {"configurable": {"session_id": session_id, "task": task}},
+                "stream", session_id, task,
+            )
 
-        for chunk in stream:
-            yield chunk
+            for chunk in stream:
+                yield chunk
 
 
-    def stream_response_text(self, messages: list, session_id: str = None) -> str:
+    def stream_deltas(self, messages: list, session_id: str = None, task: str = None):
+        """
+        调用 stream 接口，逐块产出文本增量（str），供界面实时展示。
+        """
+        for chunk in self.stream_with_history(messages, session_id, task):
+            if chunk.content:
+                yield chunk.content
+
+
+    def stream_response_text(self, messages: list, session_id: str = None, task: str = None) -> str:
         """
         调用 stream 接口，并返回拼接后的完整文本内容。
         """
         if session_id is None:
             session_id = self.session_id
 
-        output = ""
-        for chunk in self.stream_with_history(messages, session_id):
-            output += chunk.content
-        return output
+        # 先收集全部文本块再一次性拼接，避免重复复制字符串
+        return "".join(self.stream_deltas(messages, session_id, task))
 
 
     def stream_to_markdown(self, messages: list, title: str, session_id: str = None) -> str:
@@ -116,67 +257,378 @@ class AgentBase(ABC):
         text = self.stream_response_text(messages, session_id)
         return f"### {title}\n{text.strip()}"
 
+    def cache_key(self, messages: list, task: str = None, scope: str = None) -> str:
+        """
+        计算响应缓存键：包含 Agent、系统提示、任务路由的模型与生成参数、输入消息，
+        以及按会话缓存的任务所属的会话（scope）。
+        """
+        model, settings = self.route(task)
+        return make_cache_key(self.name, self.prompt, model, settings, messages, scope)
+
+    def record_exchange(self, messages: list, text: str, session_id: str = None) -> None:
+        """
+        把一次不经过历史的问答（缓存命中、预取结果等）补记到会话历史中。
+        参数:
+            messages (list): 输入消息
+            text (str): 回复文本
+            session_id (str, optional): 会话ID，为 None 时不记录
+        """
+        if session_id is not None:
+            get_session_history(session_id).add_messages(list(messages) + [AIMessage(content=text)])
+
+    def cached_stream_deltas(self, messages: list, session_id: str = None, refresh: bool = False, ttl: float = None,
+                             task: str = None):
+        """
+        可缓存的流式生成，只应在调用处为确定性提示显式选用，对话轮次不要使用。
+        提示不带会话历史发送；命中缓存时一次性产出完整文本；相同请求正在生成时共享其结果。
+        出题、生成单词等带随机性的任务（response_cache.SESSION_SCOPED_TASKS）只在同一会话内缓存。
+        参数:
+            messages (list): 输入消息
+            session_id (str, optional): 提供时把本次问答记入该会话历史
+            refresh (bool): 为 True 时忽略已有缓存，重新生成并覆盖
+            ttl (float, optional): 本条缓存的有效期（秒）
+        """
+        scope = cache_scope(task, session_id)
+        key = self.cache_key(messages, task, scope)
+        leader = False
+        text = None if refresh else response_cache.get(key)
+        if text is None:
+            future, leader = response_cache.begin(key)
+            if not leader:
+                try:
+                    text = future.result()
+                except Exception:
+                    text = None  # 共享的那次生成失败，自行生成
+
+        if text is not None:
+            yield text
+        else:
+            parts = []
+            partial = False
+            try:
+                with activity.track():
+                    for chunk in self._stream(self.chatbot, messages, {"configurable": {"task": task}},
+                                              "cached", session_id, task):
+                        partial = partial or is_partial(chunk)
+                        if chunk.content:
+                            parts.append(chunk.content)
+                            yield chunk.content
+            except BaseException as e:
+                if leader:
+                    response_cache.fail(key, e)
+                raise
+            text = "".join(parts)
+            if leader and partial:
+                response_cache.fail(key, RuntimeError("生成超时或中断，只有部分结果"))  # 不缓存不完整的结果
+            elif leader:
+                response_cache.complete(key, text, ttl, scoped=scope is not None)
+
+        self.record_exchange(messages, text, session_id)
+
+    def cached_response_text(self, messages: list, session_id: str = None, refresh: bool = False, ttl: float = None,
+                             task: str = None) -> str:
+        """
+        cached_stream_deltas 的整段文本版本。
+        """
+        return "".join(self.cached_stream_deltas(messages, session_id, refresh, ttl, task))
+
+    def generate_text(self, messages: list, task: str = None, priority: str = None, held=None) -> str:
+        """
+        不带会话历史、不经缓存的一次性生成，供后台预取、卡片修复与批量评分等使用（不计入前台活跃度）。
+        priority 为空时按任务路由排队；后台预取应传入 BACKGROUND。held 见 _stream。
+        """
+        chunks = self._stream(self.chatbot, messages, {"configurable": {"task": task}}, "generate", task=task,
+                              priority=priority, held=held)
+        return "".join(chunk.content for chunk in chunks)
+
+    def summarize(self, prompt: str, session_id: str = None) -> str:
+        """
+        为历史窗口生成摘要：与其他调用一样经过准入（后台优先级）、时限、降级与调用指标。
+        超时只得到部分结果时返回空字符串（不保存不完整的摘要）。
+        """
+        chunks = list(self._stream(
+            self.summary_chain, [HumanMessage(content=prompt)], {"configurable": {"task": "summary"}}, "summary",
+            session_id, task="summary",
+        ))
+        if any(is_partial(chunk) for chunk in chunks):
+            return ""
+        return "".join(chunk.content for chunk in chunks).strip()
+
     def multi_round_response_text(
         self,
         user_input: str,
         reflection_agent,
-        max_rounds: int = 3
+        max_rounds: int = 3,
+        user_session: str = None
         ) -> str:
         """
         多轮生成 + 反思（文本），作为 stream_response_text 的多轮版本。
         """
 
         current_input = user_input
-        all_output = ""
+        outputs = []
+        stopper = RefinementStopper(max_rounds, pipeline=self.name)  # 评分达标或不再提升时提前结束
 
         for i in range(1, max_rounds + 1):
+            stopper.begin_round()
             # 写作生成
-            article = self.stream_response_text([HumanMessage(content=current_input)])
+            article = self.stream_response_text(
+                [HumanMessage(content=current_input)], self.session_for(user_session)
+            )
 
             # 反思反馈
             reflection = reflection_agent.stream_response_text([
                 HumanMessage(content=user_input),
                 HumanMessage(content=article)
-            ])
+            ], reflection_agent.session_for(user_session))
 
             # 收集内容
-            all_output += f"[第{i}轮 写作]\n{article.strip()}\n\n[第{i}轮 反思]\n{reflection.strip()}\n\n"
+            outputs.append(f"[第{i}轮 写作]\n{article.strip()}\n\n[第{i}轮 反思]\n{reflection.strip()}\n\n")
+            if stopper.should_stop(parse_score(reflection)):
+                break
 
             # 生成下一轮输入
             current_input = f"{user_input}\n\nAI 改进稿：\n{article}\n\n请根据上面的反思优化文章。"
 
-        return all_output.strip()
+        outputs.append(stopper.summary())
+        return "".join(outputs).strip()
 
 
     def multi_round_to_markdown(
         self,
         user_input: str,
         reflection_agent,
-        max_rounds: int = 3
+        max_rounds: int = 3,
+        user_session: str = None
         ) -> str:
         """
         多轮生成 + 反思（Markdown），作为 stream_to_markdown 的多轮版本。
         """
 
         current_input = user_input
-        all_md = ""
+        sections = []
+        stopper = RefinementStopper(max_rounds, pipeline=self.name)  # 评分达标或不再提升时提前结束
 
         for i in range(1, max_rounds + 1):
+            stopper.begin_round()
             # 写作 Markdown
-            article = self.stream_response_text([HumanMessage(content=current_input)])
+            article = self.stream_response_text(
+                [HumanMessage(content=current_input)], self.session_for(user_session)
+            )
             article_md = f"### 第{i}轮 ✍️ 写作生成\n{article.strip()}"
 
             # 反思 Markdown
             reflection = reflection_agent.stream_response_text([
                 HumanMessage(content=user_input),
                 HumanMessage(content=article)
-            ])
+            ], reflection_agent.session_for(user_session))
             reflection_md = f"### 第{i}轮 💬 反思点评\n{reflection.strip()}"
 
             # 合并
-            all_md += f"{article_md}\n\n{reflection_md}\n\n"
+            sections.append(f"{article_md}\n\n{reflection_md}\n\n")
+            if stopper.should_stop(parse_score(reflection)):
+                break
 
             # 生成下一轮输入
             current_input = f"{user_input}\n\nAI 改进稿：\n{article}\n\n请根据上面的反思优化文章。"
 
-        return all_md.strip()
+        sections.append(stopper.summary())
+        return "".join(sections).strip()
+
+
+    # ==== 异步接口：基于 Runnable 的 ainvoke / astream，不为每个等待中的请求占用线程 ====
+
+    async def achat_with_history(self, user_input, session_id=None, task=None):
+        """
+        chat_with_history 的异步版本。
+        """
+        if session_id is None:
+            session_id = self.session_id
+
+        messages = [HumanMessage(content=user_input)]
+        raise_if_cancelled()
+        with activity.track():
+            chunks = self._astream(
+                self.chatbot_with_history, messages, {"configurable": {"session_id": session_id, "task": task}},
+                "invoke", session_id, task,
+            )
+            async with aclosing(chunks):
+                content = "".join([chunk.content async for chunk in chunks])
+
+        LOG.debug(f"[ChatBot][{self.name}] {content}")
+        return content
+
+
+    async def astream_with_history(self, messages: list, session_id: str = None, task: str = None):
+        """
+        stream_with_history 的异步版本，返回异步生成器。
+        """
+        if session_id is None:
+            session_id = self.session_id
+
+        with activity.track():
+            stream = self._astream(
+                self.chatbot_with_history, messages, {"configurable": {"session_id": session_id, "task": task}},
+                "stream", session_id, task,
+            )
+
+            async with aclosing(stream):  # 提前结束时立即释放准入名额
+                async for chunk in stream:
+                    yield chunk
+
+
+    async def astream_deltas(self, messages: list, session_id: str = None, task: str = None):
+        """
+        stream_deltas 的异步版本，逐块产出文本增量（str）。
+        """
+        async for chunk in self.astream_with_history(messages, session_id, task):
+            if chunk.content:
+                yield chunk.content
+
+
+    async def astream_response_text(self, messages: list, session_id: str = None, task: str = None) -> str:
+        """
+        stream_response_text 的异步版本。
+        """
+        parts = [delta async for delta in self.astream_deltas(messages, session_id, task)]
+        return "".join(parts)
+
+
+    async def astream_to_markdown(self, messages: list, title: str, session_id: str = None) -> str:
+        """
+        stream_to_markdown 的异步版本。
+        """
+        text = await self.astream_response_text(messages, session_id)
+        return f"### {title}\n{text.strip()}"
+
+
+    async def acached_stream_deltas(self, messages: list, session_id: str = None, refresh: bool = False, ttl: float = None,
+                                    task: str = None):
+        """
+        cached_stream_deltas 的异步版本。
+        """
+        scope = cache_scope(task, session_id)
+        key = self.cache_key(messages, task, scope)
+        leader = False
+        text = None if refresh else response_cache.get(key)
+        if text is None:
+            future, leader = response_cache.begin(key)
+            if not leader:
+                try:
+                    text = await asyncio.wrap_future(future)
+                except Exception:
+                    text = None
+
+        if text is not None:
+            yield text
+        else:
+            parts = []
+            partial = False
+            try:
+                stream = self._astream(self.chatbot, messages, {"configurable": {"task": task}}, "cached", session_id, task)
+                with activity.track():
+                    async with aclosing(stream):
+                        async for chunk in stream:
+                            partial = partial or is_partial(chunk)
+                            if chunk.content:
+                                parts.append(chunk.content)
+                                yield chunk.content
+            except BaseException as e:
+                if leader:
+                    response_cache.fail(key, e)
+                raise
+            text = "".join(parts)
+            if leader and partial:
+                response_cache.fail(key, RuntimeError("生成超时或中断，只有部分结果"))
+            elif leader:
+                response_cache.complete(key, text, ttl, scoped=scope is not None)
+
+        self.record_exchange(messages, text, session_id)
+
+
+    async def acached_response_text(self, messages: list, session_id: str = None, refresh: bool = False, ttl: float = None,
+                                    task: str = None) -> str:
+        """
+        acached_stream_deltas 的整段文本版本。
+        """
+        parts = [delta async for delta in self.acached_stream_deltas(messages, session_id, refresh, ttl, task)]
+        return "".join(parts)
+
+
+    async def agenerate_text(self, messages: list, task: str = None, priority: str = None, held=None) -> str:
+        """
+        generate_text 的异步版本。
+        """
+        chunks = self._astream(self.chatbot, messages, {"configurable": {"task": task}}, "generate", task=task,
+                               priority=priority, held=held)
+        parts = [chunk.content async for chunk in chunks]
+        return "".join(parts)
+
+
+    async def amulti_round_response_text(
+        self,
+        user_input: str,
+        reflection_agent,
+        max_rounds: int = 3,
+        user_session: str = None
+        ) -> str:
+        """
+        multi_round_response_text 的异步版本。
+        """
+        current_input = user_input
+        outputs = []
+        stopper = RefinementStopper(max_rounds, pipeline=self.name)  # 评分达标或不再提升时提前结束
+
+        for i in range(1, max_rounds + 1):
+            stopper.begin_round()
+            article = await self.astream_response_text(
+                [HumanMessage(content=current_input)], self.session_for(user_session)
+            )
+            reflection = await reflection_agent.astream_response_text([
+                HumanMessage(content=user_input),
+                HumanMessage(content=article)
+            ], reflection_agent.session_for(user_session))
+
+            outputs.append(f"[第{i}轮 写作]\n{article.strip()}\n\n[第{i}轮 反思]\n{reflection.strip()}\n\n")
+            if stopper.should_stop(parse_score(reflection)):
+                break
+            current_input = f"{user_input}\n\nAI 改进稿：\n{article}\n\n请根据上面的反思优化文章。"
+
+        outputs.append(stopper.summary())
+        return "".join(outputs).strip()
+
+
+    async def amulti_round_to_markdown(
+        self,
+        user_input: str,
+        reflection_agent,
+        max_rounds: int = 3,
+        user_session: str = None
+        ) -> str:
+        """
+        multi_round_to_markdown 的异步版本。
+        """
+        current_input = user_input
+        sections = []
+        stopper = RefinementStopper(max_rounds, pipeline=self.name)  # 评分达标或不再提升时提前结束
+
+        for i in range(1, max_rounds + 1):
+            stopper.begin_round()
+            article = await self.astream_response_text(
+                [HumanMessage(content=current_input)], self.session_for(user_session)
+            )
+            article_md = f"### 第{i}轮 ✍️ 写作生成\n{article.strip()}"
+
+            reflection = await reflection_agent.astream_response_text([
+                HumanMessage(content=user_input),
+                HumanMessage(content=article)
+            ], reflection_agent.session_for(user_session))
+            reflection_md = f"### 第{i}轮 💬 反思点评\n{reflection.strip()}"
+
+            sections.append(f"{article_md}\n\n{reflection_md}\n\n")
+            if stopper.should_stop(parse_score(reflection)):
+                break
+            current_input = f"{user_input}\n\nAI 改进稿：\n{article}\n\n请根据上面的反思优化文章。"
+
+        sections.append(stopper.summary())
+        return "".join(sections).strip()
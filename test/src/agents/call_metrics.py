@@ -0,0 +1,137 @@
+import time
+
+from .cancellation import GenerationCancelled
+from .deadlines import DeadlineExceeded
+from .history_window import estimate_tokens
+from utils.logger import LOG
+from utils.metrics import LATENCY_BUCKETS, RATE_BUCKETS, TOKEN_BUCKETS, metrics
+
+# 每次模型调用记录的指标
+metrics.histogram("tiro_llm_queue_wait_seconds", LATENCY_BUCKETS, "调用进入 Agent 到请求发往模型之间的等待时间")
+metrics.histogram("tiro_llm_ttft_seconds", LATENCY_BUCKETS, "请求发往模型到首个 token 的时间")
+metrics.histogram("tiro_llm_total_seconds", LATENCY_BUCKETS, "请求发往模型到生成结束的时间")
+metrics.histogram("tiro_llm_prompt_tokens", TOKEN_BUCKETS, "提示 token 数")
+metrics.histogram("tiro_llm_completion_tokens", TOKEN_BUCKETS, "生成 token 数")
+metrics.histogram("tiro_llm_tokens_per_second", RATE_BUCKETS, "首个 token 之后的生成速度")
+
+
+class LLMCallTracker:
+    """
+    记录一次模型调用的耗时与 token 用量：等待、首 token 时间、总时间、
+    提示与生成 token 数以及生成速度。模型未返回用量时按文本估算。
+    """
+    def __init__(self, agent: str, session_id: str, model: str, kind: str, messages=None, created: float = None):
+        self.agent = agent
+        self.session_id = session_id
+        self.model = model
+        self.kind = kind  # 调用方式：invoke / stream / cached / generate / summary
+        self.messages = messages or []
+        self.created = created if created is not None else time.monotonic()  # 调用进入 Agent 的时间（含准入排队）
+        self.started = None
+        self.first_token = None
+        self.usage = None
+        self.completion_estimate = 0
+        self.finished = False
+
+    def begin(self) -> None:
+        """请求即将发往模型"""
+        if self.started is None:
+            self.started = time.monotonic()
+
+    def on_chunk(self, chunk) -> None:
+        self.begin()
+        content = getattr(chunk, "content", "")
+        if content:
+            if self.first_token is None:
+                self.first_token = time.monotonic()
+            self.completion_estimate += estimate_tokens(content)
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage:
+            self.usage = usage
+
+    def finish(self, error: BaseException = None) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        now = time.monotonic()
+        self.begin()
+        if error is None:
+            status = "ok"
+        elif isinstance(error, (GeneratorExit, KeyboardInterrupt, GenerationCancelled)) or type(error).__name__ == "CancelledError":
+            status = "cancelled"
+        elif isinstance(error, DeadlineExceeded):
+            status = "timeout"
+        else:
+            status = "error"
+
+        wait = self.started - self.created
+        total = now - self.started
+        ttft = self.first_token - self.started if self.first_token is not None else None
+        if self.usage:
+            prompt_tokens = self.usage.get("input_tokens", 0)
+            completion_tokens = self.usage.get("output_tokens", 0)
+            estimated = False
+        else:
+            prompt_tokens = sum(estimate_tokens(str(m.content)) for m in self.messages)
+            completion_tokens = self.completion_estimate
+            estimated = True
+        generating = now - self.first_token if self.first_token is not None else 0
+        rate = completion_tokens / generating if generating > 0 else None
+
+        labels = {"agent": self.agent, "model": self.model, "kind": self.kind}
+        metrics.inc("tiro_llm_calls_total", status=status, **labels)
+        metrics.observe("tiro_llm_queue_wait_seconds", wait, **labels)
+        metrics.observe("tiro_llm_total_seconds", total, **labels)
+        if ttft is not None:
+            metrics.observe("tiro_llm_ttft_seconds", ttft, **labels)
+        if status == "ok":
+            metrics.observe("tiro_llm_prompt_tokens", prompt_tokens, **labels)
+            metrics.observe("tiro_llm_completion_tokens", completion_tokens, **labels)
+            if rate is not None:
+                metrics.observe("tiro_llm_tokens_per_second", rate, **labels)
+
+        record = {
+            **labels,
+            "session": self.session_id,
+            "status": status,
+            "queue_wait": round(wait, 4),
+            "ttft": round(ttft, 4) if ttft is not None else None,
+            "total": round(total, 4),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_estimated": estimated,
+            "tokens_per_second": round(rate, 2) if rate is not None else None,
+            "at": time.time(),
+        }
+        metrics.record_call(record)
+        LOG.debug(f"[LLM][{self.agent}] {record}")
+
+
+def tracked_stream(chunks, tracker: LLMCallTracker):
+    """
+    包装模型的流式输出，逐块记录指标，结束（或异常、提前关闭）时汇总。
+    """
+    tracker.begin()
+    try:
+        for chunk in chunks:
+            tracker.on_chunk(chunk)
+            yield chunk
+    except BaseException as e:
+        tracker.finish(e)
+        raise
+    tracker.finish()
+
+
+async def atracked_stream(chunks, tracker: LLMCallTracker):
+    """
+    tracked_stream 的异步版本。
+    """
+    tracker.begin()
+    try:
+        async for chunk in chunks:
+            tracker.on_chunk(chunk)
+            yield chunk
+    except BaseException as e:
+        tracker.finish(e)
+        raise
+    tracker.finish()
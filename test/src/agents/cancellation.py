@@ -0,0 +1,225 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from utils.logger import LOG
+
+
+class GenerationCancelled(Exception):
+    """生成已被放弃（被同一操作的新请求取代、点击停止或页面关闭）"""
+
+
+class CancelToken:
+    """
+    一次请求的取消标记：可跨线程取消，取消时依次执行登记的回调（如中止上游连接）。
+    """
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                LOG.warning(f"[Cancel][{self.name}] 取消回调失败: {e}")
+
+    def add_callback(self, callback):
+        """
+        登记取消时执行的回调；已取消时立即执行。
+        返回:
+            Callable[[], None]: 注销该回调的函数
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise GenerationCancelled(self.name)
+
+
+# 当前请求的取消标记；asyncio 任务与 asyncio.to_thread 会继承，模型调用与多轮循环据此检查
+_current_token = ContextVar("tiro_cancel_token", default=None)
+
+
+def current_token():
+    """返回当前请求的取消标记，不在任何取消范围内时返回 None"""
+    return _current_token.get()
+
+
+def raise_if_cancelled() -> None:
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def cancellable_stream(chunks):
+    """
+    使模型的流式输出响应当前请求的取消：每块之间检查取消标记，取消或提前结束时关闭上游流。
+    注意 LangChain 的同步流在关闭时仍会读完其输入，真正中止 Ollama 请求的是异步版本（界面使用的路径）。
+    """
+    token = current_token()
+    if token is None:
+        yield from chunks
+        return
+    token.raise_if_cancelled()
+    try:
+        for chunk in chunks:
+            token.raise_if_cancelled()
+            yield chunk
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+async def acancellable_stream(chunks):
+    """
+    cancellable_stream 的异步版本：等待上游时被取消会立即中断该等待（如首 token 前的排队与预填充），
+    并转换为 GenerationCancelled；由框架发起的任务取消（如断开连接）照常向上传递。
+    """
+    token = current_token()
+    if token is None:
+        async for chunk in chunks:
+            yield chunk
+        return
+    token.raise_if_cancelled()
+
+    loop = asyncio.get_running_loop()
+    state = {"task": None, "interrupted": False}
+
+    def interrupt():
+        # 在事件循环线程中执行：只打断对上游的等待，不打断调用方处理已产出的内容
+        task = state["task"]
+        if task is not None and not task.done():
+            state["interrupted"] = True
+            task.cancel()
+
+    remove = token.add_callback(lambda: loop.call_soon_threadsafe(interrupt))
+    iterator = chunks.__aiter__()
+    try:
+        while True:
+            state["task"] = task = asyncio.current_task()  # 调用方每一步可能在不同的任务中迭代
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            except asyncio.CancelledError:
+                if not state["interrupted"]:
+                    raise
+                if hasattr(task, "uncancel"):
+                    task.uncancel()
+                raise GenerationCancelled(token.name) from None
+            finally:
+                state["task"] = None
+            token.raise_if_cancelled()
+            yield chunk
+    finally:
+        remove()
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class CancellationRegistry:
+    """
+    按用户会话与操作（如 "mode2"、"topic"）登记进行中的请求。
+    同一会话的同一操作再次发起时取消上一次；页面关闭时取消该会话的全部请求。
+    """
+    def __init__(self):
+        self._tokens = {}  # (user_session, action) -> CancelToken
+        self._lock = threading.Lock()
+
+    def start(self, user_session: str, action: str) -> CancelToken:
+        token = CancelToken(f"{action}:{user_session}")
+        with self._lock:
+            previous = self._tokens.get((user_session, action))
+            self._tokens[(user_session, action)] = token
+        if previous is not None:
+            LOG.debug(f"[Cancel] {action} 被同一会话的新请求取代，取消上一次生成")
+            previous.cancel()
+        return token
+
+    def finish(self, user_session: str, action: str, token: CancelToken) -> None:
+        with self._lock:
+            if self._tokens.get((user_session, action)) is token:
+                del self._tokens[(user_session, action)]
+
+    def cancel(self, user_session: str, action: str = None) -> int:
+        """
+        取消某个会话的一个操作（action 为 None 时取消全部），返回取消的请求数。
+        """
+        with self._lock:
+            keys = [key for key in self._tokens if key[0] == user_session and (action is None or key[1] == action)]
+            tokens = [self._tokens.pop(key) for key in keys]
+        for token in tokens:
+            token.cancel()
+        if tokens:
+            LOG.info(f"[Cancel] 已取消会话 {user_session} 的 {len(tokens)} 个进行中的生成")
+        return len(tokens)
+
+    @contextmanager
+    def scope(self, user_session: str, action: str):
+        """
+        在取消范围内执行一次请求：期间的模型调用与多轮循环都会响应取消，
+        被取消时在此结束（不向界面抛出错误）。
+        """
+        token = self.start(user_session, action)
+        reset = _current_token.set(token)
+        try:
+            yield token
+        except GenerationCancelled:
+            LOG.info(f"[Cancel] 已中止 {action} 的生成")
+        finally:
+            try:
+                _current_token.reset(reset)
+            except ValueError:
+                _current_token.set(None)  # 在其他上下文中结束（如生成器被垃圾回收）
+            self.finish(user_session, action, token)
+
+    async def scoped_stream(self, user_session: str, action: str, frames):
+        """
+        scope 的异步生成器版本：界面框架可能在不同的任务中逐步迭代生成器，
+        因此每一步都重新设置当前请求的取消标记，而不是只在开始时设置一次。
+        """
+        token = self.start(user_session, action)
+        try:
+            while True:
+                reset = _current_token.set(token)
+                try:
+                    frame = await frames.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _current_token.reset(reset)
+                yield frame
+        except GenerationCancelled:
+            LOG.info(f"[Cancel] 已中止 {action} 的生成")
+        finally:
+            await frames.aclose()
+            self.finish(user_session, action, token)
+
+
+# 进程内共享的取消登记
+cancellations = CancellationRegistry()
@@ -0,0 +1,316 @@
+import asyncio
+import os
+import threading
+import time
+
+from utils.logger import LOG
+from utils.metrics import metrics
+
+from .cancellation import GenerationCancelled
+
+# 调用时限与熔断配置（可通过环境变量覆盖；各任务的时限见 model_routing）
+TTFT_TIMEOUT = float(os.getenv("TIRO_LLM_TTFT_TIMEOUT", "60"))  # 请求发出到首个 token 的时限（秒），0 表示不限
+TOTAL_TIMEOUT = float(os.getenv("TIRO_LLM_TOTAL_TIMEOUT", "300"))  # 一次调用（含降级重试）的总时限（秒），0 表示不限
+BREAKER_THRESHOLD = int(os.getenv("TIRO_BREAKER_THRESHOLD", "5"))  # 连续失败多少次后熔断该模型，0 表示不熔断
+BREAKER_COOLDOWN = float(os.getenv("TIRO_BREAKER_COOLDOWN", "30"))  # 熔断后多久放行一次试探请求（秒）
+
+# 时限已到但已有部分输出时，在输出末尾追加的标记；PARTIAL_KEY 记在该块的 response_metadata 中
+PARTIAL_KEY = "tiro_partial"
+PARTIAL_MARKERS = {
+    "total": "\n\n⚠️（生成超时，以上内容可能不完整）",
+    "error": "\n\n⚠️（生成中断，以上内容可能不完整）",
+}
+# 没有可返回的部分结果时（首个 token 前超时且无法降级、模型已熔断），界面展示的提示
+FAILURE_NOTICES = {
+    "deadline": "⚠️（模型响应超时，请稍后再试）",
+    "unavailable": "⚠️（模型服务暂时不可用，请稍后再试）",
+}
+
+metrics.gauge("tiro_llm_breaker_open", "模型是否已熔断（1 表示暂停向该模型发送请求）")
+
+
+class DeadlineExceeded(Exception):
+    """模型调用超过时限（phase 为 "ttft" 或 "total"）"""
+    def __init__(self, phase: str, model: str, limit: float):
+        super().__init__(f"{model} {'等待首个 token ' if phase == 'ttft' else '生成'}超过 {limit:g}s")
+        self.phase = phase
+        self.model = model
+
+
+class BackendUnavailable(Exception):
+    """模型已熔断且没有可用的降级模型"""
+
+
+# 界面层捕获并转为提示的调用失败
+MODEL_ERRORS = (DeadlineExceeded, BackendUnavailable)
+
+
+def failure_notice(error: Exception) -> str:
+    """调用失败时展示给用户的提示"""
+    return FAILURE_NOTICES["deadline" if isinstance(error, DeadlineExceeded) else "unavailable"]
+
+
+async def with_failure_notice(frames, separator: str = "\n\n"):
+    """
+    包装界面的文本帧（截至当前的完整文本）：调用超时或熔断时不把异常抛给界面，
+    而是在已显示的内容之后追加提示，作为最后一帧。
+    """
+    text = ""
+    try:
+        async for text in frames:
+            yield text
+    except MODEL_ERRORS as e:
+        LOG.warning(f"[Deadline] 请求失败，向用户返回提示: {e}")
+        yield f"{text}{separator}{failure_notice(e)}" if text else failure_notice(e)
+
+
+class CircuitBreaker:
+    """
+    按模型熔断：连续失败达到阈值后在冷却期内不再发送请求（直接降级或快速失败），
+    冷却期过后放行一次试探请求，成功则恢复，失败则继续熔断。
+    """
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}  # model -> 连续失败次数
+        self._opened = {}  # model -> 熔断时间
+        self._trials = set()  # 正在试探的模型
+        self._lock = threading.Lock()
+
+    def is_open(self, model: str) -> bool:
+        with self._lock:
+            return model in self._opened
+
+    def allow(self, model: str) -> bool:
+        if self.threshold <= 0:
+            return True
+        with self._lock:
+            opened = self._opened.get(model)
+            if opened is None:
+                return True
+            if time.monotonic() - opened < self.cooldown or model in self._trials:
+                return False
+            self._trials.add(model)
+            return True
+
+    def record_success(self, model: str) -> None:
+        with self._lock:
+            self._failures.pop(model, None)
+            self._trials.discard(model)
+            recovered = self._opened.pop(model, None) is not None
+        if recovered:
+            metrics.set_gauge("tiro_llm_breaker_open", 0, model=model)
+            LOG.info(f"[Breaker] {model} 已恢复")
+
+    def record_failure(self, model: str) -> None:
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            failures = self._failures[model] = self._failures.get(model, 0) + 1
+            trial = model in self._trials
+            self._trials.discard(model)
+            if failures < self.threshold and not trial:
+                return
+            self._opened[model] = time.monotonic()
+        metrics.set_gauge("tiro_llm_breaker_open", 1, model=model)
+        LOG.warning(f"[Breaker] {model} 连续失败 {failures} 次，{self.cooldown:g}s 内暂停发送请求")
+
+    def release(self, model: str) -> None:
+        """调用被取消、没有得出结论时，结束试探"""
+        with self._lock:
+            self._trials.discard(model)
+
+
+# 进程内共享的熔断器
+circuit_breaker = CircuitBreaker()
+
+
+def _model_key(model: str) -> str:
+    # 未写标签的模型名在 Ollama 中即 :latest
+    return model if ":" in model else f"{model}:latest"
+
+
+def _candidates(model: str, fallback: str = None) -> list:
+    """依次尝试的模型；降级模型与原模型相同时不重试，直接按失败处理（界面提示用户稍后再试）"""
+    if not fallback or _model_key(fallback) == _model_key(model):
+        return [model]
+    return [model, fallback]
+
+
+def _allowed(candidates: list, index: int) -> bool:
+    """熔断中的模型被跳过；没有其他候选时快速失败"""
+    model = candidates[index]
+    if circuit_breaker.allow(model):
+        return True
+    if index == len(candidates) - 1:
+        metrics.inc("tiro_llm_degraded_total", reason="breaker", action="error")
+        raise BackendUnavailable(f"模型 {model} 连续失败，暂停发送请求，请稍后再试")
+    metrics.inc("tiro_llm_degraded_total", reason="breaker", action="fallback")
+    LOG.warning(f"[Deadline] {model} 已熔断，改用 {candidates[index + 1]}")
+    return False
+
+
+def _partial_chunk(reason: str):
+    from langchain_core.messages import AIMessageChunk  # 只在需要时导入，本模块在启动阶段不依赖 LangChain
+
+    metrics.inc("tiro_llm_degraded_total", reason=reason, action="partial")
+    return AIMessageChunk(content=PARTIAL_MARKERS[reason], response_metadata={PARTIAL_KEY: reason})
+
+
+def _failed(candidates: list, index: int, error: Exception, reason: str) -> None:
+    """首个 token 之前失败：记入熔断，有降级模型时返回（改用降级模型），否则抛出"""
+    model = candidates[index]
+    circuit_breaker.record_failure(model)
+    if index == len(candidates) - 1:
+        metrics.inc("tiro_llm_degraded_total", reason=reason, action="error")
+        raise error
+    metrics.inc("tiro_llm_degraded_total", reason=reason, action="fallback")
+    LOG.warning(f"[Deadline] {model} 调用失败（{error}），改用 {candidates[index + 1]}")
+
+
+def _time_left(started: float, attempt_started: float, received: bool, ttft_timeout, total_timeout):
+    """
+    返回:
+        tuple: (剩余秒数, 先到期的时限 "ttft"/"total", 该时限的秒数)；都不限制时剩余秒数为 None
+    """
+    now = time.monotonic()
+    limits = []
+    if total_timeout:
+        limits.append((total_timeout - (now - started), "total", total_timeout))
+    if ttft_timeout and not received:
+        limits.append((ttft_timeout - (now - attempt_started), "ttft", ttft_timeout))
+    if not limits:
+        return None, None, None
+    left, phase, limit = min(limits)
+    return max(left, 0), phase, limit
+
+
+def is_partial(chunk) -> bool:
+    """是否为时限已到时追加的标记块（含该块的结果不应写入缓存）"""
+    return bool((getattr(chunk, "response_metadata", None) or {}).get(PARTIAL_KEY))
+
+
+async def _next_chunk(chunks, timeout, on_timeout):
+    """
+    在 timeout 秒内取下一块，超时先调用 on_timeout（记录超时），再打断等待并抛出 asyncio.TimeoutError。
+    """
+    if timeout is None:
+        return await chunks.__anext__()
+    step = asyncio.ensure_future(chunks.__anext__())
+    try:
+        done, _ = await asyncio.wait({step}, timeout=timeout)
+    except asyncio.CancelledError:
+        step.cancel()
+        raise
+    if not done:
+        on_timeout()
+        step.cancel()
+        await asyncio.wait({step})  # 等上游流处理完打断（关闭 HTTP 响应）
+        raise asyncio.TimeoutError
+    return step.result()
+
+
+def guarded_stream(open_stream, model: str, fallback: str = None,
+                   ttft_timeout: float = TTFT_TIMEOUT, total_timeout: float = TOTAL_TIMEOUT):
+    """
+    带时限、降级与熔断的流式调用。open_stream(model) 返回 (流式输出, 调用指标记录)。
+    首个 token 之前失败或超时时改用降级模型；已有输出后超时或中断则结束，并追加标记块。
+    同步版本无法打断阻塞中的读取，首 token 时限与总时限只在每块之间检查（如推理模型逐块到达的思考过程），
+    一块都没有收到时的等待由 HTTP 客户端的读超时（TIRO_OLLAMA_READ_TIMEOUT）兜底；界面使用异步版本。
+    """
+    started = time.monotonic()
+    candidates = _candidates(model, fallback)
+    for index, name in enumerate(candidates):
+        if not _allowed(candidates, index):
+            continue
+        chunks, tracker = open_stream(name)
+        attempt_started = time.monotonic()
+        received = False
+        expired = None
+        try:
+            for chunk in chunks:
+                received = received or bool(chunk.content)
+                yield chunk
+                left, phase, limit = _time_left(started, attempt_started, received, ttft_timeout, total_timeout)
+                if left == 0:
+                    expired = DeadlineExceeded(phase, name, limit)
+                    break
+        except (GenerationCancelled, GeneratorExit, KeyboardInterrupt):
+            circuit_breaker.release(name)
+            raise
+        except Exception as e:
+            if received:
+                circuit_breaker.record_failure(name)
+                LOG.warning(f"[Deadline] {name} 生成中断，返回已生成的部分: {e}")
+                yield _partial_chunk("error")
+                return
+            _failed(candidates, index, e, "error")
+            continue
+        if expired is None:
+            circuit_breaker.record_success(name)
+            return
+        tracker.finish(expired)
+        # LangChain 的同步流关闭时会读完剩余响应，放到后台关闭，不阻塞调用方
+        threading.Thread(target=chunks.close, name="stream-closer", daemon=True).start()
+        if received:
+            circuit_breaker.record_success(name)  # 模型仍在输出，只是慢，不计入熔断
+            LOG.warning(f"[Deadline] {expired}，返回已生成的部分")
+            yield _partial_chunk("total")
+            return
+        if expired.phase == "total":
+            circuit_breaker.record_failure(name)
+            metrics.inc("tiro_llm_degraded_total", reason="total", action="error")
+            raise expired
+        _failed(candidates, index, expired, "ttft")
+
+
+async def aguarded_stream(open_stream, model: str, fallback: str = None,
+                          ttft_timeout: float = TTFT_TIMEOUT, total_timeout: float = TOTAL_TIMEOUT):
+    """
+    guarded_stream 的异步版本：等待首个 token 或下一块时按剩余时间打断，超时后中止上游请求。
+    """
+    started = time.monotonic()
+    candidates = _candidates(model, fallback)
+    for index, name in enumerate(candidates):
+        if not _allowed(candidates, index):
+            continue
+        chunks, tracker = open_stream(name)
+        attempt_started = time.monotonic()
+        received = False
+        try:
+            while True:
+                left, phase, limit = _time_left(started, attempt_started, received, ttft_timeout, total_timeout)
+                try:
+                    chunk = await _next_chunk(chunks, left, lambda: tracker.finish(DeadlineExceeded(phase, name, limit)))
+                except StopAsyncIteration:
+                    break
+                received = received or bool(chunk.content)
+                yield chunk
+        except asyncio.TimeoutError:
+            error = DeadlineExceeded(phase, name, limit)
+            if received:
+                circuit_breaker.record_success(name)  # 模型仍在输出，只是慢，不计入熔断
+                LOG.warning(f"[Deadline] {error}，返回已生成的部分")
+                yield _partial_chunk("total")
+                return
+            if phase == "total":
+                circuit_breaker.record_failure(name)
+                metrics.inc("tiro_llm_degraded_total", reason="total", action="error")
+                raise error
+            _failed(candidates, index, error, "ttft")
+            continue
+        except (GenerationCancelled, asyncio.CancelledError, GeneratorExit):
+            circuit_breaker.release(name)
+            raise
+        except Exception as e:
+            if received:
+                circuit_breaker.record_failure(name)
+                LOG.warning(f"[Deadline] {name} 生成中断，返回已生成的部分: {e}")
+                yield _partial_chunk("error")
+                return
+            _failed(candidates, index, e, "error")
+            continue
+        finally:
+            await chunks.aclose()
+        circuit_breaker.record_success(name)
+        return
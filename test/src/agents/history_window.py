@@ -0,0 +1,156 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.chat_history import BaseChatMessageHistory  # 基础聊天消息历史类
+from langchain_core.messages import SystemMessage
+
+from utils.logger import LOG
+
+from .session_history import CompactChatMessageHistory, MessageRecord
+
+# 默认的历史 token 预算与摘要配置（可通过环境变量覆盖）
+DEFAULT_TOKEN_BUDGET = int(os.getenv("TIRO_HISTORY_TOKEN_BUDGET", "4000"))
+KEEP_RECENT_RATIO = 0.5  # 触发摘要后，最近的对话保留预算的比例
+SUMMARY_WORKERS = int(os.getenv("TIRO_SUMMARY_WORKERS", "2"))
+
+SUMMARY_PROMPT = (
+    "请把下面的对话压缩成一段简洁的摘要，保留场景设定、用户的关键信息、已讨论的要点和未完成的任务，"
+    "不超过300字，只输出摘要本身。\n\n"
+    "已有摘要：\n{summary}\n\n新增对话：\n{dialogue}"
+)
+
+# 中日韩字符大致一个字一个 token，其余文本约四个字符一个 token
+_CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+_summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="history-summary")
+
+
+def estimate_tokens(text) -> int:
+    """
+    估算文本的 token 数（不依赖具体模型的分词器）。
+    """
+    if not isinstance(text, str):
+        text = str(text)
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4 + 4  # 每条消息额外计入角色等开销
+
+
+def record_tokens(record: MessageRecord) -> int:
+    """
+    返回记录的 token 数，结果缓存在记录上。
+    """
+    if record.tokens is None:
+        record.tokens = estimate_tokens(record.content)
+    return record.tokens
+
+
+class WindowedHistory(BaseChatMessageHistory):
+    """
+    带 token 预算的历史视图：读取时只返回「摘要 + 最近若干轮」，
+    写入时原样追加到底层历史，并在超出预算时安排后台摘要。
+    """
+    def __init__(self, history, window):
+        self.history = history
+        self.window = window
+
+    @property
+    def messages(self) -> list:
+        return self.window.build_messages(self.history)
+
+    def add_messages(self, messages) -> None:
+        self.history.add_messages(messages)
+        self.window.maybe_summarize(self.history)
+
+    def clear(self) -> None:
+        self.history.clear()
+
+
+class HistoryWindow:
+    """
+    按 token 预算裁剪会话历史，并用后台任务把旧的对话压缩成滚动摘要。
+    """
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, summarizer=None):
+        self.token_budget = token_budget
+        # 生成摘要的函数 summarizer(提示, 会话ID) -> 摘要文本，失败或超时返回空字符串
+        self.summarizer = summarizer
+        self._pending = set()  # 正在摘要的会话，避免重复提交
+        self._lock = threading.Lock()
+
+    def wrap(self, history) -> BaseChatMessageHistory:
+        """
+        包装底层历史；不支持紧凑记录的历史对象原样返回。
+        """
+        if self.token_budget is None or not isinstance(history, CompactChatMessageHistory):
+            return history
+        return WindowedHistory(history, self)
+
+    def _recent_start(self, records: list, start: int, budget: int) -> int:
+        """
+        从末尾向前累加 token，返回预算内最早保留的记录下标（不早于 start）。
+        """
+        used = 0
+        index = len(records)
+        while index > start:
+            tokens = record_tokens(records[index - 1])
+            if used + tokens > budget and index < len(records):
+                break
+            used += tokens
+            index -= 1
+        return index
+
+    def build_messages(self, history) -> list:
+        records = list(history.records)
+        summary = history.summary
+        budget = self.token_budget
+        if summary:
+            budget -= estimate_tokens(summary)
+        start = self._recent_start(records, min(history.summarized_upto, len(records)), budget)
+
+        messages = []
+        if summary:
+            messages.append(SystemMessage(content=f"以下是之前对话的摘要：\n{summary}"))
+        messages.extend(record.to_message() for record in records[start:])
+        return messages
+
+    def maybe_summarize(self, history) -> None:
+        """
+        未摘要部分超出预算时，在后台把较早的记录并入摘要。
+        """
+        if self.summarizer is None:
+            return
+        records = history.records
+        start = min(history.summarized_upto, len(records))
+        unsummarized = sum(record_tokens(record) for record in records[start:])
+        if unsummarized <= self.token_budget:
+            return
+
+        cut = self._recent_start(records, start, int(self.token_budget * KEEP_RECENT_RATIO))
+        if cut <= start:
+            return
+        key = id(history)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        _summary_executor.submit(self._summarize, history, start, cut)
+
+    def _summarize(self, history, start: int, cut: int) -> None:
+        try:
+            dialogue = "\n".join(
+                f"{record.role}: {record.content}" for record in history.records[start:cut]
+            )
+            prompt = SUMMARY_PROMPT.format(summary=history.summary or "（无）", dialogue=dialogue)
+            summary = self.summarizer(prompt, history.session_id)
+            if not summary:
+                return  # 超时或只生成了一部分，下次超出预算时重试
+            if history.summarized_upto != start or len(history.records) < cut:
+                return  # 期间历史被清空或已被其他任务摘要
+            history.set_summary(summary, cut)
+            LOG.debug(f"[HistoryWindow][{history.session_id}] 已摘要前 {cut} 条消息")
+        except Exception as e:
+            LOG.error(f"[HistoryWindow][{history.session_id}] 生成摘要失败: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(id(history))
@@ -0,0 +1,39 @@
+import threading
+import time
+
+from utils.logger import LOG
+
+
+class LazyAgent:
+    """
+    按需创建的 Agent 代理：首次访问属性时才调用工厂函数创建真正的 Agent，
+    使加载提示文件、构建 LangChain 管道、导入模型依赖都不发生在启动阶段。
+    """
+    def __init__(self, name, factory):
+        self._name = name
+        self._factory = factory  # factory() -> AgentBase，在其中导入 Agent 模块
+        self._agent = None
+        self._lock = threading.Lock()
+
+    @property
+    def created(self) -> bool:
+        return self._agent is not None
+
+    def get(self):
+        """
+        返回真正的 Agent，必要时创建（多线程并发首次访问时只创建一次）。
+        """
+        agent = self._agent
+        if agent is None:
+            with self._lock:
+                agent = self._agent
+                if agent is None:
+                    started = time.perf_counter()
+                    agent = self._factory()
+                    self._agent = agent
+                    LOG.info(f"[LazyAgent] 已创建 {self._name}，耗时 {time.perf_counter() - started:.3f}s")
+        return agent
+
+    def __getattr__(self, attr):
+        # 只有自身没有的属性才会走到这里，转发给真正的 Agent
+        return getattr(self.get(), attr)
@@ -0,0 +1,129 @@
+import csv
+import os
+import sqlite3
+import threading
+
+from utils.logger import LOG
+
+# 本地词库配置（可通过环境变量覆盖）
+LEXICON_ENABLED = os.getenv("TIRO_VOCAB_LEXICON", "1") == "1"  # 单词卡片是否优先来自本地词库
+LEXICON_SOURCE = os.getenv("TIRO_LEXICON_SOURCE", "lexicon/lexicon.tsv")  # 随项目发布的词库源文件
+LEXICON_DB = os.getenv("TIRO_LEXICON_DB", "data/lexicon.sqlite3")  # 由源文件编译的只读数据库
+LEXICON_FIELDS = ("word", "ipa", "pos", "meaning", "level", "band")
+
+_SCHEMA = """
+CREATE TABLE entries (
+    word TEXT PRIMARY KEY,
+    ipa TEXT NOT NULL,
+    pos TEXT NOT NULL,
+    meaning TEXT NOT NULL,
+    level TEXT NOT NULL,   -- 难度：初中 / 高中 / 大学
+    band INTEGER NOT NULL  -- 词频段：1 最常用，数字越大越少见
+);
+CREATE INDEX idx_entries_level_band ON entries (level, band);
+"""
+
+
+def read_tsv(path: str):
+    """
+    逐行读取 TSV 格式的词库源文件（表头为 LEXICON_FIELDS）。
+    """
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        for row in csv.DictReader(file, delimiter="\t"):
+            yield {field: (row.get(field) or "").strip() for field in LEXICON_FIELDS}
+
+
+def write_lexicon(entries, db_path: str) -> int:
+    """
+    把词条写入新的 SQLite 词库（先写临时文件再替换，避免读到写了一半的库）。
+    返回:
+        int: 写入的词条数
+    """
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(_SCHEMA)
+        rows = (
+            (e["word"], e["ipa"], e["pos"], e["meaning"], e["level"], int(e["band"] or 3))
+            for e in entries if e["word"] and e["meaning"]
+        )
+        conn.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+    return count
+
+
+class Lexicon:
+    """
+    只读的本地词库：按难度与词频段随机抽取单词卡片（音标、词性、中文释义）。
+    """
+    def __init__(self, db_path: str = LEXICON_DB):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def sample(self, count: int, level: str = None, max_band: int = None, exclude=()) -> list:
+        """
+        随机抽取若干词条。
+        参数:
+            count (int): 需要的词条数
+            level (str, optional): 难度（初中/高中/大学），None 表示不限
+            max_band (int, optional): 最大词频段，None 表示不限
+            exclude (Iterable[str]): 不希望出现的单词（如上一组单词）
+        返回:
+            list[dict]: 词条，数量可能少于 count
+        """
+        exclude = {word.lower() for word in exclude}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT word, ipa, pos, meaning FROM entries"
+                " WHERE (?1 IS NULL OR level = ?1) AND (?2 IS NULL OR band <= ?2)"
+                " ORDER BY random() LIMIT ?3",
+                (level, max_band, count + len(exclude)),
+            ).fetchall()
+        entries = [
+            {"word": word, "ipa": ipa, "pos": pos, "meaning": meaning}
+            for word, ipa, pos, meaning in rows if word.lower() not in exclude
+        ]
+        return entries[:count]
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon():
+    """
+    获取进程内共享的词库，数据库缺失或比源文件旧时先从源文件编译；
+    没有可用词库时返回 None（调用方退回由模型生成单词）。
+    """
+    global _lexicon
+    with _lexicon_lock:
+        if _lexicon is not None:
+            return _lexicon
+        try:
+            source_newer = (
+                os.path.exists(LEXICON_SOURCE)
+                and (not os.path.exists(LEXICON_DB)
+                     or os.path.getmtime(LEXICON_SOURCE) > os.path.getmtime(LEXICON_DB))
+            )
+            if source_newer:
+                count = write_lexicon(read_tsv(LEXICON_SOURCE), LEXICON_DB)
+                LOG.info(f"[Lexicon] 已从 {LEXICON_SOURCE} 编译词库，共 {count} 个词条")
+            if not os.path.exists(LEXICON_DB):
+                LOG.warning("[Lexicon] 没有可用的本地词库，单词将由模型生成")
+                return None
+            _lexicon = Lexicon(LEXICON_DB)
+        except (OSError, sqlite3.Error, ValueError) as e:
+            LOG.error(f"[Lexicon] 加载本地词库失败: {e}")
+            return None
+        return _lexicon
@@ -0,0 +1,17 @@
+import os
+
+# Ollama 服务地址与连接池配置（可通过环境变量覆盖）
+OLLAMA_BASE_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+POOL_MAX_CONNECTIONS = int(os.getenv("TIRO_OLLAMA_MAX_CONNECTIONS", "32"))
+POOL_MAX_KEEPALIVE = int(os.getenv("TIRO_OLLAMA_MAX_KEEPALIVE", "16"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("TIRO_OLLAMA_KEEPALIVE_EXPIRY", "300"))
+# 两次收到数据之间的最长等待（秒），防止卡住的连接让请求永远挂起；需大于模型冷启动加载的时间，0 表示不限
+READ_TIMEOUT = float(os.getenv("TIRO_OLLAMA_READ_TIMEOUT", "180"))
+
+# 默认模型与生成参数
+DEFAULT_MODEL = "qwen3:latest"
+DEFAULT_MODEL_SETTINGS = {
+    "num_predict": 8192,  # 最大生成的 token 数（各任务的上限见 model_routing）
+    "temperature": 0.8,  # 随机性配置
+    "keep_alive": os.getenv("TIRO_OLLAMA_KEEP_ALIVE", "30m"),  # 每次请求都提示 Ollama 保持模型常驻
+}
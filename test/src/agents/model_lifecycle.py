@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+
+import httpx
+
+from .model_config import DEFAULT_MODEL, DEFAULT_MODEL_SETTINGS, OLLAMA_BASE_URL
+from .model_routing import DYNAMIC_NUM_CTX, MIN_NUM_CTX, SMALL_MODEL, model_router, num_ctx_for
+from .prefetch import activity
+from utils.logger import LOG
+
+# 模型预热与常驻配置（可通过环境变量覆盖）
+WARMUP_ENABLED = os.getenv("TIRO_WARMUP_ENABLED", "1") == "1"
+# 启动时预热的模型（逗号分隔，默认为主模型与小任务模型），Agent 调用时路由到的模型也会自动加入
+WARMUP_MODELS = [
+    m.strip() for m in os.getenv("TIRO_WARMUP_MODELS", ",".join(dict.fromkeys([DEFAULT_MODEL, SMALL_MODEL]))).split(",")
+    if m.strip()
+]
+# 被 Ollama 卸载后趁空闲重新加载的模型（逗号分隔，默认只有交互对话使用的主模型），
+# 其余模型只在登记时预热一次，卸载后等下次使用时再加载，以免长期占满显存
+KEEP_WARM_MODELS = [m.strip() for m in os.getenv("TIRO_KEEP_WARM_MODELS", DEFAULT_MODEL).split(",") if m.strip()]
+KEEP_ALIVE = DEFAULT_MODEL_SETTINGS["keep_alive"]
+CHECK_INTERVAL = float(os.getenv("TIRO_WARMUP_CHECK_INTERVAL", "120"))  # 检查模型是否仍在内存中的间隔（秒）
+LOAD_TIMEOUT = 600.0  # 大模型首次加载可能很久
+
+
+class ModelLifecycle:
+    """
+    管理 Ollama 模型的预热与常驻：启动时在后台加载所有已配置的模型，
+    之后定期检查模型是否仍在内存中，keep_warm 中的模型被卸载时趁空闲重新加载，并记录每个模型是否已预热。
+    """
+    def __init__(self, base_url=OLLAMA_BASE_URL, models=WARMUP_MODELS, enabled=WARMUP_ENABLED,
+                 keep_warm=KEEP_WARM_MODELS):
+        self.base_url = base_url.rstrip("/")
+        self.enabled = enabled
+        self.keep_warm = set(keep_warm)
+        self._models = {}  # 模型名 -> {"warm": bool, "loaded_at": float | None, "expires_at": str | None}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        for model in models:
+            self.register(model)
+
+    def register(self, model: str) -> None:
+        """
+        登记需要保持常驻的模型（重复登记无副作用）。
+        """
+        with self._lock:
+            if model in self._models:
+                return
+            self._models[model] = {"warm": False, "loaded_at": None, "expires_at": None}
+        self._wake.set()
+
+    def is_warm(self, model: str) -> bool:
+        with self._lock:
+            state = self._models.get(model)
+            return bool(state and state["warm"])
+
+    def status(self) -> dict:
+        """
+        返回每个模型的预热状态快照。
+        """
+        with self._lock:
+            return {model: dict(state) for model, state in self._models.items()}
+
+    def _set_state(self, model: str, **fields) -> None:
+        with self._lock:
+            self._models.setdefault(model, {"warm": False, "loaded_at": None, "expires_at": None}).update(fields)
+
+    def preload_payload(self, model: str) -> dict:
+        """
+        预热请求体：以请求将使用的上下文窗口加载（固定值，或按提示长度设置时的最小档位），
+        使请求到来时无需重新加载模型。
+        """
+        payload = {"model": model, "keep_alive": KEEP_ALIVE}
+        num_ctx = MIN_NUM_CTX if DYNAMIC_NUM_CTX else num_ctx_for(model)
+        if num_ctx:
+            payload["options"] = {"num_ctx": num_ctx}
+        return payload
+
+    def preload(self, client: httpx.Client, model: str) -> bool:
+        """
+        让 Ollama 加载模型并按 KEEP_ALIVE 保持常驻（不带提示的生成请求只加载模型）。
+        """
+        started = time.monotonic()
+        try:
+            response = client.post(
+                "/api/generate",
+                json=self.preload_payload(model),
+                timeout=LOAD_TIMEOUT,
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            LOG.warning(f"[ModelLifecycle] 预热模型 {model} 失败: {e}")
+            self._set_state(model, warm=False)
+            return False
+        self._set_state(model, warm=True, loaded_at=time.time())
+        LOG.info(f"[ModelLifecycle] 模型 {model} 已预热，耗时 {time.monotonic() - started:.1f}s")
+        return True
+
+    def refresh(self, client: httpx.Client) -> None:
+        """
+        根据 Ollama 当前加载的模型列表更新预热状态。
+        """
+        try:
+            response = client.get("/api/ps", timeout=10.0)
+            response.raise_for_status()
+            running = {item.get("name"): item for item in response.json().get("models", [])}
+        except (httpx.HTTPError, ValueError) as e:
+            LOG.warning(f"[ModelLifecycle] 查询已加载模型失败: {e}")
+            return
+        for model in self.status():
+            # 未写标签的模型名在 Ollama 中显示为 :latest
+            item = running.get(model) or running.get(f"{model}:latest")
+            self._set_state(model, warm=item is not None, expires_at=item.get("expires_at") if item else None)
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="model-lifecycle", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self) -> None:
+        # 在后台线程中先查询已安装的模型，路由不必在请求中查询；未安装的可选模型不预热
+        missing = model_router.missing_models()
+        with self._lock:
+            for model in missing:
+                self._models.pop(model, None)
+        with httpx.Client(base_url=self.base_url) as client:
+            # 启动时立即预热，不等待空闲
+            for model in self.status():
+                if self._stop.is_set():
+                    return
+                self.preload(client, model)
+
+            while not self._stop.is_set():
+                self._wake.wait(CHECK_INTERVAL)
+                self._wake.clear()
+                if self._stop.is_set():
+                    return
+                self.refresh(client)
+                for model, state in self.status().items():
+                    if self._should_preload(model, state):
+                        self.preload(client, model)
+
+    def _should_preload(self, model: str, state: dict) -> bool:
+        """
+        新登记的模型立即预热；常驻模型被卸载后趁空闲重新加载，避免与前台请求争抢。
+        """
+        if state["warm"]:
+            return False
+        if state["loaded_at"] is None:
+            return True
+        return model in self.keep_warm and activity.is_idle()
+
+
+# 进程内唯一的模型生命周期管理器
+model_lifecycle = ModelLifecycle()
@@ -0,0 +1,93 @@
+import threading
+
+import httpx
+from langchain_ollama.chat_models import ChatOllama  # 导入 ChatOllama 模型
+
+from utils.logger import LOG  # 导入日志工具
+
+from .model_config import (  # 模型与连接池配置（不依赖 LangChain，便于启动阶段轻量导入）
+    DEFAULT_MODEL,
+    DEFAULT_MODEL_SETTINGS,
+    OLLAMA_BASE_URL,
+    POOL_KEEPALIVE_EXPIRY,
+    POOL_MAX_CONNECTIONS,
+    POOL_MAX_KEEPALIVE,
+    READ_TIMEOUT,
+)
+
+# 当前 langchain_ollama 是否支持在请求中关闭推理（think）
+SUPPORTS_REASONING_SWITCH = "reasoning" in getattr(ChatOllama, "model_fields", {})
+# 作为请求字段（而非模型 options）发送的设置
+REQUEST_KEYS = ("keep_alive", "format")
+
+
+class ModelRegistry:
+    """
+    共享的模型客户端注册表。
+    每个模型只创建一个 ChatOllama，所有 Agent 与任务从这里借用，生成参数（num_predict、num_ctx 等）
+    随每次调用绑定发送，不为不同参数另建客户端；底层 HTTP 客户端使用保持长连接的连接池。
+    """
+    def __init__(self, base_url=OLLAMA_BASE_URL):
+        self.base_url = base_url
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _client_kwargs(self):
+        """
+        构造传给 Ollama HTTP 客户端的参数：连接池上限、长连接保活时间与超时。
+        """
+        return {
+            "limits": httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+            ),
+            # 生成可能很久，不限制总时间（由各任务的调用时限负责），只限制建连与两次收到数据之间的等待
+            "timeout": httpx.Timeout(None, connect=10.0, read=READ_TIMEOUT or None),
+        }
+
+    def client_for(self, model=DEFAULT_MODEL) -> ChatOllama:
+        """
+        获取（必要时创建）该模型共享的 ChatOllama 实例。
+        """
+        with self._lock:
+            chat_model = self._models.get(model)
+            if chat_model is None:
+                chat_model = ChatOllama(
+                    model=model,
+                    base_url=self.base_url,
+                    client_kwargs=self._client_kwargs(),
+                    keep_alive=DEFAULT_MODEL_SETTINGS["keep_alive"],
+                )
+                self._models[model] = chat_model
+                LOG.info(f"[ModelRegistry] 创建共享模型客户端 {model}")
+            return chat_model
+
+    def get_chat_model(self, model=DEFAULT_MODEL, **settings):
+        """
+        借用模型的共享客户端，并绑定本次调用的生成参数。
+        参数:
+            model (str): 模型名称
+            **settings: 生成参数，未提供的使用 DEFAULT_MODEL_SETTINGS；
+                reasoning=False 会在后端支持时关闭模型的推理输出
+        返回:
+            Runnable: 绑定了生成参数的共享客户端（绑定本身不创建连接，可按调用创建）
+        """
+        options = {**DEFAULT_MODEL_SETTINGS, **settings}
+        reasoning = options.pop("reasoning", None)
+        call = {key: options.pop(key) for key in REQUEST_KEYS if key in options}
+        if reasoning is not None and SUPPORTS_REASONING_SWITCH:
+            call["reasoning"] = reasoning
+        # 显式传入 options 时 ChatOllama 不再使用实例上的生成参数，每次请求完整发送
+        return self.client_for(model).bind(options=options, **call)
+
+
+# 进程内唯一的注册表
+model_registry = ModelRegistry()
+
+
+def get_chat_model(model=DEFAULT_MODEL, **settings):
+    """
+    从全局注册表借用模型客户端。
+    """
+    return model_registry.get_chat_model(model, **settings)
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+
+import httpx
+
+from utils.logger import LOG
+
+from .admission import BACKGROUND, BULK, INTERACTIVE
+from .deadlines import TOTAL_TIMEOUT, TTFT_TIMEOUT
+from .model_config import DEFAULT_MODEL, DEFAULT_MODEL_SETTINGS, OLLAMA_BASE_URL
+
+# 模型路由配置（可通过环境变量覆盖）
+# 出题、单词卡片、摘要等小任务使用的模型；Ollama 中未安装时（/api/tags 中没有）改用 DEFAULT_MODEL
+SMALL_MODEL = os.getenv("TIRO_SMALL_MODEL", "qwen3:1.7b")
+FALLBACK_MODEL = os.getenv("TIRO_FALLBACK_MODEL", SMALL_MODEL)  # 首个 token 超时或调用失败时改用的模型，与原模型相同时不降级
+TAGS_TIMEOUT = 3.0  # 查询已安装模型的超时（秒）
+TAGS_RETRY_INTERVAL = 30.0  # 查询失败（如 Ollama 尚未启动）后再次查询的间隔（秒）
+ROUTES_FILE = os.getenv("TIRO_MODEL_ROUTES", "")  # JSON 路由文件，按键覆盖或补充默认路由
+# 固定的上下文窗口：一个数字用于所有模型，或按 "模型=大小,..." 分别设置；为空时使用 Ollama 的默认值
+# 同一模型应始终使用同一个 num_ctx，Ollama 在 num_ctx 变化时会重新加载模型
+NUM_CTX = os.getenv("TIRO_NUM_CTX", "")
+# 是否按提示长度设置上下文窗口（可选，默认关闭：不同档位之间切换会让 Ollama 重新加载模型）
+DYNAMIC_NUM_CTX = os.getenv("TIRO_DYNAMIC_NUM_CTX", "0") == "1"
+# 按提示长度设置时，上下文窗口取 2 的幂并限制在此范围内；下限取大一些可减少档位
+MIN_NUM_CTX = int(os.getenv("TIRO_MIN_NUM_CTX", "4096"))
+MAX_NUM_CTX = int(os.getenv("TIRO_MAX_NUM_CTX", "32768"))
+REASONING_TOKEN_BUDGET = int(os.getenv("TIRO_REASONING_TOKEN_BUDGET", "4096"))  # 开启推理时额外允许生成的 token
+
+# 调用策略：准入优先级、降级模型、首 token 时限与总时限（秒）；这些键不传给模型
+POLICY_KEYS = ("priority", "fallback", "ttft_timeout", "timeout")
+
+# 默认路由：键为 "任务" 或 "Agent.任务"，值为模型与生成参数（num_predict 为生成 token 上限）及调用策略
+# 交互任务的时限较短，使界面的最坏等待有上限；批量任务沿用全局时限
+DEFAULT_ROUTES = {
+    "default": {
+        "model": DEFAULT_MODEL, "num_predict": DEFAULT_MODEL_SETTINGS["num_predict"], "priority": INTERACTIVE,
+        "fallback": FALLBACK_MODEL, "ttft_timeout": TTFT_TIMEOUT, "timeout": TOTAL_TIMEOUT,
+    },
+    "chat": {"num_predict": 1024, "ttft_timeout": 30, "timeout": 120},  # 场景对话、单词情景对话
+    "essay": {"num_predict": 2048, "priority": BULK},  # 范文、初始作文与优化作文
+    "reflection": {"num_predict": 1536, "priority": BULK},  # 评分点评
+    "suggestion": {"num_predict": 1536, "priority": BULK},  # 写作建议
+    "topic": {"model": SMALL_MODEL, "num_predict": 64, "ttft_timeout": 20, "timeout": 30},  # 一行作文题目
+    "vocabulary": {"model": SMALL_MODEL, "num_predict": 2048, "ttft_timeout": 30, "timeout": 180},  # 单词卡片（最多 20 个）
+    "examples": {"model": SMALL_MODEL, "num_predict": 1024, "ttft_timeout": 30, "timeout": 120},  # 词库单词的例句
+    "card": {"model": SMALL_MODEL, "num_predict": 1024, "ttft_timeout": 20, "timeout": 120},  # 一次修复并补齐缺少的卡片
+    "summary": {"model": SMALL_MODEL, "num_predict": 512, "priority": BACKGROUND, "reasoning": False},  # 历史对话摘要
+}
+
+
+def load_routes(path: str = ROUTES_FILE) -> dict:
+    """
+    读取路由配置：默认路由之上叠加路由文件中的同名键。
+    """
+    routes = {key: dict(value) for key, value in DEFAULT_ROUTES.items()}
+    if not path:
+        return routes
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            overrides = json.load(file)
+    except (OSError, ValueError) as e:
+        LOG.error(f"[ModelRouting] 读取路由文件 {path} 失败，使用默认路由: {e}")
+        return routes
+    for key, value in overrides.items():
+        routes.setdefault(key, {}).update(value)
+    return routes
+
+
+def parse_num_ctx(spec: str) -> dict:
+    """
+    解析 TIRO_NUM_CTX，返回 {模型名称: 上下文窗口}；键 "" 为未单独设置的模型使用的值。
+    """
+    sizes = {}
+    for item in spec.split(","):
+        model, _, size = item.strip().rpartition("=")
+        if size.strip().isdigit():
+            sizes[model.strip()] = int(size)
+        elif item.strip():
+            LOG.warning(f"[ModelRouting] 忽略无效的 TIRO_NUM_CTX 项: {item.strip()}")
+    return sizes
+
+
+MODEL_NUM_CTX = parse_num_ctx(NUM_CTX)
+
+
+def num_ctx_for(model: str):
+    """模型的固定上下文窗口，未配置时返回 None"""
+    return MODEL_NUM_CTX.get(model, MODEL_NUM_CTX.get(""))
+
+
+def context_window(prompt_tokens: int, num_predict: int) -> int:
+    """
+    按提示与生成的 token 数估算所需的上下文窗口（向上取 2 的幂，并限制在配置范围内）。
+    """
+    needed = prompt_tokens + num_predict
+    size = MIN_NUM_CTX
+    while size < needed and size < MAX_NUM_CTX:
+        size *= 2
+    return min(size, MAX_NUM_CTX)
+
+
+class ModelRouter:
+    """
+    按 Agent 与任务选择模型与生成参数。
+    查找顺序为 "Agent.任务"、"任务"、"default"，后者的参数被前者覆盖。
+    optional_models 中的模型（小任务模型与降级模型）在 Ollama 中未安装时改用 DEFAULT_MODEL。
+    """
+    def __init__(self, routes=None, optional_models=(), base_url=OLLAMA_BASE_URL):
+        self.routes = routes if routes is not None else load_routes()
+        self.optional_models = set(optional_models) - {DEFAULT_MODEL}
+        self.base_url = base_url.rstrip("/")
+        self._missing = None  # 未安装的可选模型；None 表示尚未查询成功
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def missing_models(self) -> set:
+        """
+        返回 Ollama 中未安装的可选模型。首次调用时查询 /api/tags，成功后不再重复查询；
+        查询失败时暂按都已安装处理，TAGS_RETRY_INTERVAL 秒后再查。
+        """
+        if not self.optional_models or self._missing is not None:
+            return self._missing or set()
+        with self._lock:
+            now = time.monotonic()
+            if self._missing is None and (self._checked_at is None or now - self._checked_at >= TAGS_RETRY_INTERVAL):
+                self._checked_at = now
+                self._missing = self._query_missing()
+        return self._missing or set()
+
+    def _query_missing(self):
+        try:
+            response = httpx.get(f"{self.base_url}/api/tags", timeout=TAGS_TIMEOUT)
+            response.raise_for_status()
+            installed = {item.get("name") for item in response.json().get("models", [])}
+        except (httpx.HTTPError, ValueError) as e:
+            LOG.debug(f"[ModelRouting] 查询已安装的模型失败，稍后重试: {e}")
+            return None
+        # 未写标签的模型名在 Ollama 中显示为 :latest
+        missing = {model for model in self.optional_models if model not in installed and f"{model}:latest" not in installed}
+        for model in sorted(missing):
+            LOG.info(f"[ModelRouting] Ollama 中没有模型 {model}，相关任务改用 {DEFAULT_MODEL}（可执行 ollama pull {model}）")
+        return missing
+
+    def resolve(self, agent: str, task: str) -> dict:
+        """
+        返回:
+            dict: 包含 model、调用策略（POLICY_KEYS）与生成参数（如 num_predict、temperature）的路由
+        """
+        route = dict(self.routes.get("default", {}))
+        route.update(self.routes.get(task, {}))
+        route.update(self.routes.get(f"{agent}.{task}", {}))
+        route.setdefault("model", DEFAULT_MODEL)
+        route.setdefault("priority", INTERACTIVE)
+        missing = self.missing_models()
+        if route["model"] in missing:
+            route["model"] = DEFAULT_MODEL
+        if route.get("fallback") in missing:
+            route["fallback"] = DEFAULT_MODEL  # 与所用模型相同时不降级
+        return route
+
+    def priority_for(self, agent: str, task: str) -> str:
+        return self.resolve(agent, task)["priority"]
+
+    def settings_for(self, agent: str, task: str, prompt_tokens: int = None, reasoning: bool = False,
+                     model: str = None):
+        """
+        返回 (模型名称, 生成参数)。num_ctx 取该模型的固定值；开启 DYNAMIC_NUM_CTX 且提供提示 token 数时按其设置。
+        model 用于改用其他模型（如降级重试），此时 num_ctx 按实际使用的模型确定。
+        """
+        settings = self.resolve(agent, task)
+        model = model or settings["model"]
+        settings.pop("model")
+        for key in POLICY_KEYS:
+            settings.pop(key, None)
+        if settings.get("reasoning", reasoning) and "num_predict" in settings:
+            settings["num_predict"] += REASONING_TOKEN_BUDGET
+        if "num_ctx" not in settings:
+            if DYNAMIC_NUM_CTX and prompt_tokens is not None:
+                settings["num_ctx"] = context_window(prompt_tokens, settings.get("num_predict", 0))
+            elif num_ctx_for(model):
+                settings["num_ctx"] = num_ctx_for(model)
+        return model, settings
+
+
+# 进程内共享的路由
+model_router = ModelRouter(optional_models=(SMALL_MODEL, FALLBACK_MODEL))
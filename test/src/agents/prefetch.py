@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utils.logger import LOG
+
+# 预取配置（可通过环境变量覆盖）
+PREFETCH_ENABLED = os.getenv("TIRO_PREFETCH_ENABLED", "1") == "1"
+PREFETCH_DEPTH = int(os.getenv("TIRO_PREFETCH_DEPTH", "2"))  # 每个键预备的结果数
+PREFETCH_MAX_AGE = float(os.getenv("TIRO_PREFETCH_MAX_AGE", "3600"))  # 预取结果的最长保鲜时间（秒）
+IDLE_GRACE = float(os.getenv("TIRO_PREFETCH_IDLE_GRACE", "2"))  # 前台请求结束多久后才算空闲（秒）
+POLL_INTERVAL = 1.0  # 后台线程无事可做时的轮询间隔（秒）
+
+
+class ActivityMonitor:
+    """
+    记录前台模型调用的活跃数，供后台任务判断系统是否空闲。
+    """
+    def __init__(self):
+        self._active = 0
+        self._last_active = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._last_active = time.monotonic()
+
+    def is_idle(self, grace: float = IDLE_GRACE) -> bool:
+        with self._lock:
+            return self._active == 0 and time.monotonic() - self._last_active >= grace
+
+
+# 进程内共享的前台活跃度
+activity = ActivityMonitor()
+
+
+class PrefetchPool:
+    """
+    按键（如难度、单词数）预备若干个现成结果的可补充池。
+    """
+    def __init__(self, name, producer, keys, depth=PREFETCH_DEPTH, max_age=PREFETCH_MAX_AGE):
+        self.name = name
+        self.producer = producer  # producer(key) -> str，同步生成一个结果
+        self.keys = list(keys)
+        self.depth = depth
+        self.max_age = max_age
+        self._items = {key: deque() for key in self.keys}
+        self._lock = threading.Lock()
+
+    def _drop_stale(self, key, now: float) -> deque:
+        items = self._items.setdefault(key, deque())
+        while items and now - items[0][0] > self.max_age:
+            items.popleft()
+        return items
+
+    def take(self, key):
+        """
+        取出一个未过期的预取结果，池中没有时返回 None。
+        """
+        with self._lock:
+            items = self._drop_stale(key, time.time())
+            if not items:
+                return None
+            LOG.debug(f"[Prefetch][{self.name}] 命中预取结果 {key}")
+            return items.popleft()[1]
+
+    def next_key_to_fill(self):
+        """
+        返回最需要补充的键（剩余最少者），都已满时返回 None。
+        """
+        with self._lock:
+            now = time.time()
+            candidates = [(len(self._drop_stale(key, now)), key) for key in self.keys]
+        candidates = [item for item in candidates if item[0] < self.depth]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda item: item[0])[1]
+
+    def fill(self, key) -> None:
+        value = self.producer(key)
+        if value:
+            with self._lock:
+                self._items.setdefault(key, deque()).append((time.time(), value))
+            LOG.debug(f"[Prefetch][{self.name}] 已补充 {key}")
+
+
+class Prefetcher:
+    """
+    后台预取器：在系统空闲时依次为各个池补充结果。
+    """
+    def __init__(self, enabled=PREFETCH_ENABLED):
+        self.enabled = enabled
+        self.pools = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    def register(self, pool: PrefetchPool) -> PrefetchPool:
+        self.pools.append(pool)
+        return pool
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="prefetcher", daemon=True)
+        self._thread.start()
+        LOG.info(f"[Prefetch] 后台预取已启动：{[pool.name for pool in self.pools]}")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not activity.is_idle():
+                self._stop.wait(POLL_INTERVAL)
+                continue
+
+            filled = False
+            for pool in self.pools:
+                key = pool.next_key_to_fill()
+                if key is None:
+                    continue
+                try:
+                    pool.fill(key)
+                except Exception as e:
+                    LOG.error(f"[Prefetch][{pool.name}] 预取 {key} 失败: {e}")
+                    self._stop.wait(POLL_INTERVAL * 10)
+                filled = True
+                break  # 每补充一个结果都重新检查是否空闲
+
+            if not filled:
+                self._stop.wait(POLL_INTERVAL)
+
+
+# 进程内唯一的预取器
+prefetcher = Prefetcher()
@@ -0,0 +1,113 @@
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import RunnableGenerator
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    """
+    返回 text 末尾与 tag 开头重合的最大长度（标签可能被拆在两个块之间）。
+    """
+    for length in range(min(len(text), len(tag) - 1), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ThinkFilter:
+    """
+    流式过滤 <think>…</think> 推理片段：逐块输入，只输出推理片段以外的文本。
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._inside = False
+        self._after_close = False  # 推理片段刚结束，跳过其后的空白
+
+    def _emit(self, out: list, text: str) -> None:
+        if self._after_close:
+            text = text.lstrip()
+            if not text:
+                return
+            self._after_close = False
+        out.append(text)
+
+    def feed(self, text: str) -> str:
+        """
+        输入一个文本块，返回可以安全输出的部分。
+        """
+        self._buffer += text or ""
+        out = []
+        while self._buffer:
+            tag = THINK_CLOSE if self._inside else THINK_OPEN
+            index = self._buffer.find(tag)
+            if index >= 0:
+                if not self._inside:
+                    self._emit(out, self._buffer[:index])
+                self._buffer = self._buffer[index + len(tag):]
+                self._inside = not self._inside
+                self._after_close = not self._inside
+                continue
+
+            keep = _partial_tag_length(self._buffer, tag)
+            if not self._inside:
+                self._emit(out, self._buffer[:len(self._buffer) - keep])
+            self._buffer = self._buffer[len(self._buffer) - keep:]
+            break
+        return "".join(out)
+
+    def flush(self) -> str:
+        """
+        流结束时输出剩余文本（未闭合的推理片段直接丢弃）。
+        """
+        rest = "" if self._inside else self._buffer
+        self._buffer = ""
+        self._inside = False
+        out = []
+        self._emit(out, rest)
+        return "".join(out)
+
+
+def strip_think(text: str) -> str:
+    """
+    去掉完整文本中的推理片段。
+    """
+    think_filter = ThinkFilter()
+    return think_filter.feed(text) + think_filter.flush()
+
+
+def _filter_chunks(chunks):
+    think_filter = ThinkFilter()
+    emitted = False
+    usage = None  # 模型在最后一块附带的 token 用量，需要原样传递下去
+    for chunk in chunks:
+        usage = getattr(chunk, "usage_metadata", None) or usage
+        text = think_filter.feed(chunk.content)
+        if text:
+            emitted = True
+            yield AIMessageChunk(content=text)
+    tail = think_filter.flush()
+    if tail or not emitted or usage:
+        yield AIMessageChunk(content=tail, usage_metadata=usage)
+
+
+async def _afilter_chunks(chunks):
+    think_filter = ThinkFilter()
+    emitted = False
+    usage = None  # 模型在最后一块附带的 token 用量，需要原样传递下去
+    async for chunk in chunks:
+        usage = getattr(chunk, "usage_metadata", None) or usage
+        text = think_filter.feed(chunk.content)
+        if text:
+            emitted = True
+            yield AIMessageChunk(content=text)
+    tail = think_filter.flush()
+    if tail or not emitted or usage:
+        yield AIMessageChunk(content=tail, usage_metadata=usage)
+
+
+def create_think_filter() -> RunnableGenerator:
+    """
+    创建接在模型之后的流式过滤步骤，使推理片段不会进入历史、日志与界面。
+    """
+    return RunnableGenerator(_filter_chunks, _afilter_chunks, name="strip_think")
@@ -0,0 +1,116 @@
+import os
+import re
+import time
+
+from utils.metrics import LATENCY_BUCKETS, metrics
+
+from .cancellation import raise_if_cancelled
+
+# 多轮精进的提前停止配置（可通过环境变量覆盖）
+TARGET_SCORE = int(os.getenv("TIRO_REFINE_TARGET_SCORE", "90"))  # 达到该总分即停止
+MIN_GAIN = int(os.getenv("TIRO_REFINE_MIN_GAIN", "2"))  # 相比此前最好成绩提升不足该分数视为停滞
+
+# 要求反思点评在末尾附带的机器可读评分行
+SCORE_INSTRUCTION = "最后单独一行输出机器可读的总分，格式为：SCORE: <0-100 的整数>"
+
+metrics.histogram("tiro_refinement_round_seconds", LATENCY_BUCKETS, "多轮精进每一轮的耗时")
+
+_SCORE_PATTERN = re.compile(r"SCORE\s*[:：]\s*(\d{1,3})", re.IGNORECASE)
+_TOTAL_PATTERN = re.compile(r"总分\s*[:：]?\s*\**\s*(\d{1,3})")
+
+
+def build_reflection_prompt(article: str, difficulty: str) -> str:
+    """
+    构造按难度点评作文的提示（界面与批量评分共用）。
+    """
+    return (
+        f"请基于{difficulty}难度标准，从4个维度点评以下作文：\n"
+        f"1. 评分（内容契合30%，结构完整50%，语法20%）\n"
+        f"2. 优点\n"
+        f"3. 不足\n"
+        f"4. 整体建议\n"
+        f"{SCORE_INSTRUCTION}\n\n作文内容：\n{article}"
+    )
+
+
+def parse_score(text: str):
+    """
+    从反思点评中解析总分。
+    参数:
+        text (str): 反思点评文本
+    返回:
+        int | None: 0-100 的总分，解析不到时返回 None
+    """
+    for pattern in (_SCORE_PATTERN, _TOTAL_PATTERN):
+        matches = pattern.findall(text or "")
+        if matches:
+            score = int(matches[-1])
+            if 0 <= score <= 100:
+                return score
+    return None
+
+
+class RefinementStopper:
+    """
+    根据每轮反思的评分决定是否提前结束多轮精进：
+    分数达到目标，或相比此前最好成绩没有明显提升时停止。
+    同时记录每一轮的耗时（begin_round 开始一轮，下一轮开始、停止或汇总时结束）。
+    """
+    def __init__(self, max_rounds: int, target_score: int = TARGET_SCORE, min_gain: int = MIN_GAIN,
+                 pipeline: str = "refine"):
+        self.max_rounds = max_rounds
+        self.target_score = target_score
+        self.min_gain = min_gain
+        self.pipeline = pipeline  # 指标中区分不同的多轮流程
+        self.scores = []
+        self.reason = None
+        self.round_durations = []
+        self._round_started = None
+
+    @property
+    def rounds_run(self) -> int:
+        return len(self.scores)
+
+    def begin_round(self) -> None:
+        """开始计时新的一轮（结束上一轮的计时）；请求已被放弃时不再开始新一轮"""
+        self._end_round()
+        raise_if_cancelled()
+        self._round_started = time.monotonic()
+
+    def _end_round(self) -> None:
+        if self._round_started is None:
+            return
+        elapsed = time.monotonic() - self._round_started
+        self._round_started = None
+        self.round_durations.append(elapsed)
+        metrics.observe("tiro_refinement_round_seconds", elapsed, pipeline=self.pipeline)
+
+    def should_stop(self, score) -> bool:
+        """
+        记录一轮的评分，返回是否应该停止后续轮次。
+        """
+        best = max((s for s in self.scores if s is not None), default=None)
+        self.scores.append(score)
+        if score is None:
+            return False
+        if score >= self.target_score:
+            self.reason = f"总分 {score} 已达到目标 {self.target_score}"
+        elif best is not None and score - best < self.min_gain:
+            self.reason = f"总分 {score} 相比此前最好成绩 {best} 没有明显提升"
+        else:
+            return False
+        self._end_round()
+        return True
+
+    def summary(self) -> str:
+        """
+        生成记录实际轮次与停止原因的 Markdown 段落。
+        """
+        self._end_round()
+        scores = " → ".join("?" if s is None else str(s) for s in self.scores) or "无"
+        line = f"### 📊 精进轮次：实际 {self.rounds_run} / 计划 {self.max_rounds} 轮（评分：{scores}）"
+        if self.round_durations:
+            line += f"\n各轮耗时：{' / '.join(f'{d:.1f}s' for d in self.round_durations)}"
+        if self.reason and self.rounds_run < self.max_rounds:
+            line += f"\n提前结束：{self.reason}"
+        return line
@@ -7,6 +7,8 @@ class ReflectionAgent(AgentBase):
     """
     对话代理类，负责处理与用户的对话。
     """
+    default_task = "reflection"
+
     def __init__(self, session_id=None):
         super().__init__(
             name="reflection",
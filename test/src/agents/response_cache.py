@@ -0,0 +1,193 @@
+import atexit
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from utils.logger import LOG
+
+# 响应缓存配置（可通过环境变量覆盖）
+CACHE_TTL = float(os.getenv("TIRO_CACHE_TTL", str(24 * 3600)))  # 缓存有效期（秒）
+CACHE_MAX_ENTRIES = int(os.getenv("TIRO_CACHE_MAX_ENTRIES", "512"))  # 内存 LRU 的条目上限
+CACHE_DB_PATH = os.getenv("TIRO_CACHE_DB", "data/response_cache.sqlite3")  # 为空时不落盘
+# 出题、生成单词等带随机性的任务按会话缓存（不同用户不共享同一份"随机"结果），只在内存中短期保留
+SESSION_SCOPED_TASKS = frozenset(
+    task.strip() for task in os.getenv("TIRO_CACHE_SESSION_TASKS", "topic,vocabulary").split(",") if task.strip()
+)
+SESSION_CACHE_TTL = float(os.getenv("TIRO_CACHE_SESSION_TTL", str(min(600.0, CACHE_TTL))))  # 按会话缓存的有效期（秒）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def cache_scope(task: str, session_id: str = None):
+    """
+    按会话缓存的任务返回会话ID（计入缓存键），其余任务返回 None（所有会话共享）。
+    """
+    return session_id if task in SESSION_SCOPED_TASKS else None
+
+
+def make_cache_key(agent_name: str, system_prompt: str, model: str, settings: dict, messages: list,
+                   scope: str = None) -> str:
+    """
+    由 Agent、系统提示、模型、生成参数、输入消息与缓存范围（会话ID）计算缓存键。
+    """
+    payload = json.dumps(
+        {
+            "agent": agent_name,
+            "system": system_prompt,
+            "model": model,
+            "settings": settings,
+            "messages": [[message.type, message.content] for message in messages],
+            "scope": scope,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    两级响应缓存：内存 LRU 在前，SQLite 磁盘存储在后，均按 TTL 过期。
+    同一个键正在生成时，后到的请求等待并共享这一次生成结果（single-flight）。
+    磁盘写入交给后台线程，请求线程只写内存。
+    """
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, db_path=CACHE_DB_PATH,
+                 session_ttl=SESSION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.session_ttl = session_ttl
+        self._memory = OrderedDict()  # key -> (过期时间, 文本)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self._writes = queue.Queue()  # 待写入磁盘的 (key, 文本, 过期时间)
+        self._db = None
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            self._db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+            threading.Thread(target=self._write_behind, args=(db_path,), name="cache-writer", daemon=True).start()
+            atexit.register(self.flush)
+
+    def get(self, key: str):
+        """
+        读取未过期的缓存，未命中返回 None。
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            self._remember(key, row[1], row[0])
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float = None, scoped: bool = False) -> None:
+        """
+        写入缓存。scoped=True（按会话缓存）时默认使用较短的 session_ttl，且只保存在内存中。
+        """
+        if ttl is None:
+            ttl = self.session_ttl if scoped else self.ttl
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+        if self._db is not None and not scoped:
+            self._writes.put((key, value, expires_at))
+
+    def flush(self) -> None:
+        """
+        阻塞直到已提交的磁盘写入全部完成。
+        """
+        if self._db is not None:
+            self._writes.join()
+
+    def _write_behind(self, db_path: str) -> None:
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        while True:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)", batch
+                    )
+            except sqlite3.Error as e:
+                LOG.error(f"[ResponseCache] 写入磁盘缓存失败（{len(batch)} 条）: {e}")
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    def _remember(self, key: str, expires_at: float, value: str) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def begin(self, key: str):
+        """
+        登记一次生成。
+        返回:
+            tuple: (Future, 是否由调用方负责生成)；不负责生成时等待 Future 即可拿到结果
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def complete(self, key: str, value: str, ttl: float = None, scoped: bool = False) -> None:
+        """
+        写入生成结果并唤醒等待同一键的请求。
+        """
+        self.set(key, value, ttl, scoped)
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_result(value)
+
+    def fail(self, key: str, error: BaseException) -> None:
+        """
+        生成失败或被放弃：不写缓存，把异常传给等待者。
+        """
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_exception(error if isinstance(error, Exception) else RuntimeError("生成已中断"))
+        LOG.debug(f"[ResponseCache] 生成未完成，未写入缓存: {error!r}")
+
+
+# 进程内共享的响应缓存
+response_cache = ResponseCache()
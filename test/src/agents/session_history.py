@@ -1,10 +1,221 @@
-from langchain_core.chat_history import(
-    BaseChatMessageHistory,  # 基础聊天消息历史类
-    InMemoryChatMessageHistory,  # 内存中的聊天消息历史类
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.chat_history import BaseChatMessageHistory  # 基础聊天消息历史类
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    ChatMessage,
+    HumanMessage,
+    SystemMessage,
 )
 
-# 用于存储会话历史的字典
-store = {}
+from utils.logger import LOG
+
+# 会话存储上限配置（可通过环境变量覆盖）
+MAX_SESSIONS = int(os.getenv("TIRO_HISTORY_MAX_SESSIONS", "1000"))  # 最多保留的会话数
+MAX_BYTES = int(os.getenv("TIRO_HISTORY_MAX_BYTES", str(64 * 1024 * 1024)))  # 所有会话消息的总内存上限
+SESSION_TTL = float(os.getenv("TIRO_HISTORY_TTL", str(6 * 3600)))  # 会话空闲多久后淘汰（秒）
+SWEEP_INTERVAL = 60.0  # 两次过期扫描的最小间隔（秒）
+HISTORY_BACKEND = os.getenv("TIRO_HISTORY_BACKEND", "memory")  # memory 或 sqlite
+
+# 角色标签使用驻留字符串，所有消息记录共享同一个对象
+_ROLE_HUMAN = sys.intern("human")
+_ROLE_AI = sys.intern("ai")
+_ROLE_SYSTEM = sys.intern("system")
+
+_MESSAGE_CLASSES = {
+    _ROLE_HUMAN: HumanMessage,
+    _ROLE_AI: AIMessage,
+    _ROLE_SYSTEM: SystemMessage,
+}
+
+
+class MessageRecord:
+    """
+    紧凑的消息记录，只保留角色与内容，不保存 LangChain 消息上的元数据。
+    tokens 缓存该消息的 token 估算值，首次计算后不再重复计算。
+    """
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role, content, tokens=None):
+        self.role = role
+        self.content = content
+        self.tokens = tokens
+
+    @classmethod
+    def from_message(cls, message: BaseMessage):
+        # 流式输出得到的是 AIMessageChunk 等子类，按所属的基本类型归类
+        for role, message_class in _MESSAGE_CLASSES.items():
+            if isinstance(message, message_class):
+                return cls(role, message.content)
+        # 其他类型的消息按 ChatMessage 保存其角色名（流式块的 type 带 "Chunk" 后缀，去掉后保存）
+        role = getattr(message, "role", None) or message.type.removesuffix("Chunk")
+        return cls(sys.intern(role), message.content)
+
+    def to_message(self) -> BaseMessage:
+        message_class = _MESSAGE_CLASSES.get(self.role)
+        if message_class is None:
+            return ChatMessage(role=self.role, content=self.content)
+        return message_class(content=self.content)
+
+    def size(self) -> int:
+        """估算该记录占用的内存字节数"""
+        return sys.getsizeof(self) + sys.getsizeof(self.content)
+
+
+class CompactChatMessageHistory(BaseChatMessageHistory):
+    """
+    以紧凑记录保存消息的聊天历史，只在构建提示时还原为 LangChain 消息。
+    """
+    def __init__(self, session_id: str, session_store=None):
+        self.session_id = session_id
+        self._records = []
+        self.size = 0  # 当前会话消息占用的字节数
+        self.summary = ""  # 早期对话的滚动摘要
+        self.summarized_upto = 0  # 已被摘要覆盖的记录数
+        self._session_store = session_store
+
+    @property
+    def records(self) -> list:
+        """紧凑记录列表（只读访问；追加请用 add_records）"""
+        return self._records
+
+    @property
+    def messages(self) -> list:
+        return [record.to_message() for record in self.records]
+
+    def add_messages(self, messages) -> None:
+        self.add_records([MessageRecord.from_message(message) for message in messages])
+
+    def add_records(self, records: list) -> None:
+        """追加已转换好的紧凑记录"""
+        added = sum(record.size() for record in records)
+        self._records.extend(records)
+        self.size += added
+        if self._session_store is not None:
+            self._session_store.on_resize(self, added)
+
+    def set_summary(self, summary: str, summarized_upto: int) -> None:
+        """更新早期对话的滚动摘要（前 summarized_upto 条记录已被摘要覆盖）"""
+        self.summary = summary
+        self.summarized_upto = summarized_upto
+
+    def clear(self) -> None:
+        removed = self.size
+        self._records = []
+        self.size = 0
+        self.summary = ""
+        self.summarized_upto = 0
+        if self._session_store is not None:
+            self._session_store.on_resize(self, -removed)
+
+
+class SessionStore:
+    """
+    有上限的会话存储：按最近最少使用（LRU）与空闲超时（TTL）淘汰会话，
+    同时限制会话数量与消息总内存。
+    """
+    def __init__(self, max_sessions=MAX_SESSIONS, max_bytes=MAX_BYTES, ttl=SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self._sessions = OrderedDict()  # session_id -> 聊天历史，按最近访问排序
+        self._last_access = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.RLock()
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _create_history(self, session_id: str) -> BaseChatMessageHistory:
+        return CompactChatMessageHistory(session_id, self)
+
+    def get(self, session_id: str) -> BaseChatMessageHistory:
+        """
+        获取会话历史，不存在时创建，并刷新其最近访问时间。
+        """
+        now = time.monotonic()
+        with self._lock:
+            history = self._sessions.get(session_id)
+            if history is None:
+                history = self._create_history(session_id)
+                self._sessions[session_id] = history
+            else:
+                self._sessions.move_to_end(session_id)
+            self._last_access[session_id] = now
+
+            if now - self._last_sweep >= SWEEP_INTERVAL:
+                self._evict_expired(now)
+            self._evict_over_limit(keep=session_id)
+            return history
+
+    def on_resize(self, history, delta: int) -> None:
+        """
+        会话消息增减时更新总内存，并在超出上限时淘汰最久未用的会话。
+        """
+        with self._lock:
+            if self._sessions.get(history.session_id) is not history:
+                return  # 已被淘汰的会话不再计入
+            self.total_bytes += delta
+            self._evict_over_limit(keep=history.session_id)
+
+    def pop(self, session_id: str):
+        """
+        移除指定会话，返回被移除的聊天历史（不存在时返回 None）。
+        """
+        with self._lock:
+            history = self._sessions.pop(session_id, None)
+            self._last_access.pop(session_id, None)
+            if history is not None:
+                self.total_bytes -= getattr(history, "size", 0)
+            return history
+
+    def _evict_expired(self, now: float) -> None:
+        self._last_sweep = now
+        expired = [sid for sid, ts in self._last_access.items() if now - ts > self.ttl]
+        for session_id in expired:
+            self.pop(session_id)
+        if expired:
+            LOG.debug(f"[SessionStore] 淘汰 {len(expired)} 个空闲会话")
+
+    def _evict_over_limit(self, keep: str) -> None:
+        while len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                if len(self._sessions) == 1:
+                    break  # 只剩当前会话时不淘汰自身
+                self._sessions.move_to_end(oldest)
+                continue
+            self.pop(oldest)
+            LOG.debug(f"[SessionStore] 超出上限，淘汰会话 {oldest}")
+
+
+def create_store(backend: str = HISTORY_BACKEND) -> SessionStore:
+    """
+    按配置创建会话存储后端。
+    参数:
+        backend (str): "memory" 为纯内存存储，"sqlite" 为 SQLite 持久化存储
+    返回:
+        SessionStore: 会话存储实例
+    """
+    if backend == "sqlite":
+        from .sqlite_history import SQLiteSessionStore
+        return SQLiteSessionStore()
+    if backend != "memory":
+        LOG.warning(f"[SessionStore] 未知的历史存储后端 {backend}，使用内存存储")
+    return SessionStore()
+
+
+# 用于存储会话历史的全局存储
+store = create_store()
 
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
     """
@@ -14,7 +225,4 @@ def get_session_history(session_id: str) -> BaseChatMessageHistory:
     返回:
         BaseChatMessageHistory: 对应会话的聊天历史对象
     """
-    if session_id not in store:
-        # 如果会话ID不存在与存储中，创建一个新的内存聊天历史实例
-        store[session_id] = InMemoryChatMessageHistory()
-    return store[session_id]
+    return store.get(session_id)
@@ -0,0 +1,297 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from utils.logger import LOG
+
+from .session_history import MAX_SESSIONS, CompactChatMessageHistory, MessageRecord, SessionStore
+
+# SQLite 持久化配置（可通过环境变量覆盖）
+HISTORY_DB_PATH = os.getenv("TIRO_HISTORY_DB", "data/chat_history.sqlite3")
+FLUSH_BATCH_SIZE = int(os.getenv("TIRO_HISTORY_FLUSH_BATCH", "200"))  # 每批最多写入的操作数
+FLUSH_INTERVAL = float(os.getenv("TIRO_HISTORY_FLUSH_INTERVAL", "0.5"))  # 攒批等待的最长时间（秒）
+# 磁盘上的会话按空闲时间与数量清理，0 表示不清理；保留时间远长于内存中的会话（默认 30 天），
+# 磁盘占用主要由会话数上限控制
+DB_TTL = float(os.getenv("TIRO_HISTORY_DB_TTL", str(30 * 24 * 3600)))  # 最后一条消息写入多久后删除该会话（秒）
+DB_MAX_SESSIONS = int(os.getenv("TIRO_HISTORY_DB_MAX_SESSIONS", str(MAX_SESSIONS)))  # 磁盘上最多保留的会话数
+PRUNE_INTERVAL = float(os.getenv("TIRO_HISTORY_PRUNE_INTERVAL", "600"))  # 两次清理的最小间隔（秒）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    is_json INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+CREATE TABLE IF NOT EXISTS summaries (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    summarized_upto INTEGER NOT NULL
+);
+"""
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """
+    打开 WAL 模式的 SQLite 连接。
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class WriteBehindWriter:
+    """
+    后台写线程：把追加与清空操作放入队列，攒批后在一个事务里写入，
+    请求线程只负责入队，不等待磁盘写入。
+    """
+    def __init__(self, db_path=HISTORY_DB_PATH, batch_size=FLUSH_BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._pending = {}  # session_id -> 尚未落盘的操作数
+        self._written = threading.Condition()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = _connect(db_path)
+        conn.executescript(_SCHEMA)
+        conn.close()
+
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def append(self, session_id: str, records: list) -> None:
+        now = time.time()
+        rows = []
+        for record in records:
+            content, is_json = record.content, 0
+            if not isinstance(content, str):
+                content, is_json = json.dumps(content, ensure_ascii=False), 1
+            rows.append((session_id, record.role, content, is_json, now))
+        self._put("append", session_id, rows)
+
+    def delete(self, session_id: str) -> None:
+        self._put("delete", session_id, session_id)
+
+    def save_summary(self, session_id: str, summary: str, summarized_upto: int) -> None:
+        self._put("summary", session_id, (session_id, summary, summarized_upto))
+
+    def prune(self, cutoff: float, max_sessions: int, keep: list) -> None:
+        """
+        删除最后写入早于 cutoff 的会话，并只保留最近写入的 max_sessions 个会话；keep 中的会话（仍在内存中）不删除。
+        """
+        self._queue.put(("prune", None, (cutoff, max_sessions, keep)))
+
+    def _put(self, op: str, session_id: str, payload) -> None:
+        with self._written:
+            self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        self._queue.put((op, session_id, payload))
+
+    def flush(self, session_id: str = None) -> None:
+        """
+        阻塞直到已入队的操作写入磁盘；指定 session_id 时只等待该会话的操作。
+        """
+        if session_id is None:
+            self._queue.join()
+            return
+        with self._written:
+            self._written.wait_for(lambda: session_id not in self._pending)
+
+    def _run(self) -> None:
+        conn = _connect(self.db_path)
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                with conn:
+                    for op, _, payload in batch:
+                        if op == "append":
+                            conn.executemany(
+                                "INSERT INTO messages (session_id, role, content, is_json, created_at) "
+                                "VALUES (?, ?, ?, ?, ?)",
+                                payload,
+                            )
+                        elif op == "delete":
+                            conn.execute("DELETE FROM messages WHERE session_id = ?", (payload,))
+                            conn.execute("DELETE FROM summaries WHERE session_id = ?", (payload,))
+                        elif op == "summary":
+                            conn.execute(
+                                "INSERT OR REPLACE INTO summaries (session_id, summary, summarized_upto) VALUES (?, ?, ?)",
+                                payload,
+                            )
+                        else:
+                            self._prune(conn, *payload)
+            except sqlite3.Error as e:
+                LOG.error(f"[SQLiteHistory] 批量写入失败（{len(batch)} 个操作）: {e}")
+            finally:
+                with self._written:
+                    for _, session_id, _ in batch:
+                        if session_id is not None:
+                            self._pending[session_id] -= 1
+                            if not self._pending[session_id]:
+                                del self._pending[session_id]
+                    self._written.notify_all()
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _prune(conn: sqlite3.Connection, cutoff: float, max_sessions: int, keep: list) -> None:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_sessions (session_id TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM keep_sessions")
+        conn.executemany("INSERT OR IGNORE INTO keep_sessions VALUES (?)", [(sid,) for sid in keep])
+        removed = 0
+        if cutoff is not None:
+            removed += conn.execute(
+                "DELETE FROM messages WHERE session_id NOT IN (SELECT session_id FROM keep_sessions) "
+                "AND session_id IN (SELECT session_id FROM messages GROUP BY session_id HAVING MAX(created_at) < ?)",
+                (cutoff,),
+            ).rowcount
+        if max_sessions > 0:
+            removed += conn.execute(
+                "DELETE FROM messages WHERE session_id NOT IN (SELECT session_id FROM keep_sessions) "
+                "AND session_id NOT IN (SELECT session_id FROM messages GROUP BY session_id "
+                "ORDER BY MAX(created_at) DESC LIMIT ?)",
+                (max_sessions,),
+            ).rowcount
+        conn.execute("DELETE FROM summaries WHERE session_id NOT IN (SELECT DISTINCT session_id FROM messages)")
+        if removed:
+            LOG.debug(f"[SQLiteHistory] 清理过期会话，删除 {removed} 条消息")
+
+
+class SQLiteChatMessageHistory(CompactChatMessageHistory):
+    """
+    SQLite 持久化的聊天历史：内存中保存紧凑记录，写入交给后台线程批量落盘，
+    重启后在会话第一次被访问时才从数据库加载。
+    """
+    def __init__(self, session_id: str, session_store, writer: WriteBehindWriter):
+        super().__init__(session_id, session_store)
+        self._writer = writer
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._writer.flush(self.session_id)  # 先写完同一会话尚未落盘的操作
+            rows = self._session_store.read_rows(self.session_id)
+            records = [
+                MessageRecord(role, json.loads(content) if is_json else content)
+                for role, content, is_json in rows
+            ]
+            saved = self._session_store.read_summary(self.session_id)
+            self._loaded = True
+            if records:
+                super().add_records(records)
+            if saved is not None:
+                super().set_summary(saved[0], min(saved[1], len(records)))
+
+    @property
+    def records(self) -> list:
+        self._ensure_loaded()
+        return super().records
+
+    # 摘要与记录一同从磁盘加载：先读摘要（如构建提示）也能取到已保存的值
+    @property
+    def summary(self) -> str:
+        self._ensure_loaded()
+        return self._summary
+
+    @summary.setter
+    def summary(self, value: str) -> None:
+        self._summary = value
+
+    @property
+    def summarized_upto(self) -> int:
+        self._ensure_loaded()
+        return self._summarized_upto
+
+    @summarized_upto.setter
+    def summarized_upto(self, value: int) -> None:
+        self._summarized_upto = value
+
+    @property
+    def messages(self) -> list:
+        self._ensure_loaded()
+        return super().messages
+
+    def add_messages(self, messages) -> None:
+        self._ensure_loaded()
+        records = [MessageRecord.from_message(message) for message in messages]
+        super().add_records(records)
+        self._writer.append(self.session_id, records)
+
+    def set_summary(self, summary: str, summarized_upto: int) -> None:
+        self._ensure_loaded()
+        super().set_summary(summary, summarized_upto)
+        self._writer.save_summary(self.session_id, summary, summarized_upto)  # 重新加载时不必重新摘要
+
+    def clear(self) -> None:
+        self._ensure_loaded()
+        super().clear()
+        self._writer.delete(self.session_id)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    使用 SQLite 持久化的会话存储。内存中的会话仍按 LRU/TTL 淘汰，
+    被淘汰的会话保留在磁盘上，再次访问时重新加载；磁盘上长期未写入或超出数量上限的会话定期清理。
+    """
+    def __init__(self, db_path=HISTORY_DB_PATH, db_ttl=DB_TTL, db_max_sessions=DB_MAX_SESSIONS, **kwargs):
+        super().__init__(**kwargs)
+        self.db_ttl = db_ttl
+        self.db_max_sessions = db_max_sessions
+        self.writer = WriteBehindWriter(db_path)
+        self._read_conn = _connect(db_path)
+        self._read_lock = threading.Lock()
+        self._last_prune = float("-inf")
+
+    def _create_history(self, session_id: str):
+        return SQLiteChatMessageHistory(session_id, self, self.writer)
+
+    def _evict_expired(self, now: float) -> None:
+        super()._evict_expired(now)
+        if now - self._last_prune < PRUNE_INTERVAL or (self.db_ttl <= 0 and self.db_max_sessions <= 0):
+            return
+        self._last_prune = now
+        # 在后台写线程中清理磁盘上的会话，不阻塞请求
+        cutoff = time.time() - self.db_ttl if self.db_ttl > 0 else None
+        self.writer.prune(cutoff, self.db_max_sessions, list(self._sessions))
+
+    def read_rows(self, session_id: str) -> list:
+        with self._read_lock:
+            cursor = self._read_conn.execute(
+                "SELECT role, content, is_json FROM messages WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            )
+            return cursor.fetchall()
+
+    def read_summary(self, session_id: str):
+        """返回已保存的 (摘要, 覆盖的记录数)，没有时返回 None"""
+        with self._read_lock:
+            return self._read_conn.execute(
+                "SELECT summary, summarized_upto FROM summaries WHERE session_id = ?", (session_id,)
+            ).fetchone()
@@ -1,10 +1,64 @@
+import os
+
 from langchain_core.messages import HumanMessage
 from .session_history import get_session_history  # 只导入已存在的get_session_history
+from .admission import BACKGROUND, admission
 from .agent_base import AgentBase
+from .lexicon import LEXICON_ENABLED, get_lexicon
+from .vocab_cards import (
+    EXAMPLE_FIELDS,
+    MAX_ITEM_RETRIES,
+    CardStreamParser,
+    examples_prompt,
+    format_card,
+    format_example,
+    format_lexicon_card,
+    parse_card,
+    repair_cards_prompt,
+    structured_vocabulary_prompt,
+)
+from .vocab_matcher import VocabMatcher
 from utils.logger import LOG
 
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+class VocabSession:
+    """单个用户的词汇学习状态（每个浏览器会话一份，Agent 本身不保存用户状态）"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id  # 该用户在词汇 Agent 下的历史会话ID
+        self.word_count = 5  # 默认生成5个单词
+        self.level = None  # 单词难度（初中/高中/大学），None 表示不限
+        self.max_band = None  # 本地词库的最大词频段（1 最常用），None 表示不限
+        self.current_words = []  # 当前生成的单词列表
+        self.words_generated = False  # 标记是否已生成单词
+        self.in_conversation = False  # 标记是否在情景对话中
+        self.matcher = VocabMatcher([])  # 当前单词组的用法匹配器（每组单词构建一次）
+        self.word_lines = []  # 单词展示区的各行文本
+        self.word_line_index = {}  # 单词 -> 其所在的展示行
+
+    def reset(self):
+        """重置所有状态变量"""
+        self.word_count = 5
+        self.level = None
+        self.max_band = None
+        self.current_words = []
+        self.words_generated = False
+        self.in_conversation = False
+        self.matcher = VocabMatcher([])
+        self.word_lines = []
+        self.word_line_index = {}
+
+
 class VocabAgent(AgentBase):
     """词汇学习代理类，负责生成单词和管理情景对话"""
+    # 是否以 JSON 结构化输出单词卡片（逐个卡片解析、校验与单独修复）
+    structured_vocabulary = os.getenv("TIRO_VOCAB_STRUCTURED", "1") == "1"
+    # 是否优先从本地词库抽取单词卡片（模型只生成例句）
+    use_lexicon = LEXICON_ENABLED
     
     def __init__(self, session_id=None):
         super().__init__(
@@ -12,86 +66,342 @@ class VocabAgent(AgentBase):
             prompt_file="prompts/vocab_study_prompt.txt",
             session_id=session_id
         )
-        self.word_count = 5  # 默认生成5个单词
-        self.current_words = []  # 当前生成的单词列表
-        self.words_generated = False  # 标记是否已生成单词
-        self.in_conversation = False  # 标记是否在情景对话中
+        self.prefetch_pool = None  # 可选的预取池（按单词数量预备现成的单词组）
 
-    def set_word_count(self, count):
+    def new_session(self, user_session=None):
+        """为一个用户创建独立的词汇学习状态"""
+        return VocabSession(self.session_for(user_session))
+
+    def set_word_count(self, state, count):
         """设置要生成的单词数量"""
-        self.word_count = count
-        LOG.info(f"已设置单词数量: {self.word_count}")
+        state.word_count = count
+        LOG.info(f"已设置单词数量: {state.word_count}")
+
+    def generate_vocabulary(self, state, count=None, refresh=False, level=None, max_band=None):
+        """生成指定数量的英语单词（可缓存；refresh=True 时重新生成）"""
+        return "".join(self.stream_vocabulary(state, count, refresh, level, max_band))
 
-    def generate_vocabulary(self, count=None):
-        """生成指定数量的英语单词"""
+    def build_vocabulary_prompt(self, state, count=None, level=None, max_band=None):
+        """构建生成单词的提示（难度与词频段只用于从本地词库抽取，空字符串 / 0 表示不限）"""
         if count is not None:
-            self.word_count = count
-        LOG.info(f"开始生成{self.word_count}个单词")
-        
-        # 构建生成单词的提示
-        prompt = (f"请生成{self.word_count}个常用英语单词，每个单词应包含以下信息：\n"
-                 f"1. 单词拼写\n"
-                 f"2. 音标\n"
-                 f"3. 词性\n"
-                 f"4. 中文释义\n"
-                 f"5. 英文例句\n"
-                 f"6. 例句中文翻译\n\n"
-                 f"请使用以下格式输出：\n"
-                 f"[单词1] - [音标] - 词性 - 中文释义 - 例句：英文例句 - 中文翻译\n"
-                 f"[单词2] - [音标] - 词性 - 中文释义 - 例句：英文例句 - 中文翻译\n"
-                 f"...")
-        
-        response = self.chat_with_history(prompt)
-        
-        # 提取单词列表（优化格式匹配）
-        self.current_words = []
-        for line in response.split('\n'):
+            state.word_count = count
+        if level is not None:
+            state.level = level or None
+        if max_band is not None:
+            state.max_band = max_band or None
+        LOG.info(f"开始生成{state.word_count}个单词")
+        return self.vocabulary_prompt(state.word_count)
+
+    def vocabulary_prompt(self, word_count):
+        """按单词数量构建生成提示"""
+        if self.structured_vocabulary:
+            return structured_vocabulary_prompt(word_count)
+        return (f"请生成{word_count}个常用英语单词，每个单词应包含以下信息：\n"
+                f"1. 单词拼写\n"
+                f"2. 音标\n"
+                f"3. 词性\n"
+                f"4. 中文释义\n"
+                f"5. 英文例句\n"
+                f"6. 例句中文翻译\n\n"
+                f"请使用以下格式输出：\n"
+                f"[单词1] - [音标] - 词性 - 中文释义 - 例句：英文例句 - 中文翻译\n"
+                f"[单词2] - [音标] - 词性 - 中文释义 - 例句：英文例句 - 中文翻译\n"
+                f"...")
+
+    def parse_vocabulary(self, state, response):
+        """从生成结果中提取单词列表（优化格式匹配）"""
+        state.current_words = []
+        state.word_lines = response.split('\n')
+        state.word_line_index = {}
+        word_pos = {}  # 单词 -> 词性（各种格式的第三段），用于只接受与词性相符的变化形式
+        for line_no, line in enumerate(state.word_lines):
             line = line.strip()
             if not line or ' - ' not in line:
                 continue
-            word = line.split(' - ')[0].strip()
-            self.current_words.append(word)
-        
-        self.words_generated = len(self.current_words) > 0
-        LOG.info(f"成功生成{len(self.current_words)}个单词")
+            fields = line.split(' - ')
+            word = fields[0].strip()
+            state.current_words.append(word)
+            state.word_line_index.setdefault(word, line_no)
+            if len(fields) > 2:
+                word_pos.setdefault(word, fields[2].strip())
         
+        state.matcher = VocabMatcher(state.current_words, word_pos)
+        state.words_generated = len(state.current_words) > 0
+        LOG.info(f"成功生成{len(state.current_words)}个单词")
+
+    def produce_vocabulary(self, word_count):
+        """
+        为预取池生成一组可直接展示的单词（不带会话历史，按后台任务排队）：
+        词库可用时抽取词条并生成例句（即交互时需要等待模型的部分），否则由模型生成单词卡片。
+        """
+        lexicon = get_lexicon() if self.use_lexicon else None
+        entries = lexicon.sample(word_count) if lexicon is not None else []
+        if len(entries) == word_count:
+            prompt = examples_prompt([entry["word"] for entry in entries])
+            examples = self.generate_text([HumanMessage(content=prompt)], task="examples", priority=BACKGROUND)
+            return "".join(self.lexicon_card_lines(entries)) + "\n例句：\n" + "".join(self.example_lines(examples))
+        # 整组生成与随后的修复补齐共用同一个后台名额：补齐调用显式复用，不再重新排队，也不会按交互优先级插队
+        with admission.slot(BACKGROUND) as held:
+            text = self.generate_text([HumanMessage(content=self.vocabulary_prompt(word_count))], task="vocabulary",
+                                      priority=BACKGROUND, held=held)
+            if self.structured_vocabulary:
+                text = "".join(self.stream_cards([text], word_count, held))
+        return text
+
+    def prefetchable(self, state):
+        """预取的单词组不区分难度与词频段，只在从词库抽取且不限难度与词频时使用"""
+        if not self.use_lexicon:
+            return True
+        return state.level is None and state.max_band is None
+
+    def take_prefetched(self, state, prompt):
+        """从预取池取一组现成的单词，命中时记入会话历史并解析单词列表"""
+        if self.prefetch_pool is None or not self.prefetchable(state):
+            return None
+        response = self.prefetch_pool.take(state.word_count)
+        if response is not None:
+            self.record_exchange([HumanMessage(content=prompt)], response, state.session_id)
         return response
 
-    def start_situation_chat(self):
+    def sample_lexicon(self, state):
+        """从本地词库抽取一组单词（词库不可用或词条不足时返回 None，由模型生成）"""
+        if not self.use_lexicon:
+            return None
+        lexicon = get_lexicon()
+        if lexicon is None:
+            return None
+        entries = lexicon.sample(state.word_count, level=state.level, max_band=state.max_band,
+                                 exclude=state.current_words)
+        if len(entries) < state.word_count:
+            entries = lexicon.sample(state.word_count, level=state.level, max_band=state.max_band)
+        if len(entries) < state.word_count:
+            return None
+        LOG.info(f"从本地词库抽取{len(entries)}个单词")
+        return entries
+
+    @staticmethod
+    def lexicon_card_lines(entries):
+        return [format_lexicon_card(entry) + "\n" for entry in entries]
+
+    @staticmethod
+    def example_lines(delta, parser=None):
+        """从例句输出（流式时传入同一个 parser 逐块解析）中取出已完整的例句展示行"""
+        parser = parser or CardStreamParser()
+        lines = []
+        for raw in parser.feed(delta):
+            example, _ = parse_card(raw, EXAMPLE_FIELDS)
+            if example:
+                lines.append(format_example(example) + "\n")
+        return lines
+
+    def stream_lexicon_cards(self, state, entries):
+        """立即产出词库中的单词卡片，再流式产出模型新生成的例句"""
+        yield "".join(self.lexicon_card_lines(entries))
+        yield "\n例句：\n"
+        parser = CardStreamParser()
+        prompt = examples_prompt([entry["word"] for entry in entries])
+        for delta in self.stream_deltas([HumanMessage(content=prompt)], state.session_id, task="examples"):
+            yield from self.example_lines(delta, parser)
+
+    async def astream_lexicon_cards(self, state, entries):
+        """stream_lexicon_cards 的异步版本"""
+        yield "".join(self.lexicon_card_lines(entries))
+        yield "\n例句：\n"
+        parser = CardStreamParser()
+        prompt = examples_prompt([entry["word"] for entry in entries])
+        async for delta in self.astream_deltas([HumanMessage(content=prompt)], state.session_id, task="examples"):
+            for line in self.example_lines(delta, parser):
+                yield line
+
+    def stream_vocabulary(self, state, count=None, refresh=False, level=None, max_band=None):
+        """流式生成指定数量的英语单词，逐块产出文本，结束后解析单词列表"""
+        prompt = self.build_vocabulary_prompt(state, count, level, max_band)
+        prefetched = self.take_prefetched(state, prompt)
+        entries = self.sample_lexicon(state) if prefetched is None else None
+        if prefetched is not None:
+            deltas = [prefetched]  # 预取的单词组已是展示格式
+        elif entries:
+            deltas = self.stream_lexicon_cards(state, entries)
+        else:
+            deltas = self.cached_stream_deltas([HumanMessage(content=prompt)], state.session_id, refresh,
+                                              task="vocabulary")
+            if self.structured_vocabulary:
+                deltas = self.stream_cards(deltas, state.word_count)
+        parts = []
+        for delta in deltas:
+            parts.append(delta)
+            yield delta
+        self.parse_vocabulary(state, "".join(parts))
+
+    async def astream_vocabulary(self, state, count=None, refresh=False, level=None, max_band=None):
+        """stream_vocabulary 的异步版本"""
+        prompt = self.build_vocabulary_prompt(state, count, level, max_band)
+        prefetched = self.take_prefetched(state, prompt)
+        entries = self.sample_lexicon(state) if prefetched is None else None
+        if prefetched is not None:
+            deltas = _aiter([prefetched])  # 预取的单词组已是展示格式
+        elif entries:
+            deltas = self.astream_lexicon_cards(state, entries)
+        else:
+            deltas = self.acached_stream_deltas([HumanMessage(content=prompt)], state.session_id, refresh,
+                                               task="vocabulary")
+            if self.structured_vocabulary:
+                deltas = self.astream_cards(deltas, state.word_count)
+        parts = []
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+        self.parse_vocabulary(state, "".join(parts))
+
+    def _accept_card(self, card, cards):
+        """校验通过的卡片去重后加入列表，返回展示行（重复时返回 None）"""
+        if card is None or any(c["word"].lower() == card["word"].lower() for c in cards):
+            return None
+        cards.append(card)
+        return format_card(card) + "\n"
+
+    def _fallback_lines(self, text):
+        """模型完全没有输出 JSON 时，按旧的行格式兜底提取单词行"""
+        lines = [line.strip() for line in text.split("\n") if " - " in line]
+        return "".join(line + "\n" for line in lines)
+
+    def _repaired_lines(self, text, cards, word_count):
+        """解析补齐调用返回的卡片数组，返回新增卡片的展示行（不超过所需数量）"""
+        lines = []
+        for raw in CardStreamParser().feed(text):
+            card, _ = parse_card(raw)
+            line = self._accept_card(card, cards) if len(cards) < word_count else None
+            if line:
+                lines.append(line)
+        return lines
+
+    def _repair_request(self, cards, word_count, broken):
+        if len(cards) >= word_count:
+            return None
+        LOG.warning(f"[Vocab] 缺少 {word_count - len(cards)} 个单词卡片（其中 {len(broken)} 个格式错误），一次性补齐")
+        prompt = repair_cards_prompt(word_count - len(cards), [c["word"] for c in cards], broken)
+        return [HumanMessage(content=prompt)]
+
+    def stream_cards(self, deltas, word_count, held=None):
+        """
+        把流式输出的 JSON 解析为单词卡片，每个卡片完整时立即产出其展示行；
+        格式错误与缺少的卡片在整组输出结束后一次性修复补齐（最多 MAX_ITEM_RETRIES 次调用），
+        不重新生成整组。deltas 来自模型流时，流结束后其准入名额已释放，补齐调用正常排队；
+        调用方在整个过程中持有名额时以 held 传入，补齐调用直接复用。
+        """
+        parser = CardStreamParser()
+        cards, broken = [], []
+        for delta in deltas:
+            for raw in parser.feed(delta):
+                card, error = parse_card(raw)
+                if card is None:
+                    LOG.warning(f"[Vocab] 单词卡片格式错误（{error}），稍后修复")
+                    broken.append(raw)
+                    continue
+                line = self._accept_card(card, cards)
+                if line:
+                    yield line
+
+        if not parser.objects_seen:
+            fallback = self._fallback_lines(parser.text)
+            if fallback:
+                yield fallback
+                return
+
+        for _ in range(MAX_ITEM_RETRIES):
+            messages = self._repair_request(cards, word_count, broken)
+            if messages is None:
+                break
+            lines = self._repaired_lines(self.generate_text(messages, task="card", held=held), cards, word_count)
+            if not lines:
+                break  # 没有补到新的卡片，再试也多半无效
+            broken = []
+            yield from lines
+
+    async def astream_cards(self, deltas, word_count, held=None):
+        """stream_cards 的异步版本"""
+        parser = CardStreamParser()
+        cards, broken = [], []
+        async for delta in deltas:
+            for raw in parser.feed(delta):
+                card, error = parse_card(raw)
+                if card is None:
+                    LOG.warning(f"[Vocab] 单词卡片格式错误（{error}），稍后修复")
+                    broken.append(raw)
+                    continue
+                line = self._accept_card(card, cards)
+                if line:
+                    yield line
+
+        if not parser.objects_seen:
+            fallback = self._fallback_lines(parser.text)
+            if fallback:
+                yield fallback
+                return
+
+        for _ in range(MAX_ITEM_RETRIES):
+            messages = self._repair_request(cards, word_count, broken)
+            if messages is None:
+                break
+            lines = self._repaired_lines(await self.agenerate_text(messages, task="card", held=held), cards, word_count)
+            if not lines:
+                break  # 没有补到新的卡片，再试也多半无效
+            broken = []
+            for line in lines:
+                yield line
+
+    def start_situation_chat(self, state):
         """开始情景对话"""
-        if not self.words_generated:
-            return "--请先生成单词，在学会新单词后再进行对话！--"
+        return "".join(self.stream_situation_chat(state))
+
+    def build_situation_prompt(self, state):
+        """构建情景对话提示（使用全部生成的单词）"""
+        return (f"我们将进行一个情景对话练习。请设计一个日常生活场景，例如在餐厅点餐、在商店购物等，"
+                f"并自然地融入以下单词：{', '.join(state.current_words)}。\n\n"
+                f"请首先描述场景，然后以对话的形式发起第一句话。")
+
+    def stream_situation_chat(self, state):
+        """流式开始情景对话，逐块产出文本"""
+        if not state.words_generated:
+            yield "--请先生成单词，在学会新单词后再进行对话！--"
+            return
             
-        self.in_conversation = True
-        
-        # 构建情景对话提示（使用全部生成的单词）
-        prompt = (f"我们将进行一个情景对话练习。请设计一个日常生活场景，例如在餐厅点餐、在商店购物等，"
-                 f"并自然地融入以下单词：{', '.join(self.current_words)}。\n\n"
-                 f"请首先描述场景，然后以对话的形式发起第一句话。")
-        
-        return self.chat_with_history(prompt)
+        state.in_conversation = True
+        yield from self.stream_chat(self.build_situation_prompt(state), state)
+
+    async def astream_situation_chat(self, state):
+        """stream_situation_chat 的异步版本"""
+        if not state.words_generated:
+            yield "--请先生成单词，在学会新单词后再进行对话！--"
+            return
+            
+        state.in_conversation = True
+        async for delta in self.astream_chat(self.build_situation_prompt(state), state):
+            yield delta
+
+    def track_usage(self, state, user_message):
+        """
+        统计一条用户消息中使用的单词，返回标记了已使用单词（✓）的展示内容；
+        没有新用到的单词时返回 None。
+        """
+        newly_used = state.matcher.feed(user_message)
+        for word in newly_used:
+            line_no = state.word_line_index.get(word)
+            if line_no is not None and '✓' not in state.word_lines[line_no]:
+                state.word_lines[line_no] += " ✓"
+        if not newly_used:
+            return None
+        return '\n'.join(state.word_lines)
 
-    def evaluate_conversation(self):
+    def evaluate_conversation(self, state):
         """评估对话中单词使用情况并给出评分（保留方法备用）"""
-        if not self.in_conversation:
+        if not state.in_conversation:
             return "请先开始情景对话！"
             
-        # 获取对话历史
-        history = get_session_history(self.session_id)
-        user_messages = [msg.content for msg in history.messages if isinstance(msg, HumanMessage)]
-        conversation_text = " ".join(user_messages).lower()
-        
-        # 检查每个单词的使用情况
-        used_words = []
-        unused_words = []
-        for word in self.current_words:
-            if word.lower() in conversation_text:
-                used_words.append(word)
-            else:
-                unused_words.append(word)
-        
-        # 计算评分
-        score = len(used_words) / len(self.current_words) * 100 if self.current_words else 0
+        # 使用随消息累计的计数，无需重新扫描整个对话历史
+        used_words = state.matcher.used_words()
+        unused_words = state.matcher.unused_words()
+        score = state.matcher.score()
         
         # 构建反馈信息
         feedback = f"### 对话评分：{score:.1f}分\n\n"
@@ -100,38 +410,55 @@ class VocabAgent(AgentBase):
             feedback += f"❌ 你还没有使用这些单词：{', '.join(unused_words)}\n\n"
         feedback += "💡 建议：尝试在后续对话中使用未掌握的单词，或者重新开始对话练习！"
         
-        self.in_conversation = False  # 结束对话状态
+        state.in_conversation = False  # 结束对话状态
         return feedback
 
-    def chat_with_history(self, user_input, session_id=None):
+    def chat_with_history(self, user_input, session_id=None, state=None):
         """处理用户输入并生成回复"""
         if not isinstance(user_input, str):
             user_input = str(user_input)
         
-        if self.in_conversation and not self.words_generated:
-            return "--请先生成单词，在学会新单词后再进行对话！--"
+        if state is not None:
+            if state.in_conversation and not state.words_generated:
+                return "--请先生成单词，在学会新单词后再进行对话！--"
+            session_id = session_id or state.session_id
         
         return super().chat_with_history(user_input, session_id or self.session_id)
 
-    def restart_session(self, session_id=None):
-        """重置会话状态（不依赖clear_session_history）"""
-        # 重置会话ID（如果传入新ID）
-        if session_id is not None:
-            self.session_id = session_id
+    def stream_chat(self, user_input, state):
+        """流式处理用户输入，逐块产出回复文本"""
+        if not isinstance(user_input, str):
+            user_input = str(user_input)
+        
+        if state.in_conversation and not state.words_generated:
+            yield "--请先生成单词，在学会新单词后再进行对话！--"
+            return
+        
+        yield from self.stream_deltas([HumanMessage(content=user_input)], state.session_id)
+
+    async def astream_chat(self, user_input, state):
+        """stream_chat 的异步版本"""
+        if not isinstance(user_input, str):
+            user_input = str(user_input)
+        
+        if state.in_conversation and not state.words_generated:
+            yield "--请先生成单词，在学会新单词后再进行对话！--"
+            return
         
+        async for delta in self.astream_deltas([HumanMessage(content=user_input)], state.session_id):
+            yield delta
+
+    def restart_session(self, state):
+        """重置会话状态（不依赖clear_session_history）"""
         # 直接清空父类或历史存储的消息（通过获取历史后清空）
-        history = get_session_history(self.session_id)
+        history = get_session_history(state.session_id)
         if hasattr(history, 'clear'):  # 检查历史对象是否有clear方法
             history.clear()
         else:  # 兼容没有clear方法的情况
             history.messages = []  # 直接清空消息列表
         
         # 重置所有状态变量
-        self.word_count = 5
-        self.current_words = []
-        self.words_generated = False
-        self.in_conversation = False
+        state.reset()
         
-        LOG.info(f"会话{self.session_id}已重置")
+        LOG.info(f"会话{state.session_id}已重置")
         return "会话已重置。请重新生成单词开始学习。"
-
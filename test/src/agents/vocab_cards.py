@@ -0,0 +1,154 @@
+import json
+import re
+
+# 单词卡片的固定字段（按展示顺序）
+CARD_FIELDS = ("word", "ipa", "pos", "meaning", "example", "translation")
+# 本地词库提供前四项，模型只需补充例句
+EXAMPLE_FIELDS = ("word", "example", "translation")
+MAX_ITEM_RETRIES = 2  # 缺失或格式错误的卡片一次性补齐，最多调用的次数
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+_CARD_FORMAT = (
+    "数组中每个元素是一个对象，包含以下字段：\n"
+    '"word"（单词拼写）、"ipa"（音标）、"pos"（词性）、"meaning"（中文释义）、'
+    '"example"（英文例句）、"translation"（例句中文翻译）。\n'
+    "示例：\n"
+    '[{"word": "apple", "ipa": "/ˈæpəl/", "pos": "n.", "meaning": "苹果", '
+    '"example": "I eat an apple every day.", "translation": "我每天吃一个苹果。"}]'
+)
+
+
+def structured_vocabulary_prompt(word_count: int) -> str:
+    """构造要求以 JSON 输出单词卡片的提示"""
+    return f"请生成{word_count}个常用英语单词，以 JSON 数组输出，不要输出任何其他内容。\n" + _CARD_FORMAT
+
+
+def repair_cards_prompt(count: int, exclude: list, broken: list) -> str:
+    """
+    构造一次补齐所有缺失卡片的提示：格式错误的卡片附在提示中供模型修正，
+    已有的单词不再重复。
+    """
+    avoid = f"，不要使用以下单词：{', '.join(exclude)}。" if exclude else "。"
+    fix = ("\n下面这些卡片的 JSON 有误，请优先修正后放入数组：\n" + "\n".join(broken)) if broken else ""
+    return (f"请生成{count}个常用英语单词{avoid}以 JSON 数组输出，不要输出任何其他内容。\n"
+            + _CARD_FORMAT + fix)
+
+
+def examples_prompt(words: list) -> str:
+    """构造只为给定单词生成例句的提示"""
+    return (f"请为以下每个英语单词各写一个新颖、贴近日常生活的英文例句，并给出中文翻译：{', '.join(words)}。\n"
+            f"以 JSON 数组输出，不要输出任何其他内容，每个元素包含 "
+            f'"word"、"example"、"translation" 三个字段。')
+
+
+class CardStreamParser:
+    """
+    增量解析流式输出的 JSON 数组：每个单词对象的右括号一到就产出该对象的原始文本，
+    无需等待整个数组生成完毕。只扫描新到达的字符。
+    """
+    def __init__(self):
+        self.text = ""  # 已收到的全部文本（整体无法解析时用于兜底）
+        self.objects_seen = 0
+        self._stack = []  # 尚未闭合的 { 与 [
+        self._in_string = False
+        self._escaped = False
+        self._start = None  # 当前单词对象在 text 中的起始位置
+
+    def feed(self, delta: str) -> list:
+        """
+        输入一个文本块，返回其中已经闭合的单词对象原始文本列表。
+        """
+        offset = len(self.text)
+        self.text += delta or ""
+        completed = []
+        for index in range(offset, len(self.text)):
+            char = self.text[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = bool(self._stack)
+            elif char in "{[":
+                # 位于最外层或数组中的对象视为一个单词卡片
+                if char == "{" and self._start is None and (not self._stack or self._stack[-1] == "["):
+                    self._start = index
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if char == "}" and self._start is not None and self._is_card_closed():
+                    completed.append(self.text[self._start:index + 1])
+                    self.objects_seen += 1
+                    self._start = None
+        return completed
+
+    def _is_card_closed(self) -> bool:
+        return not self._stack or self._stack[-1] == "["
+
+
+def parse_card(raw: str, fields=CARD_FIELDS):
+    """
+    解析并校验一个单词卡片，尽量修复常见的格式问题。
+    参数:
+        raw (str): 单个 JSON 对象的原始文本
+        fields (tuple): 必须具备的字段
+    返回:
+        tuple: (卡片 dict 或 None, 错误描述)
+    """
+    text = raw.strip().translate(_SMART_QUOTES)
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None, "缺少 JSON 对象"
+    text = text[start:end + 1]
+
+    card = None
+    for candidate in (text, _TRAILING_COMMA.sub(r"\1", text)):
+        try:
+            card = json.loads(candidate)
+            break
+        except json.JSONDecodeError:
+            continue
+    if not isinstance(card, dict):
+        return None, "不是合法的 JSON 对象"
+
+    # 字段名大小写或常见别名不一致时归一化
+    normalized = {str(key).strip().lower(): value for key, value in card.items()}
+    for alias, field in (("phonetic", "ipa"), ("part_of_speech", "pos"), ("definition", "meaning")):
+        normalized.setdefault(field, normalized.get(alias))
+
+    result = {}
+    missing = []
+    for field in fields:
+        value = normalized.get(field)
+        value = " ".join(str(value).split()) if value is not None else ""
+        if not value:
+            missing.append(field)
+        result[field] = value
+    if missing:
+        return None, f"缺少字段 {', '.join(missing)}"
+    if "ipa" in result:
+        result["ipa"] = result["ipa"].strip("[]")
+    return result, ""
+
+
+def format_card(card: dict) -> str:
+    """按单词展示区的既有格式把卡片排成一行：[单词] - [音标] - 词性 - 中文释义 - 例句：英文例句 - 中文翻译"""
+    return (f"{card['word']} - [{card['ipa']}] - {card['pos']} - {card['meaning']} - "
+            f"例句：{card['example']} - {card['translation']}")
+
+
+def format_lexicon_card(entry: dict) -> str:
+    """词库词条的展示行（例句随后单独列出）：[单词] - [音标] - 词性 - 中文释义"""
+    return f"{entry['word']} - [{entry['ipa'].strip('[]')}] - {entry['pos']} - {entry['meaning']}"
+
+
+def format_example(example: dict) -> str:
+    """例句的展示行（不含 " - "，不会被当作单词行解析）"""
+    return f"  · {example['word']}：{example['example']}（{example['translation']}）"
@@ -0,0 +1,255 @@
+import re
+
+_TOKEN_PATTERN = re.compile(r"[a-z]+")
+_VOWELS = set("aeiou")
+
+# 词性类别
+NOUN = "noun"
+VERB = "verb"
+ADJECTIVE = "adjective"
+ADVERB = "adverb"
+
+# 词性缩写 -> 类别（"a." 在部分词典中表示形容词）
+_POS_ALIASES = {
+    "n": NOUN, "noun": NOUN,
+    "v": VERB, "vt": VERB, "vi": VERB, "verb": VERB,
+    "adj": ADJECTIVE, "a": ADJECTIVE, "adjective": ADJECTIVE,
+    "adv": ADVERB, "adverb": ADVERB,
+}
+_POS_NAMES_ZH = {"名词": NOUN, "动词": VERB, "形容词": ADJECTIVE, "副词": ADVERB}
+
+# 常见不规则变化（原形 -> 变化形式）
+_IRREGULAR_FORMS = {
+    "be": "am is are was were been being",
+    "have": "has had having",
+    "do": "does did done doing",
+    "go": "goes went gone going",
+    "make": "made",
+    "take": "took taken",
+    "come": "came",
+    "see": "saw seen",
+    "know": "knew known",
+    "get": "got gotten",
+    "give": "gave given",
+    "find": "found",
+    "think": "thought",
+    "tell": "told",
+    "become": "became",
+    "leave": "left",
+    "feel": "felt",
+    "bring": "brought",
+    "begin": "began begun",
+    "keep": "kept",
+    "hold": "held",
+    "write": "wrote written",
+    "stand": "stood",
+    "hear": "heard",
+    "mean": "meant",
+    "meet": "met",
+    "run": "ran",
+    "pay": "paid",
+    "say": "said",
+    "sit": "sat",
+    "speak": "spoke spoken",
+    "lead": "led",
+    "grow": "grew grown",
+    "lose": "lost",
+    "fall": "fell fallen",
+    "send": "sent",
+    "build": "built",
+    "understand": "understood",
+    "draw": "drew drawn",
+    "break": "broke broken",
+    "spend": "spent",
+    "rise": "rose risen",
+    "drive": "drove driven",
+    "buy": "bought",
+    "wear": "wore worn",
+    "choose": "chose chosen",
+    "eat": "ate eaten",
+    "drink": "drank drunk",
+    "sing": "sang sung",
+    "swim": "swam swum",
+    "fly": "flew flown flies",
+    "teach": "taught",
+    "catch": "caught",
+    "fight": "fought",
+    "throw": "threw thrown",
+    "sell": "sold",
+    "forget": "forgot forgotten",
+    "sleep": "slept",
+    "win": "won",
+    "ride": "rode ridden",
+    "hide": "hid hidden",
+    "shake": "shook shaken",
+    "steal": "stole stolen",
+    "child": "children",
+    "man": "men",
+    "woman": "women",
+    "person": "people",
+    "mouse": "mice",
+    "foot": "feet",
+    "tooth": "teeth",
+    "good": "better best",
+    "bad": "worse worst",
+    "far": "farther further farthest furthest",
+    "many": "more most",
+    "much": "more most",
+}
+
+
+def tokenize(text: str) -> list:
+    """
+    把文本切分为小写英文单词。
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def pos_classes(pos: str) -> set:
+    """
+    把单词卡片上的词性（如 "n."、"vt."、"adj./adv."、"形容词"）归为词性类别（NOUN/VERB/ADJECTIVE/ADVERB）。
+    无法识别时返回空集合。
+    """
+    pos = (pos or "").lower()
+    classes = {_POS_ALIASES[token] for token in re.findall(r"[a-z]+", pos) if token in _POS_ALIASES}
+    classes.update(cls for name, cls in _POS_NAMES_ZH.items() if name in pos)
+    return classes
+
+
+def _ends_cvc(lemma: str) -> bool:
+    """辅音-元音-辅音结尾（stop、big），变化时可能双写末尾辅音"""
+    return (len(lemma) >= 3 and lemma[-1] not in _VOWELS | set("wxy")
+            and lemma[-2] in _VOWELS and lemma[-3] not in _VOWELS)
+
+
+def _ends_consonant_y(lemma: str) -> bool:
+    return lemma.endswith("y") and lemma[-2] not in _VOWELS
+
+
+def _s_form(lemma: str) -> str:
+    """名词复数 / 动词第三人称单数"""
+    if _ends_consonant_y(lemma):
+        return lemma[:-1] + "ies"
+    if lemma.endswith(("s", "x", "z", "ch", "sh", "o")):
+        return lemma + "es"
+    return lemma + "s"
+
+
+def _verb_forms(lemma: str, irregular: bool) -> set:
+    """进行时与（规则动词的）过去式"""
+    if lemma.endswith("ie"):
+        forms = {lemma[:-2] + "ying"}  # die -> dying
+    elif lemma.endswith("e") and not lemma.endswith(("ee", "ye", "oe")):
+        forms = {lemma[:-1] + "ing"}  # make -> making，see -> seeing 不去 e
+    else:
+        forms = {lemma + "ing"}
+    if not irregular:  # 不规则动词的过去式只取自不规则变化表（see 不生成 seed）
+        if lemma.endswith("e"):
+            forms.add(lemma + "d")
+        elif _ends_consonant_y(lemma):
+            forms.add(lemma[:-1] + "ied")
+        else:
+            forms.add(lemma + "ed")
+    if _ends_cvc(lemma):
+        # 辅音-元音-辅音结尾的短词双写末尾辅音：stop -> stopping, stopped
+        forms.add(lemma + lemma[-1] + "ing")
+        if not irregular:
+            forms.add(lemma + lemma[-1] + "ed")
+    return forms
+
+
+def _adjective_forms(lemma: str, irregular: bool) -> set:
+    """比较级、最高级（规则形容词）与副词"""
+    if lemma.endswith("e"):
+        forms = set() if irregular else {lemma + "r", lemma + "st"}
+        forms.add(lemma[:-1] + "y" if lemma.endswith("le") else lemma + "ly")  # gentle -> gently
+    elif _ends_consonant_y(lemma):
+        stem = lemma[:-1]
+        forms = {stem + "ily"} | (set() if irregular else {stem + "ier", stem + "iest"})
+    else:
+        forms = {lemma + "ly"} | (set() if irregular else {lemma + "er", lemma + "est"})
+        if _ends_cvc(lemma) and not irregular:
+            forms |= {lemma + lemma[-1] + "er", lemma + lemma[-1] + "est"}  # big -> bigger
+    return forms
+
+
+def inflections(lemma: str, classes=None) -> set:
+    """
+    按词性生成一个单词的常见屈折变化形式：名词的复数，动词的三单、过去式与进行时，
+    形容词的比较级、最高级与副词。classes 为 pos_classes 的结果，为空时按名词与动词处理
+    （不生成 -er/-est/-ly，避免把 user、seer 之类的词算作用法）。
+    """
+    forms = {lemma}
+    forms.update(_IRREGULAR_FORMS.get(lemma, "").split())
+    if len(lemma) < 2:
+        return forms
+
+    classes = classes or {NOUN, VERB}
+    irregular = lemma in _IRREGULAR_FORMS
+    # 不规则名词（child -> children）不再生成规则复数；动词的三单总是规则的
+    if VERB in classes or (NOUN in classes and not irregular):
+        forms.add(_s_form(lemma))
+    if NOUN in classes:
+        # 以 f/fe 结尾的名词复数：leaf -> leaves, knife -> knives
+        if lemma.endswith("fe"):
+            forms.add(lemma[:-2] + "ves")
+        elif lemma.endswith("f"):
+            forms.add(lemma[:-1] + "ves")
+    if VERB in classes:
+        forms |= _verb_forms(lemma, irregular)
+    if ADJECTIVE in classes:
+        forms |= _adjective_forms(lemma, irregular)
+    return forms
+
+
+class VocabMatcher:
+    """
+    针对一组单词构建一次的用法匹配器：每条消息只分词一次，
+    通过变化形式索引逐词查找（接受与词性相符的屈折变化），并持续累计每个单词的使用次数。
+    """
+    def __init__(self, words, pos=None):
+        self.words = list(words)
+        self.counts = {word: 0 for word in self.words}
+        pos = pos or {}  # 单词 -> 卡片上的词性
+        # 首个单词的变化形式 -> [(目标单词, 其余单词的变化形式集合列表)]，支持词组
+        self._index = {}
+        for word in self.words:
+            tokens = tokenize(word)
+            if not tokens:
+                continue
+            classes = pos_classes(pos.get(word))
+            rest = [inflections(token, classes) for token in tokens[1:]]
+            for form in inflections(tokens[0], classes):
+                self._index.setdefault(form, []).append((word, rest))
+
+    def feed(self, message: str) -> list:
+        """
+        统计一条用户消息中使用到的单词并累加计数。
+        返回:
+            list: 本条消息中首次被使用的单词
+        """
+        tokens = tokenize(message or "")
+        newly_used = []
+        for position, token in enumerate(tokens):
+            for word, rest in self._index.get(token, ()):
+                following = tokens[position + 1:position + 1 + len(rest)]
+                if len(following) < len(rest) or any(t not in forms for t, forms in zip(following, rest)):
+                    continue
+                if self.counts[word] == 0:
+                    newly_used.append(word)
+                self.counts[word] += 1
+        return newly_used
+
+    def used_words(self) -> list:
+        return [word for word in self.words if self.counts[word] > 0]
+
+    def unused_words(self) -> list:
+        return [word for word in self.words if self.counts[word] == 0]
+
+    def score(self) -> float:
+        """
+        已使用单词所占的百分比。
+        """
+        if not self.words:
+            return 0.0
+        return len(self.used_words()) / len(self.words) * 100
@@ -8,6 +8,8 @@ class WritingAgent(AgentBase):
     """
     对话代理类，负责处理与用户的对话。
     """
+    default_task = "essay"
+
     def __init__(self, session_id=None):
         super().__init__(
             name="writing",
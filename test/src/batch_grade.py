@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+from langchain_core.messages import HumanMessage
+from agents.admission import BULK, admission
+from agents.reflection_agent import ReflectionAgent
+from agents.refinement import build_reflection_prompt, parse_score
+from utils.logger import LOG
+
+DEFAULT_CONCURRENCY = int(os.getenv("TIRO_BATCH_CONCURRENCY", "4"))  # 同时发往 Ollama 的评分请求数
+PROGRESS_INTERVAL = 30.0  # 输出吞吐量的间隔（秒）
+
+
+def iter_essays(input_path: str, default_difficulty: str):
+    """
+    逐篇读取待评作文，不一次性载入全部内容。
+    参数:
+        input_path (str): 作文目录（每个 .txt 文件一篇）或 JSONL 文件
+            （每行包含 essay/text，可选 id、difficulty、topic）
+        default_difficulty (str): 未指定难度时使用的难度
+    返回:
+        Generator[dict]: 包含 id、essay、difficulty、topic 的作文记录
+    """
+    if os.path.isdir(input_path):
+        for name in sorted(os.listdir(input_path)):
+            path = os.path.join(input_path, name)
+            if not name.endswith(".txt") or not os.path.isfile(path):
+                continue
+            with open(path, "r", encoding="utf-8") as file:
+                essay = file.read().strip()
+            yield {"id": name, "essay": essay, "difficulty": default_difficulty, "topic": ""}
+        return
+
+    with open(input_path, "r", encoding="utf-8") as file:
+        for line_no, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                LOG.warning(f"[BatchGrade] 第 {line_no} 行不是合法 JSON，已跳过")
+                continue
+            yield {
+                "id": str(item.get("id", line_no)),
+                "essay": (item.get("essay") or item.get("text") or "").strip(),
+                "difficulty": item.get("difficulty") or default_difficulty,
+                "topic": item.get("topic", ""),
+            }
+
+
+def load_finished_ids(output_path: str) -> set:
+    """
+    读取已有结果文件中完成的作文ID，用于崩溃后续跑（忽略写到一半的最后一行）。
+    """
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                finished.add(json.loads(line)["id"])
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+    return finished
+
+
+def format_report(item: dict, reflection: str) -> str:
+    """
+    按 src/Essay 导出文件的 Markdown 结构组织单篇报告。
+    """
+    sections = []
+    if item["topic"]:
+        sections.append(f"## 📌 作文题目（{item['difficulty']}难度）\n{item['topic']}")
+    sections.append(f"### 📝 用户提交作文\n{item['essay']}")
+    sections.append(f"### 💬 反思点评（{item['difficulty']}标准）\n{reflection.strip()}")
+    return "\n\n".join(sections) + "\n"
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+
+class ResultWriter:
+    """
+    逐条追加写入 JSONL 结果，每条写完即落盘，保证崩溃后可以续跑。
+    """
+    def __init__(self, output_path: str):
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        self._file = open(output_path, "a", encoding="utf-8")
+        if self._file.tell() and not _ends_with_newline(output_path):
+            # 上次中断时最后一行只写了一半，另起一行以免与新结果粘连
+            self._file.write("\n")
+
+    def write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+async def grade_essay(agent: ReflectionAgent, item: dict) -> dict:
+    """
+    对单篇作文进行评分点评，不写入任何会话历史。
+    """
+    started = time.monotonic()
+    prompt = build_reflection_prompt(item["essay"], item["difficulty"])
+    reflection = await agent.agenerate_text([HumanMessage(content=prompt)])
+    return {
+        "id": item["id"],
+        "difficulty": item["difficulty"],
+        "topic": item["topic"],
+        "score": parse_score(reflection),
+        "report": format_report(item, reflection),
+        "graded_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "elapsed": round(time.monotonic() - started, 2),
+    }
+
+
+async def run_batch(input_path: str, output_path: str, difficulty: str, concurrency: int) -> dict:
+    """
+    以有限并发批量评分，结果增量写入 output_path，已完成的作文自动跳过。
+    返回:
+        dict: 统计信息（完成、失败、跳过数量与每分钟篇数）
+    """
+    # 评分按批量任务排队，准入名额按本次的并发数设置，否则并发数不起作用
+    admission.configure(concurrency, {BULK: concurrency})
+    agent = ReflectionAgent(session_id="batch_grade")
+    finished = load_finished_ids(output_path)
+    writer = ResultWriter(output_path)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    stats = {"done": 0, "failed": 0, "skipped": 0}
+    started = time.monotonic()
+
+    def throughput() -> float:
+        minutes = (time.monotonic() - started) / 60
+        return stats["done"] / minutes if minutes > 0 else 0.0
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                queue.task_done()
+                return
+            try:
+                writer.write(await grade_essay(agent, item))
+                stats["done"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                LOG.error(f"[BatchGrade] 作文 {item['id']} 评分失败: {e}")
+            finally:
+                queue.task_done()
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            LOG.info(f"[BatchGrade] 已完成 {stats['done']} 篇，失败 {stats['failed']} 篇，"
+                     f"吞吐量 {throughput():.2f} 篇/分钟")
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    progress = asyncio.create_task(report_progress())
+    try:
+        for item in iter_essays(input_path, difficulty):
+            if item["id"] in finished:
+                stats["skipped"] += 1
+                continue
+            if not item["essay"]:
+                LOG.warning(f"[BatchGrade] 作文 {item['id']} 内容为空，已跳过")
+                continue
+            await queue.put(item)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        progress.cancel()
+        writer.close()
+
+    stats["essays_per_minute"] = round(throughput(), 2)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiro 批量作文评分（无界面）")
+    parser.add_argument("--input", required=True, help="作文目录（*.txt）或 JSONL 文件")
+    parser.add_argument("--output", required=True, help="结果 JSONL 文件，已存在时从中断处续跑")
+    parser.add_argument("--difficulty", default="高中", choices=["初中", "高中", "大学"], help="默认难度")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="同时评分的作文数")
+    args = parser.parse_args()
+
+    stats = asyncio.run(run_batch(args.input, args.output, args.difficulty, max(1, args.concurrency)))
+    LOG.info(f"[BatchGrade] 完成 {stats['done']} 篇，失败 {stats['failed']} 篇，跳过 {stats['skipped']} 篇，"
+             f"吞吐量 {stats['essays_per_minute']} 篇/分钟")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_ollama import FakeOllamaServer
+from utils.logger import LOG
+
+SCENARIOS = ("stream", "mode1", "mode2", "vocab", "vocab_cards", "conversation")
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+
+BENCH_ESSAY = (
+    "Last summer I travelled to the mountains with my family. We climbed for hours and finally "
+    "reached the top, where the view was amazing. This trip taught me that hard work brings rewards."
+)
+
+
+def configure_environment(ollama_url: str) -> None:
+    """
+    在导入 Agent 之前设置环境变量：指向 Ollama（或替身），关闭缓存、预取、预热与指标服务，
+    使每次请求都真正走一遍模型调用。
+    """
+    os.environ["OLLAMA_HOST"] = ollama_url
+    os.environ["TIRO_CACHE_DB"] = ""
+    os.environ["TIRO_CACHE_TTL"] = "0"
+    os.environ["TIRO_PREFETCH_ENABLED"] = "0"
+    os.environ["TIRO_WARMUP_ENABLED"] = "0"
+    os.environ["TIRO_METRICS_PORT"] = "0"
+
+
+def percentile(values: list, q: float):
+    """线性插值的分位数，没有样本时返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def rss_mb():
+    """当前进程的常驻内存（MB），无法读取时返回 None"""
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_mb() -> float:
+    """进程启动以来的最大常驻内存（MB，Linux 下 ru_maxrss 单位为 KB）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_scenarios(rounds: int) -> dict:
+    """
+    构造各个场景的单次请求（接收请求序号，不同序号使用不同会话，互不共享历史）。
+    """
+    from langchain_core.messages import HumanMessage
+    from agents.vocab_agent import VocabAgent
+    from tabs.conversation_tab import conversation_agent, handle_conversation, new_context
+    from tabs.vocab_tab import vocab_agent
+    from tabs.writing_tab import mode1_process, mode2_process
+
+    async def stream(i):
+        session_id = conversation_agent.session_for(f"bench-stream-{i}")
+        messages = [HumanMessage(content="Hi, I'd like to check in, please.")]
+        await asyncio.to_thread(conversation_agent.stream_response_text, messages, session_id)
+
+    async def mode1(i):
+        async for _ in mode1_process("My Most Memorable Journey", BENCH_ESSAY, "高中", rounds, f"bench-mode1-{i}"):
+            pass
+
+    async def mode2(i):
+        # 每个请求使用不同题目，避免并发的相同请求被合并为一次模型调用
+        async for _ in mode2_process(f"My Most Memorable Journey ({i})", "高中", rounds, f"bench-mode2-{i}"):
+            pass
+
+    async def vocab(i):
+        # 词库启用时（默认）单词来自本地词库，模型只生成例句
+        state = vocab_agent.new_session(f"bench-vocab-{i}")
+        await asyncio.to_thread(vocab_agent.generate_vocabulary, state, 5, True)
+
+    card_agent = VocabAgent()
+    card_agent.use_lexicon = False  # 整组单词卡片都由模型流式生成并解析
+
+    async def vocab_cards(i):
+        state = card_agent.new_session(f"bench-vocab-cards-{i}")
+        await asyncio.to_thread(card_agent.generate_vocabulary, state, 5, True)
+
+    async def conversation(i):
+        context = new_context(f"bench-conversation-{i}")
+        context.update({"scenario": "Hotel Check-in", "process": "Reservation confirmation"})
+        async for _ in handle_conversation("Hi, I'd like to check in, please.", [], context):
+            pass
+
+    return {"stream": stream, "mode1": mode1, "mode2": mode2, "vocab": vocab, "vocab_cards": vocab_cards,
+            "conversation": conversation}
+
+
+async def run_level(request, concurrency: int, requests: int) -> dict:
+    """
+    以给定并发数执行 requests 次请求，统计延迟分位数、吞吐与内存。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await request(i)
+            except Exception as e:
+                errors += 1
+                LOG.warning(f"[Benchmark] 第 {i} 个请求失败: {e}")
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - started
+    rss = rss_mb()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "mean": sum(latencies) / len(latencies) if latencies else None,
+        "throughput": len(latencies) / wall if wall > 0 else None,
+        "rss_mb": round(rss, 1) if rss is not None else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def run_benchmark(scenarios: list, levels: list, requests: int, rounds: int) -> dict:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(levels) + 4))
+    requests_by_name = build_scenarios(rounds)
+    results = {}
+    for name in scenarios:
+        request = requests_by_name[name]
+        await request(-1)  # 预热：创建 Agent、建立连接，不计入结果
+        for concurrency in levels:
+            count = requests or max(concurrency * 2, 8)
+            result = await run_level(request, concurrency, count)
+            results[f"{name}@{concurrency}"] = result
+            LOG.info(f"[Benchmark] {name} 并发 {concurrency}: {format_result(result)}")
+    return results
+
+
+def _ms(value) -> str:
+    return f"{value * 1000:.0f}ms" if value is not None else "-"
+
+
+def format_result(result: dict) -> str:
+    throughput = f"{result['throughput']:.2f}" if result["throughput"] is not None else "-"
+    return (f"p50 {_ms(result['p50'])} / p95 {_ms(result['p95'])} / p99 {_ms(result['p99'])}，"
+            f"吞吐 {throughput} 请求/秒，内存 {result['rss_mb']}MB（峰值 {result['peak_rss_mb']}MB），"
+            f"失败 {result['errors']}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    与基线比较 p95 延迟和吞吐，返回退化超过容差的条目。
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base or not base.get("p95") or not base.get("throughput") or result["p95"] is None:
+            LOG.info(f"[Benchmark] {key}: 基线中没有可比较的数据")
+            continue
+        latency_change = result["p95"] / base["p95"] - 1
+        throughput_change = (result["throughput"] or 0) / base["throughput"] - 1
+        regressed = latency_change > tolerance or throughput_change < -tolerance
+        LOG.info(f"[Benchmark] {key}: p95 {_ms(base['p95'])} → {_ms(result['p95'])}（{latency_change:+.1%}），"
+                 f"吞吐 {base['throughput']:.2f} → {result['throughput'] or 0:.2f}（{throughput_change:+.1%}）"
+                 f"{'  ⚠️ 退化' if regressed else ''}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiro 端到端基准测试（默认使用本地 Ollama 替身，无需 GPU）")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"要运行的场景：{', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="并发数，逗号分隔")
+    parser.add_argument("--requests", type=int, default=0, help="每个并发级别的请求数（默认为并发数的两倍，至少 8）")
+    parser.add_argument("--rounds", type=int, default=2, help="写作精进的轮数")
+    parser.add_argument("--ollama", default="", help="使用真实的 Ollama 地址，而不是启动替身")
+    parser.add_argument("--ttft", type=float, default=0.3, help="替身的首 token 时间（秒）")
+    parser.add_argument("--tps", type=float, default=40.0, help="替身每秒生成的 token 数")
+    parser.add_argument("--parallel", type=int, default=4, help="替身同时生成的请求数")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线结果文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="允许的退化比例，超过即视为回归")
+    parser.add_argument("--output", default="", help="把本次结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    levels = [max(1, int(n)) for n in args.concurrency.split(",") if n.strip()]
+
+    fake = None
+    if args.ollama:
+        url = args.ollama
+    else:
+        fake = FakeOllamaServer(port=0, ttft=args.ttft, tokens_per_second=args.tps, parallel=args.parallel).start()
+        url = fake.url
+        LOG.info(f"[Benchmark] Ollama 替身已启动 {url}（ttft={args.ttft}s, {args.tps} token/s, 并行 {args.parallel}）")
+    configure_environment(url)
+
+    try:
+        results = asyncio.run(run_benchmark(scenarios, levels, args.requests, args.rounds))
+    finally:
+        if fake is not None:
+            fake.stop()
+
+    report = {
+        "results": results,
+        "settings": {"ollama": args.ollama or "fake", "ttft": args.ttft, "tps": args.tps,
+                     "parallel": args.parallel, "rounds": args.rounds},
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        baseline_dir = os.path.dirname(args.baseline)
+        if baseline_dir:
+            os.makedirs(baseline_dir, exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        LOG.info(f"[Benchmark] 已保存基线到 {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        LOG.info(f"[Benchmark] 没有基线文件 {args.baseline}，可使用 --save-baseline 保存本次结果")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline.get("settings") != report["settings"]:
+        LOG.warning("[Benchmark] 基线的替身设置与本次不同，比较结果仅供参考")
+    regressions = compare(results, baseline.get("results", {}), args.tolerance)
+    if regressions:
+        LOG.error(f"[Benchmark] 以下条目相比基线退化超过 {args.tolerance:.0%}: {', '.join(regressions)}")
+        raise SystemExit(1)
+    LOG.info("[Benchmark] 与基线相比没有明显退化")
+
+if __name__ == "__main__":
+    main()
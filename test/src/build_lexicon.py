@@ -0,0 +1,63 @@
+import argparse
+import csv
+import re
+
+from agents.lexicon import LEXICON_DB, read_tsv, write_lexicon
+from utils.logger import LOG
+
+# ECDICT 考试标签与难度的对应关系（按从易到难的顺序取第一个匹配）
+ECDICT_LEVELS = (("zk", "初中"), ("gk", "高中"), ("cet4", "大学"), ("cet6", "大学"), ("ky", "大学"))
+_POS_PREFIX = re.compile(r"^((?:[a-z]+\.\s*)+)")
+
+
+def frequency_band(rank: int) -> int:
+    """按词频排名划分词频段：前 2000 为 1，前 5000 为 2，其余为 3"""
+    if 0 < rank <= 2000:
+        return 1
+    if 0 < rank <= 5000:
+        return 2
+    return 3
+
+
+def read_ecdict(path: str):
+    """
+    读取 ECDICT 格式的 CSV 词典，只保留带考试标签、音标与中文释义的单词。
+    """
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        for row in csv.DictReader(file):
+            word = (row.get("word") or "").strip()
+            tags = (row.get("tag") or "").split()
+            level = next((name for tag, name in ECDICT_LEVELS if tag in tags), None)
+            translation = (row.get("translation") or "").replace("\\n", "\n").strip()
+            if not word or " " in word or not level or not row.get("phonetic") or not translation:
+                continue
+
+            # 取第一条释义，其开头的 "n. " 等作为词性
+            first = translation.split("\n")[0]
+            match = _POS_PREFIX.match(first)
+            pos = match.group(1).replace(" ", "") if match else ""
+            meaning = first[match.end():].strip() if match else first
+            rank = int(row.get("frq") or 0) or int(row.get("bnc") or 0)
+            yield {
+                "word": word,
+                "ipa": f"/{row['phonetic'].strip()}/",
+                "pos": pos or "-",
+                "meaning": meaning,
+                "level": level,
+                "band": frequency_band(rank),
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编译 Tiro 本地词库（SQLite，只读使用）")
+    parser.add_argument("--source", required=True, help="词库源文件：TSV（lexicon/lexicon.tsv 格式）或 ECDICT CSV")
+    parser.add_argument("--format", choices=["tsv", "ecdict"], default="tsv", help="源文件格式")
+    parser.add_argument("--output", default=LEXICON_DB, help="输出的 SQLite 文件")
+    args = parser.parse_args()
+
+    entries = read_ecdict(args.source) if args.format == "ecdict" else read_tsv(args.source)
+    count = write_lexicon(entries, args.output)
+    LOG.info(f"[Lexicon] 已编译 {count} 个词条到 {args.output}")
+
+if __name__ == "__main__":
+    main()
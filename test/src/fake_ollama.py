@@ -0,0 +1,244 @@
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.logger import LOG
+
+_TOKEN_PATTERN = re.compile(r"[　-ヿ㐀-䶿一-鿿＀-￯]|[^\s　-ヿ㐀-䶿一-鿿＀-￯]+\s*|\s+")
+
+_ESSAY = (
+    "Learning a foreign language opens a window to another culture. When I started studying English, "
+    "I found the grammar confusing and the vocabulary endless. However, by reading short stories every "
+    "evening and talking with classmates, I gradually became more confident. Mistakes are not failures; "
+    "they are steps on the road to fluency. Today I can watch films without subtitles and write emails "
+    "to friends abroad. I believe that patience, curiosity and daily practice are the keys to success."
+)
+_REFLECTION = (
+    "1. 评分：内容契合 26/30，结构完整 40/50，语法 16/20，总分 82\n"
+    "2. 优点：主题明确，段落之间过渡自然，使用了较丰富的词汇。\n"
+    "3. 不足：部分句子结构单一，结尾略显仓促，个别时态使用不一致。\n"
+    "4. 整体建议：尝试使用更多复合句，并在结尾总结全文观点。\n"
+    "SCORE: 82"
+)
+_WORDS = [
+    ("achieve", "/əˈtʃiːv/", "v.", "实现"), ("benefit", "/ˈbenɪfɪt/", "n.", "益处"),
+    ("curious", "/ˈkjʊəriəs/", "adj.", "好奇的"), ("delicate", "/ˈdelɪkət/", "adj.", "精致的"),
+    ("expand", "/ɪkˈspænd/", "v.", "扩大"), ("familiar", "/fəˈmɪliə(r)/", "adj.", "熟悉的"),
+    ("generous", "/ˈdʒenərəs/", "adj.", "慷慨的"), ("inspire", "/ɪnˈspaɪə(r)/", "v.", "激励"),
+    ("maintain", "/meɪnˈteɪn/", "v.", "维持"), ("obvious", "/ˈɒbviəs/", "adj.", "明显的"),
+]
+
+
+def _card(word, ipa, pos, meaning):
+    return {"word": word, "ipa": ipa, "pos": pos, "meaning": meaning,
+            "example": f"It is important to {word} every day.", "translation": f"每天{meaning}很重要。"}
+
+
+def canned_reply(prompt: str) -> str:
+    """
+    按最后一条用户消息选择一段固定回复，使各个功能的解析流程都能正常走通。
+    """
+    if "以 JSON 数组输出" in prompt and '"ipa"' in prompt:
+        match = re.search(r"生成(\d+)个", prompt)
+        count = int(match.group(1)) if match else 5
+        exclude = re.search(r"不要使用以下单词：(.+?)。", prompt)
+        words = [w for w in _WORDS if not exclude or w[0] not in exclude.group(1).split(", ")]
+        cards = [_card(*words[i % len(words)]) for i in range(count)] if words else []
+        return json.dumps(cards, ensure_ascii=False, indent=1)
+    if "以 JSON 数组输出" in prompt:
+        match = re.search(r"中文翻译：(.+?)。\n", prompt)
+        words = [w.strip() for w in match.group(1).split(",")] if match else ["word"]
+        examples = [{"word": w, "example": f"She used the word {w} in class.", "translation": f"她在课堂上用了 {w}。"}
+                    for w in words]
+        return json.dumps(examples, ensure_ascii=False, indent=1)
+    if "SCORE: <" in prompt:
+        return _REFLECTION
+    if "只返回题目文本" in prompt:
+        return "My Most Memorable Journey"
+    if "[单词1] - [音标]" in prompt:
+        return "\n".join(f"{w} - [{i}] - {p} - {m} - 例句：I {w} it. - 我{m}。" for w, i, p, m in _WORDS[:5])
+    return _ESSAY
+
+
+def split_tokens(text: str) -> list:
+    """把回复切分为近似 token 的片段（英文按词，中文按字）"""
+    return _TOKEN_PATTERN.findall(text)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeOllamaServer:
+    """
+    本地的 Ollama 替身：以可配置的首 token 时间与生成速度，流式回放固定回复。
+    parallel 模拟 Ollama 的 OLLAMA_NUM_PARALLEL，超出的请求排队等待。
+    """
+    def __init__(self, host="127.0.0.1", port=11435, ttft=0.3, tokens_per_second=40.0, parallel=4):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.slots = threading.BoundedSemaphore(parallel)
+        self.requests = 0
+        self.aborted = 0  # 客户端中途断开（取消生成）的请求数
+        self.last_request = None  # 最近一次生成请求的请求体（供测试检查发送的模型与参数）
+        self.fail_on = None  # 提示中包含该文本时返回 500，模拟单个请求失败
+        self.model_ttft = {}  # 按模型覆盖首 token 时间（模拟较慢的大模型）
+        self.models_seen = []  # 依次收到的生成请求所用的模型
+        self.in_flight = 0
+        self.peak_in_flight = 0  # 同时处理的生成请求数峰值（供测试检查并发上限）
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _write_chunk(self, payload):
+                data = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path.startswith("/api/ps") or self.path.startswith("/api/tags"):
+                    self._send_json({"models": [{"name": "qwen3:latest", "model": "qwen3:latest",
+                                                 "expires_at": "2099-01-01T00:00:00Z"}]})
+                elif self.path.startswith("/api/version"):
+                    self._send_json({"version": "0.0.0-fake"})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.startswith("/api/chat"):
+                    users = [m for m in body.get("messages", []) if m.get("role") == "user"]
+                    prompt = str(users[-1].get("content", "")) if users else ""
+                    self._stream(body, prompt, chat=True)
+                elif self.path.startswith("/api/generate"):
+                    if not body.get("prompt"):
+                        # 不带提示的请求只用于加载模型
+                        self._send_json({"model": body.get("model"), "created_at": _now(), "response": "", "done": True})
+                    else:
+                        self._stream(body, body["prompt"], chat=False)
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def _stream(self, body, prompt, chat):
+                try:
+                    self._generate(body, prompt, chat)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端放弃了本次生成（如用户点击停止），与真实的 Ollama 一样停止生成
+                    with fake._lock:
+                        fake.aborted += 1
+                    self.close_connection = True
+
+            def _generate(self, body, prompt, chat):
+                with fake._lock:
+                    fake.requests += 1
+                    fake.last_request = body
+                    fake.models_seen.append(body.get("model"))
+                if fake.fail_on and fake.fail_on in prompt:
+                    self._send_json({"error": "simulated failure"}, 500)
+                    return
+                with fake._lock:
+                    fake.in_flight += 1
+                    fake.peak_in_flight = max(fake.peak_in_flight, fake.in_flight)
+                try:
+                    self._reply(body, prompt, chat)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def _reply(self, body, prompt, chat):
+                model = body.get("model", "qwen3:latest")
+                tokens = split_tokens(canned_reply(prompt))
+                stream = body.get("stream", True)
+                started = time.monotonic()
+
+                ttft = fake.model_ttft.get(model, fake.ttft)
+                with fake.slots:
+                    time.sleep(ttft)
+                    interval = 1.0 / fake.tokens_per_second if fake.tokens_per_second > 0 else 0
+                    if not stream:
+                        time.sleep(interval * len(tokens))
+                    else:
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/x-ndjson")
+                        self.send_header("Transfer-Encoding", "chunked")
+                        self.end_headers()
+                        for i, token in enumerate(tokens):
+                            if i:
+                                time.sleep(interval)
+                            part = {"message": {"role": "assistant", "content": token}} if chat else {"response": token}
+                            self._write_chunk({"model": model, "created_at": _now(), **part, "done": False})
+
+                elapsed = int((time.monotonic() - started) * 1e9)
+                final = {
+                    "model": model,
+                    "created_at": _now(),
+                    "done": True,
+                    "done_reason": "stop",
+                    "total_duration": elapsed,
+                    "load_duration": 0,
+                    "prompt_eval_count": len(split_tokens(prompt)),
+                    "prompt_eval_duration": int(ttft * 1e9),
+                    "eval_count": len(tokens),
+                    "eval_duration": max(elapsed - int(ttft * 1e9), 0),
+                }
+                if not stream:
+                    text = "".join(tokens)
+                    final.update({"message": {"role": "assistant", "content": text}} if chat else {"response": text})
+                    self._send_json(final)
+                    return
+                final.update({"message": {"role": "assistant", "content": ""}} if chat else {"response": ""})
+                self._write_chunk(final)
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self) -> "FakeOllamaServer":
+        threading.Thread(target=self.server.serve_forever, name="fake-ollama", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Ollama 替身（回放固定回复，无需 GPU）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft", type=float, default=0.3, help="首 token 时间（秒）")
+    parser.add_argument("--tps", type=float, default=40.0, help="每秒生成的 token 数")
+    parser.add_argument("--parallel", type=int, default=4, help="同时生成的请求数，超出的排队")
+    args = parser.parse_args()
+
+    fake = FakeOllamaServer(args.host, args.port, args.ttft, args.tps, args.parallel)
+    LOG.info(f"[FakeOllama] 已启动 {fake.url}（ttft={args.ttft}s, {args.tps} token/s, 并行 {args.parallel}）")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
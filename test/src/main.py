@@ -1,20 +1,56 @@
-import gradio as gr
-from tabs.conversation_tab import create_conversation_tab
-from tabs.vocab_tab import create_vocab_tab
-from tabs.writing_tab import create_mode1_tab,create_mode2_tab
+import os
+from utils.startup import startup_timer  # 最先导入，以便从进程启动开始计时
+
+with startup_timer.phase("导入 Gradio"):
+    import gradio as gr
+with startup_timer.phase("导入标签页"):
+    from tabs.conversation_tab import create_conversation_tab
+    from tabs.vocab_tab import create_vocab_tab
+    from tabs.writing_tab import create_mode1_tab,create_mode2_tab
+    from agents.prefetch import prefetcher
+    from agents.model_lifecycle import model_lifecycle
+    from agents.cancellation import cancellations
+from utils.export_store import export_store
 from utils.logger import LOG
+from utils.metrics import start_metrics_server
+from utils.session import get_user_session
+
+# 每个事件允许同时处理的请求数（各用户状态已按会话隔离，可并发服务多位学习者）
+CONCURRENCY_LIMIT = int(os.getenv("TIRO_CONCURRENCY_LIMIT", "16"))
+
+def cancel_session(request: gr.Request):
+    """页面关闭或刷新时，取消该会话所有仍在进行的生成"""
+    cancellations.cancel(get_user_session(request))
 
 def main():
-    with gr.Blocks(title="Oral English Coach 英语私教") as language_mentor_app:
-        create_conversation_tab()
-        create_vocab_tab()
-        create_mode1_tab()
-        create_mode2_tab()
-    
-    # 启动应用
-    language_mentor_app.launch(share=True, server_name="0.0.0.0")
+    # 在后台预热模型，与界面构建、服务启动并行进行
+    model_lifecycle.start()
 
-if __name__ == "__main__":
-    main()
+    # Agent 在各标签页首次使用时才创建，这里只构建界面
+    with startup_timer.phase("构建界面"):
+        with gr.Blocks(title="Oral English Coach 英语私教") as language_mentor_app:
+            create_conversation_tab()
+            create_vocab_tab()
+            create_mode1_tab()
+            create_mode2_tab()
+            if hasattr(language_mentor_app, "unload"):  # Gradio 4.4 起支持
+                language_mentor_app.unload(cancel_session)
 
+    # 空闲时在后台预备题目与单词组
+    prefetcher.start()
 
+    # 在后台按保留期与总大小清理导出的报告
+    export_store.start()
+
+    # 模型调用耗时与 token 指标（/metrics 与 /metrics.json）
+    start_metrics_server()
+
+    # 启动应用（先不阻塞，以便在开始服务后输出启动耗时报告）
+    with startup_timer.phase("启动服务"):
+        language_mentor_app.queue(default_concurrency_limit=CONCURRENCY_LIMIT)
+        language_mentor_app.launch(share=True, server_name="0.0.0.0", prevent_thread_lock=True)
+    startup_timer.report()
+    language_mentor_app.block_thread()
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,66 @@
 import gradio as gr
-from agents.conversation_agent import ConversationAgent
+from agents.cancellation import cancellations
+from agents.deadlines import with_failure_notice
+from agents.lazy_agent import LazyAgent
+from agents.model_lifecycle import model_lifecycle
 from utils.logger import LOG
-from langchain_core.messages import HumanMessage
+from utils.session import get_user_session
+from utils.streaming import astream_frames
 
-# 初始化对话代理
-conversation_agent = ConversationAgent()
+def create_conversation_agent():
+    from agents.conversation_agent import ConversationAgent
+    return ConversationAgent()
 
-# 全局变量存储场景设定和对话轮数计数
-conversation_context = {
-    "scenario": None,
-    "process": None,
-    "rounds": 0,
-    "max_rounds": 10
-}
+# 对话代理（无用户状态，可被所有会话共享），首次使用时才创建
+conversation_agent = LazyAgent("conversation", create_conversation_agent)
 
-def reset_context():
-    conversation_context.update({
+def new_context(user_session=None):
+    """为一个浏览器会话创建独立的场景设定和对话轮数计数"""
+    return {
+        "session_id": conversation_agent.session_for(user_session),
+        "scenario": None,
+        "process": None,
+        "rounds": 0,
+        "max_rounds": 10
+    }
+
+def get_context(context, request: gr.Request = None):
+    """获取当前浏览器会话的对话上下文，首次访问时创建"""
+    if context is None:
+        context = new_context(get_user_session(request))
+    return context
+
+def reset_context(context):
+    context.update({
         "scenario": None,
         "process": None,
         "rounds": 0
     })
 
-def handle_conversation(user_input, chat_history):
-    if not conversation_context["scenario"] or not conversation_context["process"]:
-        return "Please set both <specific scenario> and <specific process> before starting the conversation."
+async def handle_conversation(user_input, chat_history, context):
+    """处理一轮对话（生成器：随 token 到达逐帧产出截至当前的回复）"""
+    if not context["scenario"] or not context["process"]:
+        yield "Please set both <specific scenario> and <specific process> before starting the conversation."
+        return
 
-    conversation_context["rounds"] += 1
+    context["rounds"] += 1
 
-    bot_message = conversation_agent.chat_with_history(user_input)
+    from langchain_core.messages import HumanMessage  # 首次对话时才导入 LangChain，不拖慢启动
+
+    bot_message = ""
+    deltas = conversation_agent.astream_deltas([HumanMessage(content=user_input)], context["session_id"])
+    # 超时或模型不可用时在回复末尾提示用户，而不是报错
+    async for bot_message in with_failure_notice(astream_frames(deltas)):
+        yield bot_message
     LOG.info(f"[Conversation ChatBot]: {bot_message}")
 
-    if conversation_context["rounds"] >= conversation_context["max_rounds"]:
+    if context["rounds"] >= context["max_rounds"]:
         feedback = (
             "\n\n✅ **Feedback:**\n"
             "**English**: Great job reaching the end of the conversation session.\n"
             "**中文**: 太棒了，你完成了本轮对话训练！继续加油！"
         )
-        bot_message += feedback
-
-    return bot_message
+        yield bot_message + feedback
 
 def create_conversation_tab():
     with gr.Tab("对话"):
@@ -66,12 +88,16 @@ def create_conversation_tab():
         user_input_box = gr.Textbox(label="输入你的英文对话")
         send_button = gr.Button("发送")
         round_state = gr.State(0)
+        # 当前浏览器会话的场景设定与轮数
+        context_state = gr.State(None)
 
-        def set_scenario(scenario, process, max_rounds):
+        async def set_scenario(scenario, process, max_rounds, context, request: gr.Request):
+            context = get_context(context, request)
             if not scenario or not process:
-                return "❗ 请填写完整的场景和过程信息。", 0, []
+                yield "❗ 请填写完整的场景和过程信息。", 0, [], context
+                return
 
-            conversation_context.update({
+            context.update({
                 "scenario": scenario,
                 "process": process,
                 "rounds": 0,
@@ -85,41 +111,49 @@ def create_conversation_tab():
                 f"Please provide a brief bilingual (English and Chinese) overview of this role-play scene, then begin the first sentence of the conversation as Tiro."
             )
 
-            overview = conversation_agent.stream_response_text([
+            status = f"✅ **场景设定成功：{scenario} / {process}**"
+            if not model_lifecycle.is_warm(conversation_agent.model_name):
+                status += "\n\n⏳ 模型正在加载，首次回复可能需要稍等片刻……"
+            from langchain_core.messages import HumanMessage
+
+            overview = ""
+            deltas = conversation_agent.astream_deltas([
                 HumanMessage(content=intro_prompt)
-            ])
+            ], context["session_id"])
+            # 重新设定场景或发送新消息时，取消该会话仍在进行的回复
+            frames = with_failure_notice(astream_frames(deltas))
+            async for overview in cancellations.scoped_stream(get_user_session(request), "conversation", frames):
+                yield status, 0, [["Tiro", overview.strip()]], context
 
             LOG.info(f"[Scene Overview & Intro] {overview}")
 
-            return (
-                f"✅ **场景设定成功：{scenario} / {process}**",
-                0,
-                [["Tiro", overview.strip()]]
-            )
-
-        def reset_scenario():
-            reset_context()
-            return "🔄 场景已重置，请重新设定。", 0, []
+        async def reset_scenario(context, request: gr.Request):
+            context = get_context(context, request)
+            reset_context(context)
+            return "🔄 场景已重置，请重新设定。", 0, [], context
 
-        def chat_fn(user_input, history, round_val):
-            bot_message = handle_conversation(user_input, history)
-            history.append([user_input, bot_message])
-            round_val = conversation_context["rounds"]
-            return history, round_val
+        async def chat_fn(user_input, history, round_val, context, request: gr.Request):
+            context = get_context(context, request)
+            history.append([user_input, ""])
+            frames = handle_conversation(user_input, history, context)
+            async for bot_message in cancellations.scoped_stream(get_user_session(request), "conversation", frames):
+                history[-1][1] = bot_message
+                yield history, context["rounds"], context
 
         set_button.click(
             set_scenario,
-            inputs=[scenario_input, process_input, round_slider],
-            outputs=[status_display, round_counter, conversation_chatbot]
+            inputs=[scenario_input, process_input, round_slider, context_state],
+            outputs=[status_display, round_counter, conversation_chatbot, context_state]
         )
 
         reset_button.click(
             reset_scenario,
-            outputs=[status_display, round_counter, conversation_chatbot]
+            inputs=[context_state],
+            outputs=[status_display, round_counter, conversation_chatbot, context_state]
         )
 
         send_button.click(
             chat_fn,
-            inputs=[user_input_box, conversation_chatbot, round_state],
-            outputs=[conversation_chatbot, round_counter]
+            inputs=[user_input_box, conversation_chatbot, round_state, context_state],
+            outputs=[conversation_chatbot, round_counter, context_state]
         )
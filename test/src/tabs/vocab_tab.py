@@ -1,71 +1,87 @@
 # tabs/vocab_tab.py
 
+import os
 import gradio as gr
-from agents.vocab_agent import VocabAgent
+from agents.cancellation import cancellations
+from agents.deadlines import with_failure_notice
+from agents.lazy_agent import LazyAgent
+from agents.prefetch import PrefetchPool, prefetcher
 from utils.logger import LOG
+from utils.session import get_user_session
+from utils.streaming import astream_frames
 
-# 初始化词汇代理
-vocab_agent = VocabAgent()
+# 按单词数量预取的单词组（默认只预取滑块默认值 5）；单词来自本地词库时预取词条及其例句
+PREFETCH_WORD_COUNTS = [int(n) for n in os.getenv("TIRO_PREFETCH_WORD_COUNTS", "5").split(",") if n.strip()]
+vocab_pool = prefetcher.register(
+    PrefetchPool("vocabulary", lambda word_count: vocab_agent.produce_vocabulary(word_count), PREFETCH_WORD_COUNTS)
+)
 
-def generate_words(word_count):
+def create_vocab_agent():
+    from agents.vocab_agent import VocabAgent
+    agent = VocabAgent()
+    agent.prefetch_pool = vocab_pool
+    return agent
+
+# 词汇代理（无用户状态，可被所有会话共享），首次使用时才创建
+vocab_agent = LazyAgent("vocab_study", create_vocab_agent)
+
+# 词频选项 -> 本地词库的最大词频段（0 表示不限）
+FREQUENCY_BANDS = {"不限": 0, "最常用": 1, "常用": 2}
+
+def get_vocab_session(vocab_state, request: gr.Request = None):
+    """获取当前浏览器会话的词汇学习状态，首次访问时创建"""
+    if vocab_state is None:
+        vocab_state = vocab_agent.new_session(get_user_session(request))
+    return vocab_state
+
+async def generate_words(word_count, level, frequency, vocab_state, request: gr.Request):
     """生成指定数量的单词并展示"""
-    # 调用代理生成单词（修复原代码参数传递问题）
-    response = vocab_agent.generate_vocabulary(word_count)
-    return [("生成单词", response)], response  # 第二个返回值用于更新单词展示区
+    vocab_state = get_vocab_session(vocab_state, request)
+    # 调用代理流式生成单词，边生成边展示（第二个返回值用于更新单词展示区）
+    # 首次生成可命中缓存；已有单词时再次点击表示想换一组，重新生成
+    refresh = vocab_state.words_generated
+    level = "" if level == "不限" else level  # 空字符串表示不限难度
+    max_band = FREQUENCY_BANDS.get(frequency, 0)
+    # 再次点击生成时取消上一次未完成的生成；超时或模型不可用时在已生成的内容后提示用户
+    frames = with_failure_notice(
+        astream_frames(vocab_agent.astream_vocabulary(vocab_state, word_count, refresh, level, max_band))
+    )
+    async for response in cancellations.scoped_stream(get_user_session(request), "vocab.words", frames):
+        yield [("生成单词", response)], response, vocab_state
 
-def start_situation_chat(word_display):
+async def start_situation_chat(word_display, vocab_state, request: gr.Request):
     """开始情景对话，保持单词展示区不变"""
-    response = vocab_agent.start_situation_chat()
-    return [("开始情景对话", response)], word_display  # 不改变单词展示内容
+    vocab_state = get_vocab_session(vocab_state, request)
+    frames = with_failure_notice(astream_frames(vocab_agent.astream_situation_chat(vocab_state)))
+    async for response in cancellations.scoped_stream(get_user_session(request), "vocab.chat", frames):
+        yield [("开始情景对话", response)], word_display, vocab_state  # 不改变单词展示内容
 
-def handle_user_message(user_message, chat_history, current_word_display):
+async def handle_user_message(user_message, chat_history, current_word_display, vocab_state, request: gr.Request):
     """处理用户输入，更新聊天记录并标记已使用的单词"""
     if isinstance(user_message, tuple):
         user_message = user_message[0] if user_message else ""
+    vocab_state = get_vocab_session(vocab_state, request)
     
-    # 获取机器人回复
-    bot_response = vocab_agent.chat_with_history(user_message)
-    chat_history.append((user_message, bot_response))
-    
-    # 检查用户输入中是否包含当前单词，动态更新单词展示区
-    current_words = vocab_agent.current_words
-    word_lines = current_word_display.split('\n')  # 按行分割单词展示内容
-    updated_lines = []
-    
-    for line in word_lines:
-        line_strip = line.strip()
-        if not line_strip:
-            updated_lines.append(line)
-            continue
-        
-        # 提取单词（基于生成格式：[单词] - [音标] - ...）
-        word = line_strip.split(' - ')[0] if ' - ' in line_strip else line_strip
-        
-        # 检查该单词是否在当前学习列表中
-        if any(word == target_word for target_word in current_words):
-            # 不区分大小写检查用户是否使用了该单词
-            if word.lower() in user_message.lower():
-                # 避免重复添加勾选符号
-                updated_line = line + " ✓" if '✓' not in line_strip else line
-            else:
-                updated_line = line
-        else:
-            updated_line = line
-        
-        updated_lines.append(updated_line)
+    # 流式获取机器人回复
+    chat_history.append((user_message, ""))
+    frames = with_failure_notice(astream_frames(vocab_agent.astream_chat(user_message, vocab_state)))
+    async for bot_response in cancellations.scoped_stream(get_user_session(request), "vocab.chat", frames):
+        chat_history[-1] = (user_message, bot_response)
+        yield chat_history, current_word_display, vocab_state
     
-    # 合并更新后的单词展示内容
-    updated_word_display = '\n'.join(updated_lines)
-    return chat_history, updated_word_display
+    # 统计用户输入中使用的单词（接受屈折变化），有新用到的单词时更新展示区
+    updated_word_display = vocab_agent.track_usage(vocab_state, user_message)
+    yield chat_history, updated_word_display or current_word_display, vocab_state
 
-def clear_chat():
+async def clear_chat():
     """清空聊天记录，重置单词展示提示"""
     return [], "请生成单词以展示"
 
-def reset_session():
+async def reset_session(vocab_state, request: gr.Request):
     """重置会话状态（清空单词和聊天记录）"""
-    vocab_agent.restart_session()
-    return [], "请生成单词以展示"
+    vocab_state = get_vocab_session(vocab_state, request)
+    vocab_agent.restart_session(vocab_state)
+    return [], "请生成单词以展示", vocab_state
 
 def create_vocab_tab():
     """创建词汇学习标签页"""
@@ -82,6 +98,20 @@ def create_vocab_tab():
                 label="选择单词数量",
                 interactive=True
             )
+            # 单词难度（从本地词库按难度抽取）
+            level_radio = gr.Radio(
+                ["不限", "初中", "高中", "大学"],
+                value="不限",
+                label="单词难度",
+                interactive=True
+            )
+            # 单词词频（从本地词库按词频段抽取）
+            frequency_radio = gr.Radio(
+                list(FREQUENCY_BANDS),
+                value="不限",
+                label="单词词频",
+                interactive=True
+            )
             # 生成单词按钮
             generate_btn = gr.Button("生成单词", variant="primary")
             # 开始情景对话按钮
@@ -108,23 +138,26 @@ def create_vocab_tab():
             submit_btn = gr.Button("发送", variant="primary")
             clear_btn = gr.Button("清空聊天", variant="secondary")
         
+        # 当前浏览器会话的词汇学习状态
+        vocab_state = gr.State(None)
+        
         # 绑定按钮事件
         generate_btn.click(
             fn=generate_words,
-            inputs=[word_count_slider],
-            outputs=[chatbot, word_display]  # 生成后同时更新聊天记录和单词展示
+            inputs=[word_count_slider, level_radio, frequency_radio, vocab_state],
+            outputs=[chatbot, word_display, vocab_state]  # 生成后同时更新聊天记录和单词展示
         )
         
         chat_btn.click(
             fn=start_situation_chat,
-            inputs=[word_display],
-            outputs=[chatbot, word_display]  # 开始对话时保持单词展示不变
+            inputs=[word_display, vocab_state],
+            outputs=[chatbot, word_display, vocab_state]  # 开始对话时保持单词展示不变
         )
         
         submit_btn.click(
             fn=handle_user_message,
-            inputs=[user_input, chatbot, word_display],  # 传入当前单词展示内容
-            outputs=[chatbot, word_display]  # 同时更新聊天记录和单词展示
+            inputs=[user_input, chatbot, word_display, vocab_state],  # 传入当前单词展示内容
+            outputs=[chatbot, word_display, vocab_state]  # 同时更新聊天记录和单词展示
         )
         
         clear_btn.click(
@@ -135,7 +168,7 @@ def create_vocab_tab():
         
         reset_btn.click(
             fn=reset_session,
-            inputs=[],
-            outputs=[chatbot, word_display]  # 重置会话后清空内容
+            inputs=[vocab_state],
+            outputs=[chatbot, word_display, vocab_state]  # 重置会话后清空内容
         )
 
@@ -1,127 +1,252 @@
 import os
 import gradio as gr
-from tempfile import NamedTemporaryFile
-from langchain_core.messages import HumanMessage
-from agents.writing_agent import WritingAgent
-from agents.reflection_agent import ReflectionAgent
+from agents.admission import BACKGROUND
+from agents.cancellation import cancellations
+from agents.deadlines import MODEL_ERRORS, failure_notice
+from agents.lazy_agent import LazyAgent
+from agents.prefetch import PrefetchPool, prefetcher
+from agents.refinement import RefinementStopper, build_reflection_prompt, parse_score
+from utils.export_store import export_store
 from utils.logger import LOG
+from utils.session import get_user_session
+from utils.streaming import TextAccumulator, astream_frames
 
-# 初始化写作与反思 Agent
-writing_agent = WritingAgent()
-reflection_agent = ReflectionAgent()
+def create_writing_agent():
+    from agents.writing_agent import WritingAgent
+    return WritingAgent()
+
+def create_reflection_agent():
+    from agents.reflection_agent import ReflectionAgent
+    return ReflectionAgent()
+
+# 写作与反思 Agent（无用户状态，按 user_session 区分各自的历史），首次使用时才创建
+writing_agent = LazyAgent("writing", create_writing_agent)
+reflection_agent = LazyAgent("reflection", create_reflection_agent)
+
+DIFFICULTIES = ["初中", "高中", "大学"]
+
+def user_messages(prompt: str) -> list:
+    """构造只含一条用户消息的输入（首次调用时才导入 LangChain，不拖慢启动）"""
+    from langchain_core.messages import HumanMessage
+    return [HumanMessage(content=prompt)]
+
+def topic_prompt(difficulty: str) -> str:
+    """构造按难度出题的提示"""
+    return f"请生成一个{difficulty}难度的英语作文题目，只返回题目文本，不要额外内容。"
+
+def produce_topic(difficulty: str) -> str:
+    """为预取池生成一个题目（不带会话历史，按后台任务排队）"""
+    return writing_agent.generate_text(user_messages(topic_prompt(difficulty)), task="topic", priority=BACKGROUND).strip()
+
+# 按难度预取的作文题目
+topic_pool = prefetcher.register(PrefetchPool("topics", produce_topic, DIFFICULTIES))
+
+def take_prefetched_topic(difficulty: str, user_session: str = None):
+    """从预取池取一个现成题目，命中时记入会话历史"""
+    topic = topic_pool.take(difficulty)
+    if topic is not None:
+        writing_agent.record_exchange(
+            user_messages(topic_prompt(difficulty)), topic, writing_agent.session_for(user_session)
+        )
+    return topic
 
 # ==== 核心工具函数 ====
-def get_topic_with_difficulty(difficulty: str) -> str:
-    """根据难度生成作文题目"""
-    prompt = f"请生成一个{difficulty}难度的英语作文题目，只返回题目文本，不要额外内容。"
-    topic = writing_agent.stream_response_text([HumanMessage(content=prompt)])
+def get_topic_with_difficulty(difficulty: str, user_session: str = None, refresh: bool = False) -> str:
+    """根据难度生成作文题目（优先取预取结果，其次缓存；refresh=True 时换一个新题目）"""
+    topic = take_prefetched_topic(difficulty, user_session)
+    if topic is not None:
+        return topic
+    topic = writing_agent.cached_response_text(
+        user_messages(topic_prompt(difficulty)), writing_agent.session_for(user_session), refresh=refresh,
+        task="topic"
+    )
     return topic.strip()
 
-def reflect_with_difficulty(article: str, difficulty: str) -> str:
+def build_suggestion_prompt(topic: str, difficulty: str) -> str:
+    """构造按难度给出写作建议的提示"""
+    return (
+        f"请针对以下{difficulty}难度的英文作文题目，给出对应难度的详细写作建议，"
+        f"包括写作要点、结构、适配词汇和语法建议。\n\n题目：{topic}"
+    )
+
+def reflect_with_difficulty(article: str, difficulty: str, user_session: str = None) -> str:
     """结合难度进行作文反思点评"""
-    reflection_prompt = (
-        f"请基于{difficulty}难度标准，从4个维度点评以下作文：\n"
-        f"1. 评分（内容契合30%，结构完整50%，语法20%）\n"
-        f"2. 优点\n"
-        f"3. 不足\n"
-        f"4. 整体建议\n\n作文内容：\n{article}"
+    return reflection_agent.stream_response_text(
+        user_messages(build_reflection_prompt(article, difficulty)),
+        reflection_agent.session_for(user_session)
     )
-    return reflection_agent.stream_response_text([HumanMessage(content=reflection_prompt)])
 
-def generate_suggestion_with_difficulty(topic: str, difficulty: str) -> str:
-    """结合难度生成写作建议"""
-    suggestion_prompt = (
-        f"请针对以下{difficulty}难度的英文作文题目，给出对应难度的详细写作建议，"
-        f"包括写作要点、结构、适配词汇和语法建议。\n\n题目：{topic}"
+def generate_suggestion_with_difficulty(topic: str, difficulty: str, user_session: str = None) -> str:
+    """结合难度生成写作建议（可缓存）"""
+    return reflection_agent.cached_response_text(
+        user_messages(build_suggestion_prompt(topic, difficulty)),
+        reflection_agent.session_for(user_session),
+        task="suggestion"
+    )
+
+async def aget_topic_with_difficulty(difficulty: str, user_session: str = None, refresh: bool = False) -> str:
+    """get_topic_with_difficulty 的异步版本"""
+    topic = take_prefetched_topic(difficulty, user_session)
+    if topic is not None:
+        return topic
+    topic = await writing_agent.acached_response_text(
+        user_messages(topic_prompt(difficulty)), writing_agent.session_for(user_session), refresh=refresh,
+        task="topic"
     )
-    return reflection_agent.stream_response_text([HumanMessage(content=suggestion_prompt)])
+    return topic.strip()
+
+async def astream_section(report: TextAccumulator, heading: str, agent, prompt: str,
+                          user_session: str = None, tail: str = "\n\n", cached: bool = False, task: str = None):
+    """
+    流式生成报告中的一节：逐帧产出 (报告Markdown, 该节截至当前的文本)，
+    结束后把该节追加到报告，最后一帧的第二项即该节完整文本。
+    cached=True 时使用响应缓存（仅用于确定性的提示，如写作建议）；task 为模型路由的任务，默认按 Agent。
+    调用超时或模型不可用时把已生成的部分追加到报告后再抛出，由调用方结束流程。
+    """
+    text = ""
+    messages = user_messages(prompt)
+    session_id = agent.session_for(user_session)
+    if cached:
+        deltas = agent.acached_stream_deltas(messages, session_id, task=task)
+    else:
+        deltas = agent.astream_deltas(messages, session_id, task)
+    try:
+        async for text in astream_frames(deltas):
+            yield report.text + heading + text, text
+    except MODEL_ERRORS:
+        report.append(f"{heading}{text}")
+        raise
+    report.append(f"{heading}{text}{tail}")
 
+async def stopped_report(report: TextAccumulator, writer, error: Exception):
+    """精进流程因调用超时或模型不可用而中止：在报告末尾提示用户，已生成的部分照常提供下载"""
+    LOG.warning(f"[Writing] 精进流程中止: {error}")
+    report.append(f"\n\n{failure_notice(error)}\n")
+    return report.text, await writer.afinish()
 
 # ==== 模式一：Tiro出题模式核心逻辑 ====
-def mode1_process(topic: str, user_essay: str, difficulty: str, rounds: int) -> tuple:
-    """模式一处理流程"""
-    all_output = f"## 📌 Tiro出题（{difficulty}难度）\n{topic}\n\n"
-    
-    # 检查用户作文
-    if not user_essay.strip():
-        all_output += "### ⚠️ 提示：未检测到用户作文，仅生成写作建议\n"
-        suggestion = generate_suggestion_with_difficulty(topic, difficulty)
-        all_output += f"### 💡 写作建议（{difficulty}适配）\n{suggestion}\n"
-    else:
-        all_output += f"### 📝 用户提交作文\n{user_essay}\n\n"
-        current_essay = user_essay
+async def mode1_process(topic: str, user_essay: str, difficulty: str, rounds: int, user_session: str = None):
+    """模式一处理流程（异步生成器：边生成边产出 (Markdown, 下载路径)，最后一帧带下载文件）"""
+    writer = export_store.open_report()
+    report = TextAccumulator(f"## 📌 Tiro出题（{difficulty}难度）\n{topic}\n\n", sink=writer.write)
+    try:
+        # 检查用户作文
+        if not user_essay.strip():
+            report.append("### ⚠️ 提示：未检测到用户作文，仅生成写作建议\n")
+            async for frame, _ in astream_section(
+                report, f"### 💡 写作建议（{difficulty}适配）\n", reflection_agent,
+                build_suggestion_prompt(topic, difficulty), user_session, tail="\n", cached=True, task="suggestion"
+            ):
+                yield frame, None
+        else:
+            report.append(f"### 📝 用户提交作文\n{user_essay}\n\n")
+            current_essay = user_essay
+            stopper = RefinementStopper(rounds, pipeline="mode1")
         
-        # 多轮精进流程
-        for i in range(1, rounds + 1):
-            # 反思智能体评分评价
-            reflection = reflect_with_difficulty(current_essay, difficulty)
-            all_output += f"### 第{i}轮 💬 反思点评（{difficulty}标准）\n{reflection}\n\n"
+            # 多轮精进流程（评分达标或不再提升时提前结束）
+            for i in range(1, rounds + 1):
+                stopper.begin_round()
+                # 反思智能体评分评价
+                reflection = ""
+                async for frame, reflection in astream_section(
+                    report, f"### 第{i}轮 💬 反思点评（{difficulty}标准）\n", reflection_agent,
+                    build_reflection_prompt(current_essay, difficulty), user_session
+                ):
+                    yield frame, None
+                if stopper.should_stop(parse_score(reflection)):
+                    break
             
-            # 写作智能体生成范文
-            write_prompt = (
-                f"基于以下{difficulty}难度题目和反思建议，生成一篇范文：\n"
-                f"题目：{topic}\n"
-                f"反思建议：{reflection}\n"
-                f"要求符合{difficulty}水平，内容契合题目"
-            )
-            model_essay = writing_agent.stream_response_text([HumanMessage(content=write_prompt)])
-            all_output += f"### 第{i}轮 ✍️ AI 范文\n{model_essay}\n\n"
+                # 写作智能体生成范文
+                write_prompt = (
+                    f"基于以下{difficulty}难度题目和反思建议，生成一篇范文：\n"
+                    f"题目：{topic}\n"
+                    f"反思建议：{reflection}\n"
+                    f"要求符合{difficulty}水平，内容契合题目"
+                )
+                model_essay = ""
+                async for frame, model_essay in astream_section(
+                    report, f"### 第{i}轮 ✍️ AI 范文\n", writing_agent, write_prompt, user_session
+                ):
+                    yield frame, None
             
-            # 更新当前作文为范文（用于下一轮精进）
-            current_essay = model_essay
-    
-    # 生成下载文件
-    with NamedTemporaryFile(delete=False, mode='w', encoding='utf-8', suffix='.txt') as tmp_file:
-        tmp_file.write(all_output)
-        download_path = tmp_file.name
+                # 更新当前作文为范文（用于下一轮精进）
+                current_essay = model_essay
+        
+            report.append(stopper.summary() + "\n")
     
-    return all_output, download_path
+        # 生成下载文件
+        yield report.text, await writer.afinish()
+    except MODEL_ERRORS as e:
+        yield await stopped_report(report, writer, e)
+    finally:
+        await writer.adiscard()  # 生成被中断时删除未完成的报告
 
 
 # ==== 模式二：用户出题模式核心逻辑 ====
-def mode2_process(user_topic: str, difficulty: str, rounds: int) -> tuple:
-    """模式二处理流程"""
+async def mode2_process(user_topic: str, difficulty: str, rounds: int, user_session: str = None):
+    """模式二处理流程（异步生成器：边生成边产出 (Markdown, 下载路径)，最后一帧带下载文件）"""
     if not user_topic.strip():
-        return "⚠️ 请先输入作文题目", None
-    
-    all_output = f"## 📌 用户自定义题目（{difficulty}难度）\n{user_topic}\n\n"
+        yield "⚠️ 请先输入作文题目", None
+        return
     
-    # 生成对应难度的写作建议
-    suggestion = generate_suggestion_with_difficulty(user_topic, difficulty)
-    all_output += f"### 💡 写作建议（{difficulty}适配）\n{suggestion}\n\n"
+    writer = export_store.open_report()
+    report = TextAccumulator(f"## 📌 用户自定义题目（{difficulty}难度）\n{user_topic}\n\n", sink=writer.write)
+    try:
+        # 生成对应难度的写作建议
+        suggestion = ""
+        async for frame, suggestion in astream_section(
+            report, f"### 💡 写作建议（{difficulty}适配）\n", reflection_agent,
+            build_suggestion_prompt(user_topic, difficulty), user_session, cached=True, task="suggestion"
+        ):
+            yield frame, None
     
-    # 初始写作
-    initial_prompt = (
-        f"根据以下{difficulty}难度题目和写作建议，生成初始作文：\n"
-        f"题目：{user_topic}\n"
-        f"建议：{suggestion}"
-    )
-    current_essay = writing_agent.stream_response_text([HumanMessage(content=initial_prompt)])
-    all_output += f"### 初始 ✍️ AI 作文\n{current_essay}\n\n"
-    
-    # 多轮精进流程
-    for i in range(1, rounds + 1):
-        # 反思智能体评价
-        reflection = reflect_with_difficulty(current_essay, difficulty)
-        all_output += f"### 第{i}轮 💬 反思点评（{difficulty}标准）\n{reflection}\n\n"
-        
-        # 写作智能体重写优化
-        rewrite_prompt = (
-            f"基于以下{difficulty}难度题目和反思建议，优化作文：\n"
+        # 初始写作
+        initial_prompt = (
+            f"根据以下{difficulty}难度题目和写作建议，生成初始作文：\n"
             f"题目：{user_topic}\n"
-            f"当前作文：{current_essay}\n"
-            f"反思建议：{reflection}\n"
-            f"要求符合{difficulty}水平，针对性优化"
+            f"建议：{suggestion}"
         )
-        current_essay = writing_agent.stream_response_text([HumanMessage(content=rewrite_prompt)])
-        all_output += f"### 第{i}轮 ✍️ 优化作文\n{current_essay}\n\n"
+        current_essay = ""
+        async for frame, current_essay in astream_section(
+            report, "### 初始 ✍️ AI 作文\n", writing_agent, initial_prompt, user_session
+        ):
+            yield frame, None
     
-    # 生成下载文件
-    with NamedTemporaryFile(delete=False, mode='w', encoding='utf-8', suffix='.txt') as tmp_file:
-        tmp_file.write(all_output)
-        download_path = tmp_file.name
+        # 多轮精进流程（评分达标或不再提升时提前结束）
+        stopper = RefinementStopper(rounds, pipeline="mode2")
+        for i in range(1, rounds + 1):
+            stopper.begin_round()
+            # 反思智能体评价
+            reflection = ""
+            async for frame, reflection in astream_section(
+                report, f"### 第{i}轮 💬 反思点评（{difficulty}标准）\n", reflection_agent,
+                build_reflection_prompt(current_essay, difficulty), user_session
+            ):
+                yield frame, None
+            if stopper.should_stop(parse_score(reflection)):
+                break
+        
+            # 写作智能体重写优化
+            rewrite_prompt = (
+                f"基于以下{difficulty}难度题目和反思建议，优化作文：\n"
+                f"题目：{user_topic}\n"
+                f"当前作文：{current_essay}\n"
+                f"反思建议：{reflection}\n"
+                f"要求符合{difficulty}水平，针对性优化"
+            )
+            async for frame, current_essay in astream_section(
+                report, f"### 第{i}轮 ✍️ 优化作文\n", writing_agent, rewrite_prompt, user_session
+            ):
+                yield frame, None
+    
+        report.append(stopper.summary() + "\n")
     
-    return all_output, download_path
+        # 生成下载文件
+        yield report.text, await writer.afinish()
+    except MODEL_ERRORS as e:
+        yield await stopped_report(report, writer, e)
+    finally:
+        await writer.adiscard()  # 生成被中断时删除未完成的报告
 
 
 # ==== 界面封装：模式一（Tiro出题） ====
@@ -130,9 +255,6 @@ def create_mode1_tab():
         gr.Markdown("## 📌 Tiro出题模式")
         gr.Markdown("1. 选择难度（初中/高中/大学）\n2. 生成题目并提交你的作文\n3. 选择精进轮次获取AI点评与范文")
         
-        # 状态变量
-        difficulty_state = gr.State("初中")
-        
         # 界面布局
         with gr.Row():
             # 左侧输入区
@@ -140,7 +262,7 @@ def create_mode1_tab():
                 # 难度选择
                 gr.Markdown("### 选择难度")
                 difficulty_buttons = gr.Radio(
-                    ["初中", "高中", "大学"], 
+                    DIFFICULTIES, 
                     value="初中", 
                     label="难度等级",
                     interactive=True
@@ -162,6 +284,7 @@ def create_mode1_tab():
                 
                 # 操作按钮
                 start_btn = gr.Button("🚀 开始精进")
+                stop_btn = gr.Button("⏹ 停止")
                 export_btn = gr.Button("📄 导出结果", visible=False)
             
             # 右侧输出区
@@ -169,9 +292,8 @@ def create_mode1_tab():
                 output_display = gr.Markdown(label="处理结果")
                 export_file = gr.File(label="下载链接", visible=False)
         
-        # 事件绑定：难度选择
-        def set_difficulty(diff):
-            difficulty_state.value = diff
+        # 事件绑定：难度选择（难度直接从 Radio 读取，不写入共享的组件默认值）
+        async def set_difficulty(diff):
             return f"已选择：{diff}难度"
         
         difficulty_buttons.change(
@@ -180,9 +302,26 @@ def create_mode1_tab():
             outputs=gr.Textbox(label="状态提示", visible=False)  # 隐藏状态提示
         )
         
-        # 事件绑定：生成/更换题目
-        def generate_topic(diff):
-            return get_topic_with_difficulty(diff)
+        # 事件绑定：生成/更换题目（生成可命中缓存，更换时重新生成；连续点击时只保留最后一次）
+        async def generate_topic(diff, request: gr.Request):
+            user_session = get_user_session(request)
+            with cancellations.scope(user_session, "topic"):
+                try:
+                    return await aget_topic_with_difficulty(diff, user_session)
+                except MODEL_ERRORS as e:
+                    LOG.warning(f"[Writing] 生成题目失败: {e}")
+                    gr.Warning(failure_notice(e))
+            return gr.update()
+        
+        async def change_topic(diff, request: gr.Request):
+            user_session = get_user_session(request)
+            with cancellations.scope(user_session, "topic"):
+                try:
+                    return await aget_topic_with_difficulty(diff, user_session, refresh=True)
+                except MODEL_ERRORS as e:
+                    LOG.warning(f"[Writing] 更换题目失败: {e}")
+                    gr.Warning(failure_notice(e))
+            return gr.update()
         
         gen_topic_btn.click(
             fn=generate_topic,
@@ -191,26 +330,38 @@ def create_mode1_tab():
         )
         
         change_topic_btn.click(
-            fn=generate_topic,
+            fn=change_topic,
             inputs=difficulty_buttons,
             outputs=topic_display
         )
         
         # 事件绑定：开始精进
-        def start_mode1(topic, essay, diff, rounds):
+        async def start_mode1(topic, essay, diff, rounds, request: gr.Request):
             if not topic.strip():
-                return "⚠️ 请先生成题目", None
-            return mode1_process(topic, essay, diff, rounds)
+                yield "⚠️ 请先生成题目", None
+                return
+            user_session = get_user_session(request)
+            # 再次点击开始时取消上一次未完成的精进
+            frames = mode1_process(topic, essay, diff, rounds, user_session)
+            async for frame in cancellations.scoped_stream(user_session, "mode1", frames):
+                yield frame
         
-        start_btn.click(
+        start_event = start_btn.click(
             fn=start_mode1,
             inputs=[topic_display, user_essay, difficulty_buttons, rounds_slider],
             outputs=[output_display, export_file]
-        ).then(
+        )
+        start_event.then(
             fn=lambda: (gr.update(visible=True), gr.update(visible=True)),
             outputs=[export_btn, export_file]
         )
         
+        # 事件绑定：停止（取消界面任务，并中止仍在进行的模型请求）
+        def stop_mode1(request: gr.Request):
+            cancellations.cancel(get_user_session(request), "mode1")
+        
+        stop_btn.click(fn=stop_mode1, cancels=[start_event])
+        
         # 事件绑定：导出结果
         export_btn.click(
             fn=lambda x: x,
@@ -232,7 +383,7 @@ def create_mode2_tab():
                 # 难度选择
                 gr.Markdown("### 选择难度")
                 difficulty_buttons = gr.Radio(
-                    ["初中", "高中", "大学"], 
+                    DIFFICULTIES, 
                     value="初中", 
                     label="难度等级",
                     interactive=True
@@ -251,6 +402,7 @@ def create_mode2_tab():
                 
                 # 操作按钮
                 start_btn = gr.Button("🚀 开始处理")
+                stop_btn = gr.Button("⏹ 停止")
                 export_btn = gr.Button("📄 导出结果", visible=False)
             
             # 右侧输出区
@@ -260,7 +412,7 @@ def create_mode2_tab():
                 export_file = gr.File(label="下载链接", visible=False)
         
         # 事件绑定：确认/重置题目
-        def confirm_topic(topic):
+        async def confirm_topic(topic):
             if not topic.strip():
                 return "⚠️ 题目不能为空", gr.update(visible=False)
             return f"已确认：{topic}", gr.update(visible=True, value=topic)
@@ -277,20 +429,32 @@ def create_mode2_tab():
         )
         
         # 事件绑定：开始处理
-        def start_mode2(topic, diff, rounds):
+        async def start_mode2(topic, diff, rounds, request: gr.Request):
             if not topic.strip():
-                return "⚠️ 请先确认题目", None
-            return mode2_process(topic, diff, rounds)
+                yield "⚠️ 请先确认题目", None
+                return
+            user_session = get_user_session(request)
+            # 再次点击开始时取消上一次未完成的处理
+            frames = mode2_process(topic, diff, rounds, user_session)
+            async for frame in cancellations.scoped_stream(user_session, "mode2", frames):
+                yield frame
         
-        start_btn.click(
+        start_event = start_btn.click(
             fn=start_mode2,
             inputs=[topic_confirm_display, difficulty_buttons, rounds_slider],
             outputs=[output_display, export_file]
-        ).then(
+        )
+        start_event.then(
             fn=lambda: (gr.update(visible=True), gr.update(visible=True)),
             outputs=[export_btn, export_file]
         )
         
+        # 事件绑定：停止（取消界面任务，并中止仍在进行的模型请求）
+        def stop_mode2(request: gr.Request):
+            cancellations.cancel(get_user_session(request), "mode2")
+        
+        stop_btn.click(fn=stop_mode2, cancels=[start_event])
+        
         # 事件绑定：导出结果
         export_btn.click(
             fn=lambda x: x,
@@ -0,0 +1,219 @@
+import asyncio
+import gzip
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils.logger import LOG
+
+# 导出文件配置（可通过环境变量覆盖）
+EXPORT_DIR = os.getenv("TIRO_EXPORT_DIR", "data/exports")
+EXPORT_MAX_AGE = float(os.getenv("TIRO_EXPORT_MAX_AGE", str(24 * 3600)))  # 导出文件保留多久（秒）
+EXPORT_MAX_BYTES = int(os.getenv("TIRO_EXPORT_MAX_BYTES", str(256 * 1024 * 1024)))  # 所有导出文件的总大小上限
+SWEEP_INTERVAL = float(os.getenv("TIRO_EXPORT_SWEEP_INTERVAL", "600"))  # 清理过期文件的间隔（秒）
+# 供下载的解压副本只需保留到界面取走文件，之后可随时从压缩文件重新生成
+DOWNLOAD_MAX_AGE = float(os.getenv("TIRO_EXPORT_DOWNLOAD_MAX_AGE", "3600"))
+EXPORT_SUFFIX = ".txt.gz"
+DOWNLOAD_SUFFIX = ".txt"
+PARTIAL_DIR = "partial"  # 尚在写入中的报告
+DOWNLOAD_DIR = "downloads"  # 解压后供下载的报告
+
+
+class ReportWriter:
+    """
+    边生成边写入的报告文件：每段内容完成后追加到压缩文件，
+    结束时按内容哈希命名，相同内容的报告只保存一份。
+    文件读写都交给导出目录的写入线程按提交顺序执行，调用方（包括事件循环）不会被磁盘 I/O 阻塞。
+    """
+    def __init__(self, store: "ExportStore"):
+        self.store = store
+        self.path = os.path.join(store.partial_dir, f"{uuid.uuid4().hex}{EXPORT_SUFFIX}")
+        self._file = None
+        self._digest = hashlib.sha256()
+        self.closed = False
+
+    def write(self, text: str) -> None:
+        if self.closed or not text:
+            return
+        self.store.io.submit(self._write, text.encode("utf-8"))
+
+    def finish(self) -> str:
+        """
+        结束写入并移入导出目录，返回供下载的（解压后的 .txt）文件路径。
+        """
+        return self._close(self._finish).result()
+
+    async def afinish(self) -> str:
+        """finish 的异步版本"""
+        return await asyncio.wrap_future(self._close(self._finish))
+
+    def discard(self) -> None:
+        """放弃未完成的报告（如生成被中断）"""
+        self._close(self._discard).result()
+
+    async def adiscard(self) -> None:
+        """discard 的异步版本"""
+        await asyncio.wrap_future(self._close(self._discard))
+
+    def _close(self, action) -> Future:
+        if self.closed:
+            done = Future()
+            done.set_result(None)
+            return done
+        self.closed = True
+        return self.store.io.submit(action)
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(self.store.partial_dir, exist_ok=True)
+            self._file = gzip.GzipFile(self.path, mode="wb", mtime=0)  # 固定 mtime，相同内容压缩结果一致
+        return self._file
+
+    def _write(self, data: bytes) -> None:
+        file = self._open()
+        file.write(data)
+        file.flush()
+        self._digest.update(data)
+
+    def _finish(self) -> str:
+        self._open().close()
+        name = f"tiro-report-{self._digest.hexdigest()[:32]}"
+        stored_path = os.path.join(self.store.root, name + EXPORT_SUFFIX)
+        if os.path.exists(stored_path):
+            os.remove(self.path)
+            os.utime(stored_path)  # 重新计算保留期
+        else:
+            os.replace(self.path, stored_path)
+        return self.store.download_copy(stored_path)
+
+    def _discard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class ExportStore:
+    """
+    报告导出目录：压缩存储、内容寻址命名，下载时提供解压后的 .txt 副本，后台按保留期与总大小清理。
+    """
+    def __init__(self, root=EXPORT_DIR, max_age=EXPORT_MAX_AGE, max_bytes=EXPORT_MAX_BYTES,
+                 download_max_age=DOWNLOAD_MAX_AGE):
+        self.root = root
+        self.partial_dir = os.path.join(root, PARTIAL_DIR)
+        self.download_dir = os.path.join(root, DOWNLOAD_DIR)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.download_max_age = download_max_age
+        # 单个写入线程按提交顺序执行所有报告的文件读写
+        self.io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export-writer")
+        self._thread = None
+        self._stop = threading.Event()
+
+    def open_report(self) -> ReportWriter:
+        return ReportWriter(self)
+
+    def save(self, text: str) -> str:
+        """一次性保存完整的报告，返回供下载的文件路径"""
+        writer = self.open_report()
+        writer.write(text)
+        return writer.finish()
+
+    def download_copy(self, stored_path: str) -> str:
+        """
+        返回压缩存储的报告解压后的 .txt 副本路径（已存在时直接复用）。
+        """
+        name = os.path.basename(stored_path)[:-len(EXPORT_SUFFIX)] + DOWNLOAD_SUFFIX
+        path = os.path.join(self.download_dir, name)
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        os.makedirs(self.download_dir, exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with gzip.open(stored_path, "rb") as source, open(temp_path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.replace(temp_path, path)
+        return path
+
+    def _files(self, directory: str, suffix: str = EXPORT_SUFFIX) -> list:
+        entries = []
+        if not os.path.isdir(directory):
+            return entries
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(suffix):
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def sweep(self) -> int:
+        """
+        删除超过保留期的文件；总大小仍超限时从最旧的开始删除。
+        写入中的报告只在超过保留期后（视为遗留）才删除；解压的下载副本按 download_max_age 删除。
+        返回:
+            int: 删除的文件数
+        """
+        now = time.time()
+        removed = 0
+        files = []
+        for mtime, _, path in self._files(self.download_dir, DOWNLOAD_SUFFIX):
+            if now - mtime > self.download_max_age:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        for mtime, size, path in self._files(self.partial_dir) + self._files(self.root):
+            if now - mtime > self.max_age:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            elif os.path.dirname(path) == self.root:
+                files.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+                total -= size
+            except OSError:
+                pass
+        if removed:
+            LOG.info(f"[Export] 已清理 {removed} 个过期导出文件，剩余 {total / 1024 / 1024:.1f}MB")
+        return removed
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except OSError as e:
+                LOG.error(f"[Export] 清理导出文件失败: {e}")
+            self._stop.wait(SWEEP_INTERVAL)
+
+    def start(self) -> None:
+        """启动后台清理线程（启动时先清理一次上次运行遗留的文件）"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="export-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+# 进程内共享的导出目录
+export_store = ExportStore()
@@ -1,19 +1,87 @@
 from loguru import logger
+import os
 import sys
 import logging
 
+# 日志配置（可通过环境变量覆盖）
+LOG_LEVEL = os.getenv("TIRO_LOG_LEVEL", "INFO").upper()  # 默认日志级别
+# 按模块覆盖日志级别，例如 "agents.call_metrics=DEBUG,agents.prefetch=WARNING"（按模块名前缀匹配）
+LOG_MODULE_LEVELS = os.getenv("TIRO_LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("TIRO_LOG_FORMAT", "text")  # 日志文件格式：text 或 json（每行一个 JSON 对象）
+LOG_FILE = os.getenv("TIRO_LOG_FILE", "logs/app.log")  # 为空时不写日志文件
+LOG_ROTATION = os.getenv("TIRO_LOG_ROTATION", "10 MB")  # 日志文件达到该大小后轮换
+LOG_RETENTION = os.getenv("TIRO_LOG_RETENTION", "10")  # 保留的轮换文件数（也可写 "7 days"）
+LOG_COMPRESSION = os.getenv("TIRO_LOG_COMPRESSION", "gz")  # 轮换后的文件压缩格式，为空时不压缩
+LOG_MAX_CHARS = int(os.getenv("TIRO_LOG_MAX_CHARS", "1000"))  # 单条日志的最大字符数，0 表示不截断
+
 # 定义统一的日志格式字符串
 log_format = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {module}:{function}:{line} - {message}"
 
+
+def parse_module_levels(spec: str, default: str = LOG_LEVEL) -> dict:
+    """
+    把 "模块=级别,..." 解析为 Loguru 的按模块过滤规则（空字符串键为默认级别）。
+    """
+    levels = {"": default}
+    for item in spec.split(","):
+        module, _, level = item.partition("=")
+        if module.strip() and level.strip():
+            levels[module.strip()] = level.strip().upper()
+    return levels
+
+
+def truncate_message(record) -> None:
+    """
+    截断过长的日志（如整篇作文或完整的模型回复），保留开头与结尾，并注明省略的字符数。
+    """
+    message = record["message"]
+    if LOG_MAX_CHARS <= 0 or len(message) <= LOG_MAX_CHARS:
+        return
+    head = LOG_MAX_CHARS * 2 // 3
+    tail = LOG_MAX_CHARS - head
+    record["message"] = f"{message[:head]} …[省略 {len(message) - LOG_MAX_CHARS} 字符]… {message[-tail:]}"
+
+
+module_levels = parse_module_levels(LOG_MODULE_LEVELS)
+
+
+def _enabled(record) -> bool:
+    """按模块级别规则判断是否输出（取最长的匹配前缀）"""
+    name = record["name"] or ""
+    prefix = max(
+        (module for module in module_levels if not module or name == module or name.startswith(module + ".")),
+        key=len,
+    )
+    return record["level"].no >= logger.level(module_levels[prefix]).no
+
+
 # 配置 Loguru,移除默认的日志配置
 logger.remove()
+logger.configure(patcher=truncate_message)
+
+# 所有输出都经由队列交给后台线程写入（enqueue=True），请求线程不做日志 I/O
+# 标准输出只写 ERROR 以下的日志，ERROR 及以上写标准错误，避免重复
+logger.add(
+    sys.stdout, level=0, format=log_format, colorize=True, enqueue=True,
+    filter=lambda record: record["level"].no < logging.ERROR and _enabled(record),
+)
+logger.add(sys.stderr, level="ERROR", format=log_format, colorize=True, enqueue=True, filter=module_levels)
 
-# 使用统一的日志格式配置标准输出和标准错误输出，支持彩色显示
-logger.add(sys.stdout, level="DEBUG", format=log_format, colorize=True)
-logger.add(sys.stderr, level="ERROR", format=log_format, colorize=True)
+# 日志文件按大小轮换，旧文件压缩并只保留有限个数，避免占满磁盘
+if LOG_FILE:
+    logger.add(
+        LOG_FILE,
+        level=0,
+        format=log_format,
+        filter=module_levels,
+        serialize=LOG_FORMAT == "json",
+        rotation=LOG_ROTATION,
+        retention=int(LOG_RETENTION) if LOG_RETENTION.isdigit() else LOG_RETENTION,
+        compression=LOG_COMPRESSION or None,
+        enqueue=True,
+        encoding="utf-8",
+    )
 
-# 同样使用统一的格式配置日志文件输出，设置文件大小为1MB自动轮换
-logger.add("logs/app.log", rotation="1 MB", level="DEBUG", format=log_format)
 
 # 为 logger 设置别名，方便在其他模块中导入和使用
 LOG = logger
@@ -0,0 +1,237 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.logger import LOG
+
+# 指标服务配置（可通过环境变量覆盖）
+METRICS_PORT = int(os.getenv("TIRO_METRICS_PORT", "9464"))  # 0 表示不启动指标服务
+METRICS_HOST = os.getenv("TIRO_METRICS_HOST", "127.0.0.1")
+RECENT_CALLS = int(os.getenv("TIRO_METRICS_RECENT_CALLS", "50"))  # JSON 摘要中保留的最近调用记录数
+
+# 常用的直方图分桶
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160)
+
+
+class Histogram:
+    """
+    固定分桶的直方图，记录每个桶的计数、总和与样本数。
+    """
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf 桶
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float):
+        """
+        按分桶线性插值估算分位数，没有样本时返回 None。
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else lower
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return lower
+
+
+def _label_text(labels: tuple, extra: str = "") -> str:
+    parts = [f'{key}="{str(value).replace(chr(34), chr(39))}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_bound(bound) -> str:
+    return f"{bound:g}"
+
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表：直方图、计数器与仪表按名称和标签区分，
+    可输出为可抓取的文本格式，或汇总为 JSON。
+    """
+    def __init__(self, recent_calls=RECENT_CALLS):
+        self._histograms = {}  # name -> {labels: Histogram}
+        self._buckets = {}  # name -> buckets
+        self._counters = {}  # name -> {labels: int}
+        self._gauges = {}  # name -> {labels: float}
+        self._help = {}
+        self._recent = deque(maxlen=recent_calls)
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, buckets, help_text: str = "") -> None:
+        """登记直方图的分桶与说明（重复登记无副作用）"""
+        with self._lock:
+            self._buckets.setdefault(name, tuple(buckets))
+            self._histograms.setdefault(name, {})
+            self._help.setdefault(name, help_text)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._buckets.get(name, LATENCY_BUCKETS))
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: int = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def gauge(self, name: str, help_text: str = "") -> None:
+        """登记仪表的说明（重复登记无副作用）"""
+        with self._lock:
+            self._gauges.setdefault(name, {})
+            self._help.setdefault(name, help_text)
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """设置仪表的当前值（如队列长度）"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def record_call(self, record: dict) -> None:
+        """保存一条最近调用的明细，供 JSON 摘要查看"""
+        with self._lock:
+            self._recent.append(record)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """记录代码块耗时（秒）到直方图"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    def render_text(self) -> str:
+        """
+        输出 Prometheus 文本格式的全部指标。
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if self._help.get(name):
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_label_text(labels)} {value}")
+            for name, series in sorted(self._gauges.items()):
+                if self._help.get(name):
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_label_text(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                if self._help.get(name):
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        le = 'le="%s"' % _format_bound(bound)
+                        lines.append(f"{name}_bucket{_label_text(labels, le)} {cumulative}")
+                    inf = 'le="+Inf"'
+                    lines.append(f"{name}_bucket{_label_text(labels, inf)} {histogram.count}")
+                    lines.append(f"{name}_sum{_label_text(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{_label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """
+        汇总为 JSON 友好的结构：每个直方图的样本数、均值与 p50/p95/p99，计数器、仪表与最近调用明细。
+        """
+        with self._lock:
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(labels),
+                        "count": h.count,
+                        "avg": round(h.sum / h.count, 4) if h.count else None,
+                        "p50": h.quantile(0.5),
+                        "p95": h.quantile(0.95),
+                        "p99": h.quantile(0.99),
+                    }
+                    for labels, h in sorted(series.items())
+                ]
+                for name, series in sorted(self._histograms.items())
+            }
+            counters = {
+                name: [{"labels": dict(labels), "value": value} for labels, value in sorted(series.items())]
+                for name, series in sorted(self._counters.items())
+            }
+            gauges = {
+                name: [{"labels": dict(labels), "value": value} for labels, value in sorted(series.items())]
+                for name, series in sorted(self._gauges.items())
+            }
+            recent = list(self._recent)
+        return {"histograms": histograms, "counters": counters, "gauges": gauges, "recent_calls": recent}
+
+
+# 进程内唯一的指标注册表
+metrics = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            body, content_type = metrics.render_text(), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body, content_type = json.dumps(metrics.summary(), ensure_ascii=False, indent=2), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # 抓取请求很频繁，不写访问日志
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """
+    在后台线程启动指标服务：/metrics 为可抓取的文本格式，/metrics.json 为 JSON 摘要。
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        LOG.warning(f"[Metrics] 指标服务启动失败（端口 {port}）: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    LOG.info(f"[Metrics] 指标服务已启动：http://{host}:{port}/metrics , /metrics.json")
+    return server
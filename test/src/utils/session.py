@@ -0,0 +1,18 @@
+import uuid
+
+import gradio as gr
+
+
+def get_user_session(request: gr.Request = None) -> str:
+    """
+    获取当前浏览器会话的唯一标识，用于隔离不同用户的状态与聊天历史。
+    参数:
+        request (gr.Request, optional): Gradio 注入的请求对象
+    返回:
+        str: 会话标识；无法取得时生成一个随机标识
+    """
+    session_hash = getattr(request, "session_hash", None) if request is not None else None
+    return session_hash or uuid.uuid4().hex
+
+
+__all__ = ["get_user_session"]
@@ -0,0 +1,38 @@
+import time
+from contextlib import contextmanager
+
+from utils.logger import LOG
+
+
+class StartupTimer:
+    """
+    记录启动各阶段的耗时，启动完成后输出分阶段报告。
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []  # [(阶段名, 耗时秒数)]
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def report(self) -> str:
+        """
+        输出并返回启动耗时报告。
+        """
+        total = time.perf_counter() - self.started
+        lines = [f"[Startup] 启动完成，总耗时 {total:.3f}s"]
+        for name, elapsed in self.phases:
+            share = elapsed / total * 100 if total > 0 else 0.0
+            lines.append(f"  - {name}: {elapsed:.3f}s ({share:.0f}%)")
+        text = "\n".join(lines)
+        LOG.info(text)
+        return text
+
+
+# 进程内唯一的启动计时器（在 main.py 最先导入，起点接近进程启动时刻）
+startup_timer = StartupTimer()
@@ -0,0 +1,80 @@
+import os
+import time
+
+# 界面刷新的最小间隔（秒），避免每个 token 都推送一次 websocket 消息
+FRAME_INTERVAL = float(os.getenv("TIRO_UI_FRAME_INTERVAL", "0.1"))
+
+
+class TextAccumulator:
+    """
+    以列表累积文本块，只在需要完整文本时拼接一次，避免反复复制长字符串。
+    可选的 sink 会收到每个追加的文本块（如边生成边写入导出文件）。
+    """
+    def __init__(self, text: str = "", sink=None):
+        self._parts = [text] if text else []
+        self._text = text
+        self._dirty = False
+        self._sink = sink
+        if sink is not None and text:
+            sink(text)
+
+    def append(self, delta: str) -> None:
+        if delta:
+            self._parts.append(delta)
+            self._dirty = True
+            if self._sink is not None:
+                self._sink(delta)
+
+    @property
+    def text(self) -> str:
+        if self._dirty:
+            self._text = "".join(self._parts)
+            self._parts = [self._text]
+            self._dirty = False
+        return self._text
+
+
+def stream_frames(deltas, interval: float = FRAME_INTERVAL):
+    """
+    把逐块产出的文本增量合并成按固定频率刷新的界面帧。
+    参数:
+        deltas (Iterable[str]): 文本增量
+        interval (float): 两帧之间的最小间隔（秒）
+    返回:
+        Generator[str]: 截至当前的完整文本；最后一帧一定是完整结果
+    """
+    accumulator = TextAccumulator()
+    last_frame = 0.0
+    pending = True
+    for delta in deltas:
+        accumulator.append(delta)
+        pending = True
+        now = time.monotonic()
+        if now - last_frame >= interval:
+            last_frame = now
+            pending = False
+            yield accumulator.text
+    if pending:
+        yield accumulator.text
+
+
+async def astream_frames(deltas, interval: float = FRAME_INTERVAL):
+    """
+    stream_frames 的异步版本，输入为异步文本增量流。
+    """
+    accumulator = TextAccumulator()
+    last_frame = 0.0
+    pending = True
+    async for delta in deltas:
+        accumulator.append(delta)
+        pending = True
+        now = time.monotonic()
+        if now - last_frame >= interval:
+            last_frame = now
+            pending = False
+            yield accumulator.text
+    if pending:
+        yield accumulator.text
+
+
+__all__ = ["FRAME_INTERVAL", "TextAccumulator", "stream_frames", "astream_frames"]
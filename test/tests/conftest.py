@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# 测试不写日志文件、不预热或预取模型、不落盘缓存；模块按 src 目录下的方式导入（与 main.py 相同）
+os.environ.setdefault("TIRO_LOG_FILE", "")
+os.environ.setdefault("TIRO_WARMUP_ENABLED", "0")
+os.environ.setdefault("TIRO_PREFETCH_ENABLED", "0")
+os.environ.setdefault("TIRO_CACHE_DB", "")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """本地 Ollama 替身；共享的模型注册表与路由临时指向它（提示文件按项目目录的相对路径读取）"""
+    from agents.model_registry import model_registry
+    from agents.model_routing import model_router
+    from fake_ollama import FakeOllamaServer
+
+    server = FakeOllamaServer(port=0, ttft=0, tokens_per_second=0).start()
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(model_registry, "base_url", server.url)
+    monkeypatch.setattr(model_registry, "_models", {})
+    # 替身只列出 qwen3:latest，未安装的小任务模型改用主模型
+    monkeypatch.setattr(model_router, "base_url", server.url)
+    monkeypatch.setattr(model_router, "_missing", None)
+    monkeypatch.setattr(model_router, "_checked_at", None)
+    yield server
+    server.stop()
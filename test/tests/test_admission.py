@@ -0,0 +1,161 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+from agents.admission import BACKGROUND, BULK, INTERACTIVE, AdmissionController
+from agents.cancellation import CancellationRegistry, GenerationCancelled, current_token
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert predicate()
+
+
+def _queue_in_order(controller, requests):
+    """占满唯一的名额后依次排队，释放后按放行顺序返回 (priority, session)"""
+    order = []
+    blocker = threading.Event()
+
+    def hold():
+        with controller.slot(INTERACTIVE, "holder"):
+            blocker.wait()
+
+    threads = [threading.Thread(target=hold)]
+    threads[0].start()
+    _wait_for(lambda: controller.snapshot()[INTERACTIVE]["active"] == 1)
+
+    def run(priority, session):
+        with controller.slot(priority, session):
+            order.append((priority, session))
+
+    for count, (priority, session) in enumerate(requests, 1):
+        thread = threading.Thread(target=run, args=(priority, session))
+        thread.start()
+        threads.append(thread)
+        _wait_for(lambda: sum(item["queued"] for item in controller.snapshot().values()) == count)
+    blocker.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    return order
+
+
+async def iter_async(items):
+    for item in items:
+        yield item
+
+
+def test_higher_priority_is_admitted_first():
+    controller = AdmissionController(limit=1, class_limits={INTERACTIVE: 1, BULK: 1, BACKGROUND: 1})
+    order = _queue_in_order(controller, [(BACKGROUND, "a"), (BULK, "b"), (INTERACTIVE, "c")])
+    assert [priority for priority, _ in order] == [INTERACTIVE, BULK, BACKGROUND]
+
+
+def test_sessions_take_turns_within_a_priority():
+    controller = AdmissionController(limit=1)
+    order = _queue_in_order(controller, [(INTERACTIVE, "a"), (INTERACTIVE, "a"), (INTERACTIVE, "b")])
+    assert [session for _, session in order] == ["a", "b", "a"]
+
+
+def test_nested_call_reuses_an_explicitly_passed_slot():
+    controller = AdmissionController(limit=1, class_limits={INTERACTIVE: 1, BULK: 1, BACKGROUND: 1})
+    with controller.slot(INTERACTIVE, "a") as held:
+        # 名额已满，嵌套调用若重新排队会一直等待
+        with controller.slot(BACKGROUND, "a", held=held) as inner:
+            assert inner is held
+            assert controller.snapshot()[BACKGROUND]["active"] == 0
+    assert controller.snapshot()[INTERACTIVE]["active"] == 0
+
+
+def test_second_call_under_the_same_token_still_queues():
+    # 同一请求（同一取消标记）中的两次调用并非嵌套：第二次不能借用第一次的名额
+    controller = AdmissionController(limit=1)
+    registry = CancellationRegistry()
+    result = {}
+
+    def second():
+        with controller.slot(INTERACTIVE, "a"):
+            result["ran"] = True
+
+    with registry.scope("a", "vocab") as token:
+        with controller.slot(INTERACTIVE, "a"):
+            context = contextvars.copy_context()  # 第二次调用在另一个线程中继承同一取消标记
+            thread = threading.Thread(target=context.run, args=(second,))
+            thread.start()
+            _wait_for(lambda: controller.snapshot()[INTERACTIVE]["queued"] == 1)
+            assert "ran" not in result and current_token() is token
+        thread.join(timeout=5)
+    assert result["ran"] and controller.snapshot()[INTERACTIVE] == {"queued": 0, "active": 0}
+
+
+def test_held_slot_is_passed_across_tasks():
+    controller = AdmissionController(limit=1)
+    registry = CancellationRegistry()
+
+    async def frames():
+        async with controller.aslot(INTERACTIVE, "a") as held:
+            async for _ in controller.aadmitted_stream(iter_async(["x"]), BACKGROUND, "a", held=held):
+                yield "repaired"
+
+    async def main():
+        stream = registry.scoped_stream("a", "vocab", frames())
+        # 界面框架在不同的任务中逐步迭代生成器
+        first = await asyncio.wait_for(asyncio.ensure_future(stream.__anext__()), 2)
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(main()) == "repaired"
+    assert controller.snapshot()[INTERACTIVE]["active"] == 0
+
+
+def test_cancelled_while_queued():
+    controller = AdmissionController(limit=1)
+    registry = CancellationRegistry()
+    result = {}
+
+    def queued():
+        try:
+            with registry.scope("b", "chat") as token:
+                result["token"] = token
+                with controller.slot(INTERACTIVE, "b"):
+                    result["ran"] = True
+        except GenerationCancelled:
+            pass
+
+    with controller.slot(INTERACTIVE, "a"):
+        thread = threading.Thread(target=queued)
+        thread.start()
+        _wait_for(lambda: controller.snapshot()[INTERACTIVE]["queued"] == 1)
+        result["token"].cancel()
+        thread.join(timeout=5)
+        assert controller.snapshot()[INTERACTIVE]["queued"] == 0
+    assert "ran" not in result
+
+
+def test_configure_admits_waiters():
+    controller = AdmissionController(limit=1, class_limits={INTERACTIVE: 1, BULK: 1, BACKGROUND: 1})
+    release = threading.Event()
+
+    def hold(session):
+        with controller.slot(BULK, session):
+            release.wait()
+
+    threads = [threading.Thread(target=hold, args=(session,)) for session in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    _wait_for(lambda: controller.snapshot()[BULK]["queued"] == 1)
+
+    controller.configure(2, {BULK: 2})
+    _wait_for(lambda: controller.snapshot()[BULK]["active"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert controller.class_limits[INTERACTIVE] == 2
+
+
+def test_disabled_controller_does_not_queue():
+    controller = AdmissionController(limit=0)
+    with controller.slot(INTERACTIVE, "a"), controller.slot(INTERACTIVE, "b"):
+        assert controller.snapshot()[INTERACTIVE]["active"] == 0
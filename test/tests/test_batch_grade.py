@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import pytest
+
+from agents.admission import BULK, admission
+from batch_grade import load_finished_ids, run_batch
+
+
+@pytest.fixture
+def essays(tmp_path, monkeypatch):
+    monkeypatch.setattr(admission, "limit", admission.limit)
+    monkeypatch.setattr(admission, "class_limits", dict(admission.class_limits))
+    path = tmp_path / "essays.jsonl"
+    lines = [json.dumps({"id": f"e{i}", "essay": f"My essay number {i}. I like school."}) for i in range(6)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_batch_respects_the_concurrency_limit(fake, essays, tmp_path):
+    fake.ttft = 0.05
+    output = tmp_path / "out.jsonl"
+    stats = asyncio.run(run_batch(str(essays), str(output), "高中", 2))
+    assert stats["done"] == 6 and stats["failed"] == 0
+    assert fake.peak_in_flight == 2
+    assert admission.class_limits[BULK] == 2
+    assert {record["score"] for record in _records(output)} == {82}
+
+
+def test_batch_resumes_without_regrading_finished_essays(fake, essays, tmp_path):
+    output = tmp_path / "out.jsonl"
+    # 上次运行完成了两篇，最后一行写到一半时中断
+    output.write_text(json.dumps({"id": "e0"}) + "\n" + json.dumps({"id": "e1"}) + "\n{\"id\": \"e2",
+                      encoding="utf-8")
+    assert load_finished_ids(str(output)) == {"e0", "e1"}
+
+    stats = asyncio.run(run_batch(str(essays), str(output), "高中", 2))
+    assert stats["skipped"] == 2 and stats["done"] == 4
+    assert fake.requests == 4
+    assert load_finished_ids(str(output)) == {f"e{i}" for i in range(6)}
+
+
+def test_failed_essay_does_not_abort_the_batch(fake, essays, tmp_path):
+    fake.fail_on = "number 3"
+    output = tmp_path / "out.jsonl"
+    stats = asyncio.run(run_batch(str(essays), str(output), "高中", 2))
+    assert stats["failed"] == 1 and stats["done"] == 5
+    assert "e3" not in load_finished_ids(str(output))
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from agents.cancellation import (
+    CancellationRegistry,
+    CancelToken,
+    GenerationCancelled,
+    acancellable_stream,
+    cancellable_stream,
+    current_token,
+)
+
+
+def test_token_runs_callbacks_once():
+    token = CancelToken("t")
+    calls = []
+    token.add_callback(lambda: calls.append("a"))
+    remove = token.add_callback(lambda: calls.append("b"))
+    remove()
+    token.cancel()
+    token.cancel()
+    assert calls == ["a"] and token.cancelled
+    token.add_callback(lambda: calls.append("late"))  # 已取消时立即执行
+    assert calls == ["a", "late"]
+    with pytest.raises(GenerationCancelled):
+        token.raise_if_cancelled()
+
+
+def test_new_request_supersedes_previous():
+    registry = CancellationRegistry()
+    first = registry.start("s", "mode1")
+    second = registry.start("s", "mode1")
+    other = registry.start("s", "topic")
+    assert first.cancelled and not second.cancelled
+    assert registry.cancel("s") == 2
+    assert second.cancelled and other.cancelled
+
+
+def test_scope_sets_current_token_and_swallows_cancel():
+    registry = CancellationRegistry()
+    with registry.scope("s", "chat") as token:
+        assert current_token() is token
+        token.cancel()
+        token.raise_if_cancelled()
+    assert current_token() is None
+
+
+def test_cancellable_stream_stops_and_closes_upstream():
+    closed = []
+
+    def upstream():
+        try:
+            for index in range(10):
+                yield index
+        finally:
+            closed.append(True)
+
+    registry = CancellationRegistry()
+    seen = []
+    with registry.scope("s", "chat") as token:
+        for item in cancellable_stream(upstream()):
+            seen.append(item)
+            if item == 2:
+                token.cancel()
+    assert seen == [0, 1, 2] and closed == [True]
+
+
+def test_async_cancel_interrupts_waiting_for_upstream():
+    registry = CancellationRegistry()
+
+    async def slow():
+        yield "first"
+        await asyncio.sleep(10)
+        yield "never"
+
+    async def frames():
+        async for chunk in acancellable_stream(slow()):
+            yield chunk
+
+    async def main():
+        seen = []
+        started = asyncio.get_running_loop().time()
+        async for frame in registry.scoped_stream("s", "chat", frames()):
+            seen.append(frame)
+            asyncio.get_running_loop().call_later(0.05, registry.cancel, "s", "chat")
+        return seen, asyncio.get_running_loop().time() - started
+
+    seen, elapsed = asyncio.run(main())
+    assert seen == ["first"] and elapsed < 2
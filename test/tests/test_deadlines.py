@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import AIMessageChunk, HumanMessage
+
+from agents.deadlines import (
+    BackendUnavailable,
+    CircuitBreaker,
+    DeadlineExceeded,
+    FAILURE_NOTICES,
+    aguarded_stream,
+    guarded_stream,
+    is_partial,
+    with_failure_notice,
+)
+
+
+class Tracker:
+    def __init__(self):
+        self.error = None
+
+    def finish(self, error=None):
+        self.error = error
+
+
+def _opener(streams):
+    """按模型返回预设的同步流：每项为 (内容, 产出前等待的秒数)"""
+    opened = []
+
+    def open_stream(model):
+        opened.append(model)
+
+        def chunks():
+            for content, delay in streams[model]:
+                time.sleep(delay)
+                yield AIMessageChunk(content=content)
+
+        return chunks(), Tracker()
+
+    return open_stream, opened
+
+
+def test_sync_ttft_falls_back_between_chunks():
+    # 推理模型的思考过程逐块到达但没有正文：超过首 token 时限后改用降级模型
+    open_stream, opened = _opener({"big": [("", 0.05)] * 4 + [("late", 0)], "small": [("ok", 0)]})
+    chunks = list(guarded_stream(open_stream, "big", "small", ttft_timeout=0.1, total_timeout=0))
+    assert opened == ["big", "small"]
+    assert "".join(chunk.content for chunk in chunks) == "ok"
+
+
+def test_sync_total_timeout_returns_partial():
+    open_stream, _ = _opener({"big": [("a", 0), ("b", 0.1), ("c", 0)]})
+    chunks = list(guarded_stream(open_stream, "big", None, ttft_timeout=0, total_timeout=0.05))
+    assert [chunk.content for chunk in chunks[:2]] == ["a", "b"]
+    assert is_partial(chunks[-1])
+
+
+def test_sync_ttft_without_fallback_raises():
+    open_stream, _ = _opener({"big": [("", 0.1), ("late", 0)]})
+    with pytest.raises(DeadlineExceeded):
+        list(guarded_stream(open_stream, "big", "big", ttft_timeout=0.05, total_timeout=0))
+
+
+def test_async_ttft_falls_back():
+    def open_stream(model):
+        async def chunks():
+            await asyncio.sleep(1 if model == "big" else 0)
+            yield AIMessageChunk(content=model)
+
+        return chunks(), Tracker()
+
+    async def collect():
+        return [chunk.content async for chunk in aguarded_stream(open_stream, "big", "small", 0.05, 0)]
+
+    assert asyncio.run(collect()) == ["small"]
+
+
+def test_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    breaker.record_failure("m")
+    assert breaker.allow("m")
+    breaker.record_failure("m")
+    assert not breaker.allow("m")
+    time.sleep(0.06)
+    assert breaker.allow("m")  # 冷却期过后放行一次试探
+    assert not breaker.allow("m")
+    breaker.record_success("m")
+    assert not breaker.is_open("m")
+
+
+def test_failure_notice_is_appended_to_frames():
+    async def frames(error):
+        yield "partial"
+        raise error
+
+    async def collect(error):
+        return [frame async for frame in with_failure_notice(frames(error))]
+
+    assert asyncio.run(collect(DeadlineExceeded("ttft", "m", 1))) == [
+        "partial", "partial\n\n" + FAILURE_NOTICES["deadline"]
+    ]
+    assert asyncio.run(collect(BackendUnavailable("m")))[-1].endswith(FAILURE_NOTICES["unavailable"])
+
+
+def test_fallback_equal_to_the_model_is_not_retried():
+    open_stream, opened = _opener({"qwen3": [("", 0.1), ("late", 0)], "qwen3:latest": [("ok", 0)]})
+    with pytest.raises(DeadlineExceeded):
+        list(guarded_stream(open_stream, "qwen3", "qwen3:latest", ttft_timeout=0.05, total_timeout=0))
+    assert opened == ["qwen3"]  # 未写标签即 :latest，同一模型不重试
+
+
+def _probe_route(monkeypatch, fallback):
+    from agents import deadlines
+    from agents.model_routing import model_router
+
+    route = {"model": "slow:7b", "fallback": fallback, "ttft_timeout": 0.3, "timeout": 10}
+    monkeypatch.setitem(model_router.routes, "probe", route)
+    monkeypatch.setattr(deadlines, "circuit_breaker", CircuitBreaker())  # 失败不计入共享的熔断状态
+
+
+def _frames(agent):
+    async def frames():
+        text = ""
+        async for delta in agent.astream_deltas([HumanMessage(content="只返回题目文本")], None, "probe"):
+            text += delta
+            yield text
+
+    async def collect():
+        return [frame async for frame in with_failure_notice(frames())]
+
+    return asyncio.run(collect())
+
+
+def test_slow_model_falls_back_to_a_different_model(fake, monkeypatch):
+    from agents.writing_agent import WritingAgent
+
+    fake.model_ttft["slow:7b"] = 2
+    _probe_route(monkeypatch, "qwen3:latest")
+    started = time.monotonic()
+    frames = _frames(WritingAgent())
+    assert frames[-1] == "My Most Memorable Journey"
+    assert fake.models_seen == ["slow:7b", "qwen3:latest"]
+    assert time.monotonic() - started < 1.5  # 首 token 超时即中止慢模型，不等它生成完
+
+
+def test_same_model_fallback_goes_straight_to_the_notice(fake, monkeypatch):
+    from agents.writing_agent import WritingAgent
+
+    fake.model_ttft["slow:7b"] = 2
+    _probe_route(monkeypatch, "slow:7b")
+    assert _frames(WritingAgent()) == [FAILURE_NOTICES["deadline"]]
+    assert fake.models_seen == ["slow:7b"]
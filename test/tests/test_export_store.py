@@ -0,0 +1,82 @@
+import asyncio
+import gzip
+import os
+import time
+
+from utils.export_store import DOWNLOAD_SUFFIX, EXPORT_SUFFIX, ExportStore
+
+
+def _stored(store):
+    return sorted(name for name in os.listdir(store.root) if name.endswith(EXPORT_SUFFIX))
+
+
+def test_reports_are_stored_once_per_content(tmp_path):
+    store = ExportStore(root=str(tmp_path))
+    writer = store.open_report()
+    for part in ("## 题目\n", "正文", "\n"):
+        writer.write(part)
+    first = writer.finish()
+    second = store.save("## 题目\n正文\n")
+
+    assert first == second and first.endswith(DOWNLOAD_SUFFIX)
+    with open(first, encoding="utf-8") as file:
+        assert file.read() == "## 题目\n正文\n"  # 下载的是解压后的文本
+    [stored] = _stored(store)
+    with gzip.open(os.path.join(store.root, stored), "rt", encoding="utf-8") as file:
+        assert file.read() == "## 题目\n正文\n"
+    assert os.listdir(store.partial_dir) == []
+    assert store.save("另一份报告") != first and len(_stored(store)) == 2
+
+
+def test_discard_removes_the_partial_report(tmp_path):
+    store = ExportStore(root=str(tmp_path))
+
+    async def interrupted():
+        writer = store.open_report()
+        writer.write("写到一半")
+        await writer.adiscard()
+        await writer.adiscard()  # 重复放弃无副作用
+        return await writer.afinish()  # 放弃后不再生成文件
+
+    assert asyncio.run(interrupted()) is None
+    assert os.listdir(store.partial_dir) == [] and _stored(store) == []
+
+
+def _age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_sweep_applies_age_and_size_limits(tmp_path):
+    store = ExportStore(root=str(tmp_path), max_age=100, max_bytes=0, download_max_age=10)
+    old, recent, newest = (store.save(f"报告 {i} " * 50) for i in range(3))
+    stored = {path: os.path.join(store.root, os.path.basename(path)[:-len(DOWNLOAD_SUFFIX)] + EXPORT_SUFFIX)
+              for path in (old, recent, newest)}
+    _age(stored[old], 200)
+    _age(old, 20)
+    _age(stored[recent], 50)
+    leftover = os.path.join(store.partial_dir, "stale" + EXPORT_SUFFIX)
+    with open(leftover, "wb"):
+        pass
+    _age(leftover, 200)
+    store.max_bytes = os.path.getsize(stored[newest])
+
+    # 过期的压缩文件、遗留的半成品与过期的下载副本各删一个，之后超出总大小的最旧文件再删一个
+    assert store.sweep() == 4
+    assert _stored(store) == [os.path.basename(stored[newest])]
+    assert not os.path.exists(leftover) and not os.path.exists(old)
+    assert os.path.exists(recent) and os.path.exists(newest)  # 下载副本只按自己的保留期清理
+
+
+def test_refinement_report_is_offered_as_text(fake, tmp_path, monkeypatch):
+    from tabs import writing_tab
+
+    monkeypatch.setattr(writing_tab, "export_store", ExportStore(root=str(tmp_path)))
+
+    async def frames():
+        return [frame async for frame in writing_tab.mode2_process("My Hometown", "高中", 1, "export-e2e")]
+
+    text, path = asyncio.run(frames())[-1]
+    assert os.path.basename(path).startswith("tiro-report-") and path.endswith(DOWNLOAD_SUFFIX)
+    with open(path, encoding="utf-8") as file:
+        assert file.read() == text
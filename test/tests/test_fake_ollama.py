@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from langchain_core.messages import HumanMessage
+
+from agents.cancellation import CancellationRegistry
+from agents.refinement import parse_score
+from agents.session_history import get_session_history
+from fake_ollama import canned_reply
+
+
+def test_writing_agent_streams_and_records_history(fake):
+    from agents.writing_agent import WritingAgent
+
+    agent = WritingAgent(session_id="writing:e2e")
+    text = agent.stream_response_text([HumanMessage(content="请写一篇作文")], "writing:e2e")
+    assert text == canned_reply("请写一篇作文")
+    assert fake.last_request["options"]["num_predict"] == 2048  # essay 路由的生成上限随调用发送
+    assert [m.content for m in get_session_history("writing:e2e").messages] == ["请写一篇作文", text]
+
+
+def test_reflection_score_round_trip(fake):
+    from agents.refinement import build_reflection_prompt
+    from agents.reflection_agent import ReflectionAgent
+
+    agent = ReflectionAgent(session_id="reflection:e2e")
+    prompt = build_reflection_prompt("My essay.", "高中")
+    reflection = asyncio.run(agent.agenerate_text([HumanMessage(content=prompt)]))
+    assert parse_score(reflection) == 82
+
+
+def test_cancel_aborts_the_upstream_request(fake):
+    from agents.conversation_agent import ConversationAgent
+
+    fake.tokens_per_second = 20
+    agent = ConversationAgent(session_id="conversation:e2e")
+    registry = CancellationRegistry()
+
+    async def frames():
+        async for delta in agent.astream_deltas([HumanMessage(content="hi")], "conversation:e2e"):
+            yield delta
+
+    async def main():
+        seen = []
+        async for delta in registry.scoped_stream("e2e", "chat", frames()):
+            seen.append(delta)
+            if len(seen) == 3:
+                registry.cancel("e2e", "chat")
+        return seen
+
+    seen = asyncio.run(main())
+    assert 3 <= len(seen) < len(canned_reply("hi").split())
+    deadline = time.monotonic() + 5
+    while not fake.aborted and time.monotonic() < deadline:  # 替身在下一次写入时发现连接已断开
+        time.sleep(0.05)
+    assert fake.aborted == 1
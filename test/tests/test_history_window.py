@@ -0,0 +1,92 @@
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from agents.history_window import HistoryWindow, estimate_tokens
+from agents.session_history import CompactChatMessageHistory
+
+
+def _history(turns: int, text: str = "word " * 20) -> CompactChatMessageHistory:
+    history = CompactChatMessageHistory("s1")
+    for index in range(turns):
+        history.add_messages([HumanMessage(content=f"{index} {text}"), AIMessage(content=f"{index} {text}")])
+    return history
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("你好世界") == 4 + 4
+    assert estimate_tokens("abcdefgh") == 2 + 4
+
+
+def test_window_keeps_recent_records_within_budget():
+    history = _history(10)
+    window = HistoryWindow(token_budget=100)
+    messages = window.build_messages(history)
+    assert 0 < len(messages) < 20
+    assert messages[-1].content == history.records[-1].content
+    assert sum(estimate_tokens(m.content) for m in messages) <= 100
+
+
+def test_window_always_keeps_latest_message():
+    history = _history(1, text="word " * 500)
+    assert len(HistoryWindow(token_budget=10).build_messages(history)) == 1
+
+
+def test_window_prepends_summary_and_skips_summarized():
+    history = _history(3)
+    history.summary = "earlier"
+    history.summarized_upto = 4
+    messages = HistoryWindow(token_budget=10_000).build_messages(history)
+    assert isinstance(messages[0], SystemMessage) and "earlier" in messages[0].content
+    assert [m.content for m in messages[1:]] == [r.content for r in history.records[4:]]
+
+
+def test_summarize_runs_in_background():
+    prompts = []
+
+    def summarizer(prompt, session_id):
+        prompts.append((session_id, prompt))
+        return "summary"
+
+    history = _history(10)
+    window = HistoryWindow(token_budget=100, summarizer=summarizer)
+    window.maybe_summarize(history)
+    deadline = time.monotonic() + 5
+    while not history.summarized_upto and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert history.summary == "summary"
+    assert 0 < history.summarized_upto < len(history.records)
+    assert prompts[0][0] == "s1" and "0 word" in prompts[0][1]
+
+
+def test_failed_summary_leaves_history_unsummarized():
+    history = _history(10)
+    window = HistoryWindow(token_budget=100, summarizer=lambda prompt, session_id: "")
+    window.maybe_summarize(history)
+    deadline = time.monotonic() + 5
+    while window._pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert history.summary == "" and history.summarized_upto == 0
+
+
+def test_window_loads_persisted_history(tmp_path):
+    from agents.sqlite_history import SQLiteSessionStore
+
+    store = SQLiteSessionStore(db_path=str(tmp_path / "history.sqlite3"))
+    store.get("s1").add_messages([HumanMessage(content="q"), AIMessage(content="a")])
+    store.pop("s1")
+
+    # 重新加载的会话第一次被访问就是构建提示，此时也应先从磁盘加载
+    messages = HistoryWindow(token_budget=1000).wrap(store.get("s1")).messages
+    assert [m.content for m in messages] == ["q", "a"]
+
+
+def test_agent_summary_goes_through_the_summary_route(fake):
+    from agents.conversation_agent import ConversationAgent
+
+    agent = ConversationAgent(session_id="conversation:summary")
+    summary = agent.summarize("请把下面的对话压缩成一段简洁的摘要", "conversation:summary")
+    assert summary
+    request = fake.last_request
+    assert request["options"]["num_predict"] == 512  # summary 路由的生成上限
+    assert [m["role"] for m in request["messages"]] == ["user"]  # 不带 Agent 的系统提示
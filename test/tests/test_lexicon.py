@@ -0,0 +1,26 @@
+from agents.lexicon import Lexicon, write_lexicon
+
+ENTRIES = [
+    {"word": f"w{level}{band}{i}", "ipa": "/w/", "pos": "n.", "meaning": "词", "level": level, "band": str(band)}
+    for level in ("初中", "大学") for band in (1, 2, 3) for i in range(4)
+]
+
+
+def test_sample_filters_by_level_and_band(tmp_path):
+    db_path = str(tmp_path / "lexicon.sqlite3")
+    assert write_lexicon(ENTRIES, db_path) == len(ENTRIES)
+    lexicon = Lexicon(db_path)
+
+    entries = lexicon.sample(10, level="初中", max_band=2)
+    assert len(entries) == 8
+    assert all(e["word"].startswith(("w初中1", "w初中2")) for e in entries)
+    assert len(lexicon.sample(30)) == len(ENTRIES)
+
+
+def test_sample_excludes_previous_words(tmp_path):
+    db_path = str(tmp_path / "lexicon.sqlite3")
+    write_lexicon(ENTRIES, db_path)
+    lexicon = Lexicon(db_path)
+    previous = [e["word"] for e in lexicon.sample(2, level="大学", max_band=1)]
+    entries = lexicon.sample(2, level="大学", max_band=1, exclude=previous)
+    assert len(entries) == 2 and not set(previous) & {e["word"] for e in entries}
@@ -0,0 +1,51 @@
+import io
+import json
+
+import utils.logger as logger_module
+from utils.logger import LOG, parse_module_levels, truncate_message
+
+
+def test_module_levels_are_parsed_per_prefix():
+    levels = parse_module_levels(" agents.call_metrics=debug, agents.prefetch=WARNING,broken,=INFO", "INFO")
+    assert levels == {"": "INFO", "agents.call_metrics": "DEBUG", "agents.prefetch": "WARNING"}
+
+
+def test_longest_matching_prefix_decides(monkeypatch):
+    monkeypatch.setattr(logger_module, "module_levels", {"": "INFO", "agents": "WARNING", "agents.prefetch": "DEBUG"})
+
+    def enabled(name, level):
+        return logger_module._enabled({"name": name, "level": LOG.level(level)})
+
+    assert enabled("agents.prefetch", "DEBUG")
+    assert not enabled("agents.prefetcher", "INFO")  # 只按完整的模块名前缀匹配
+    assert not enabled("agents.admission", "INFO")
+    assert enabled("tabs.vocab_tab", "INFO") and not enabled("tabs.vocab_tab", "DEBUG")
+
+
+def test_long_messages_keep_head_and_tail(monkeypatch):
+    monkeypatch.setattr(logger_module, "LOG_MAX_CHARS", 30)
+    record = {"message": "a" * 50 + "b" * 50}
+    truncate_message(record)
+    assert record["message"] == "a" * 20 + " …[省略 70 字符]… " + "b" * 10
+
+    short = {"message": "short"}
+    truncate_message(short)
+    assert short["message"] == "short"
+
+    monkeypatch.setattr(logger_module, "LOG_MAX_CHARS", 0)
+    record = {"message": "x" * 5000}
+    truncate_message(record)
+    assert len(record["message"]) == 5000
+
+
+def test_json_lines_carry_the_truncated_message(monkeypatch):
+    monkeypatch.setattr(logger_module, "LOG_MAX_CHARS", 30)
+    stream = io.StringIO()
+    sink = LOG.add(stream, level="INFO", serialize=True, filter=lambda record: record["extra"].get("json_test"))
+    try:
+        LOG.bind(json_test=True).info("[Test] " + "x" * 100)
+    finally:
+        LOG.remove(sink)
+    line = json.loads(stream.getvalue().strip())
+    assert line["record"]["level"]["name"] == "INFO"
+    assert line["record"]["message"].startswith("[Test] ") and "省略 77 字符" in line["record"]["message"]
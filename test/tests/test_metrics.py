@@ -0,0 +1,91 @@
+import json
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+from langchain_core.messages import HumanMessage
+
+from agents.admission import INTERACTIVE, admission
+from fake_ollama import canned_reply, split_tokens
+from utils.metrics import Histogram, MetricsRegistry, _MetricsHandler, metrics
+
+
+def _series(summary, name, labels):
+    return next((item for item in summary["histograms"].get(name, []) if item["labels"] == labels), {"count": 0})
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = Histogram((1, 2, 4))
+    for value in (0.5, 1.5, 1.5, 3):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 0]
+    assert histogram.quantile(0.5) == 1.5
+    assert Histogram((1,)).quantile(0.5) is None
+
+
+def test_render_text_uses_cumulative_buckets():
+    registry = MetricsRegistry()
+    registry.histogram("x_seconds", (1, 2), "demo")
+    registry.observe("x_seconds", 0.5, agent='a"b')
+    registry.observe("x_seconds", 5, agent='a"b')
+    registry.inc("x_total", status="ok")
+    registry.set_gauge("x_queued", 3, priority="bulk")
+    text = registry.render_text()
+    assert "# HELP x_seconds demo\n# TYPE x_seconds histogram" in text
+    assert "x_seconds_bucket{agent=\"a'b\",le=\"1\"} 1" in text
+    assert "x_seconds_bucket{agent=\"a'b\",le=\"2\"} 1" in text
+    assert "x_seconds_bucket{agent=\"a'b\",le=\"+Inf\"} 2" in text
+    assert 'x_total{status="ok"} 1' in text and 'x_queued{priority="bulk"} 3' in text
+
+
+def test_one_call_is_exported_with_wait_ttft_and_tokens(fake, monkeypatch):
+    from agents.writing_agent import WritingAgent
+
+    fake.ttft = 0.1
+    monkeypatch.setattr(admission, "limit", admission.limit)
+    monkeypatch.setattr(admission, "class_limits", dict(admission.class_limits))
+    admission.configure(1)
+    labels = {"agent": "writing", "model": "qwen3:latest", "kind": "stream"}
+    before = metrics.summary()
+
+    # 占住唯一的名额，使本次调用先排队约 0.2 秒
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        with admission.slot(INTERACTIVE, "other"):
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    threading.Timer(0.2, release.set).start()
+    agent = WritingAgent(session_id="writing:metrics")
+    prompt = "请写一篇作文"
+    agent.stream_response_text([HumanMessage(content=prompt)], "writing:metrics")
+    thread.join()
+
+    summary = metrics.summary()
+    record = [call for call in summary["recent_calls"] if call["session"] == "writing:metrics"][-1]
+    assert record["status"] == "ok" and record["kind"] == "stream"
+    assert record["queue_wait"] >= 0.15
+    assert record["ttft"] >= 0.1
+    # 用量取自 Ollama 返回的计数，而不是按文本估算
+    assert not record["tokens_estimated"]
+    assert record["completion_tokens"] == len(split_tokens(canned_reply(prompt)))
+    assert record["prompt_tokens"] > 0
+    for name in ("tiro_llm_queue_wait_seconds", "tiro_llm_ttft_seconds", "tiro_llm_completion_tokens"):
+        assert _series(summary, name, labels)["count"] == _series(before, name, labels)["count"] + 1
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        text = urllib.request.urlopen(url + "/metrics").read().decode("utf-8")
+        exported = json.loads(urllib.request.urlopen(url + "/metrics.json").read())
+    finally:
+        server.shutdown()
+    label_text = 'agent="writing",kind="stream",model="qwen3:latest"'
+    assert f'tiro_llm_ttft_seconds_bucket{{{label_text},le="0.05"}}' in text
+    assert f'tiro_llm_calls_total{{{label_text},status="ok"}}' in text
+    assert exported["recent_calls"][-1]["session"] == "writing:metrics"
@@ -0,0 +1,50 @@
+import time
+
+import httpx
+
+import agents.model_lifecycle as lifecycle_module
+from agents.model_lifecycle import ModelLifecycle
+from agents.model_routing import MIN_NUM_CTX
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert predicate()
+
+
+def test_preload_payload_loads_with_the_request_context(monkeypatch):
+    lifecycle = ModelLifecycle(models=[], enabled=False)
+    payload = lifecycle.preload_payload("qwen3:latest")
+    assert payload["model"] == "qwen3:latest" and payload["keep_alive"] == lifecycle_module.KEEP_ALIVE
+    assert "prompt" not in payload  # 不带提示，只加载模型
+
+    monkeypatch.setattr(lifecycle_module, "DYNAMIC_NUM_CTX", True)
+    assert lifecycle.preload_payload("qwen3:latest")["options"] == {"num_ctx": MIN_NUM_CTX}
+
+
+def test_refresh_reads_loaded_models_from_ps(fake):
+    lifecycle = ModelLifecycle(base_url=fake.url, models=["qwen3", "other"], enabled=False)
+    with httpx.Client(base_url=fake.url) as client:
+        assert lifecycle.preload(client, "other")
+        lifecycle.refresh(client)
+    status = lifecycle.status()
+    # 未写标签的模型名在 /api/ps 中显示为 :latest
+    assert status["qwen3"]["warm"] and status["qwen3"]["expires_at"].startswith("2099")
+    assert not status["other"]["warm"] and status["other"]["loaded_at"]
+
+
+def test_only_keep_warm_models_are_reloaded_when_idle(fake, monkeypatch):
+    monkeypatch.setattr(lifecycle_module, "CHECK_INTERVAL", 0.02)
+    monkeypatch.setattr(lifecycle_module.activity, "is_idle", lambda: True)
+    # 两个模型都不在 /api/ps 中，即预热后又被 Ollama 卸载
+    lifecycle = ModelLifecycle(base_url=fake.url, models=["pinned", "extra"], enabled=True, keep_warm=["pinned"])
+    lifecycle.start()
+    try:
+        _wait_for(lambda: all(state["loaded_at"] for state in lifecycle.status().values()))
+        first = lifecycle.status()
+        _wait_for(lambda: lifecycle.status()["pinned"]["loaded_at"] > first["pinned"]["loaded_at"])
+        assert lifecycle.status()["extra"]["loaded_at"] == first["extra"]["loaded_at"]
+    finally:
+        lifecycle.stop()
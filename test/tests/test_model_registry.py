@@ -0,0 +1,13 @@
+from agents.model_registry import ModelRegistry
+
+
+def test_one_client_per_model_with_per_call_options():
+    registry = ModelRegistry("http://127.0.0.1:1")
+    short = registry.get_chat_model("qwen3", num_predict=64, num_ctx=4096)
+    long = registry.get_chat_model("qwen3", num_predict=2048, num_ctx=8192)
+    assert short.bound is long.bound is registry.client_for("qwen3")
+    assert registry.client_for("other") is not registry.client_for("qwen3")
+
+    assert short.kwargs["options"]["num_predict"] == 64
+    assert long.kwargs["options"] == {"num_predict": 2048, "num_ctx": 8192, "temperature": 0.8}
+    assert "keep_alive" in long.kwargs and "keep_alive" not in long.kwargs["options"]
@@ -0,0 +1,69 @@
+from agents import model_routing
+from agents.admission import BACKGROUND, BULK, INTERACTIVE
+from agents.model_routing import ModelRouter, parse_num_ctx
+
+ROUTES = {
+    "default": {"model": "big", "num_predict": 1000, "priority": INTERACTIVE, "fallback": "small", "timeout": 60},
+    "topic": {"model": "small", "num_predict": 64},
+    "essay": {"priority": BULK},
+    "writing.summary": {"priority": BACKGROUND},
+}
+
+
+def test_parse_num_ctx():
+    assert parse_num_ctx("8192") == {"": 8192}
+    assert parse_num_ctx("qwen3:latest=16384, qwen3:1.7b=4096") == {"qwen3:latest": 16384, "qwen3:1.7b": 4096}
+    assert parse_num_ctx("") == {}
+    assert parse_num_ctx("oops") == {}
+
+
+def test_resolve_merges_default_task_and_agent_task():
+    router = ModelRouter(ROUTES)
+    assert router.resolve("writing", "topic")["model"] == "small"
+    assert router.resolve("writing", "topic")["num_predict"] == 64
+    assert router.priority_for("writing", "essay") == BULK
+    assert router.priority_for("writing", "summary") == BACKGROUND
+    assert router.priority_for("vocab", "summary") == INTERACTIVE
+
+
+def test_settings_drop_policy_keys_and_use_fixed_num_ctx(monkeypatch):
+    monkeypatch.setattr(model_routing, "DYNAMIC_NUM_CTX", False)
+    monkeypatch.setattr(model_routing, "MODEL_NUM_CTX", {"": 8192, "small": 4096})
+    router = ModelRouter(ROUTES)
+
+    model, settings = router.settings_for("writing", "chat", prompt_tokens=20000)
+    assert model == "big"
+    assert settings == {"num_predict": 1000, "num_ctx": 8192}  # 提示长度不影响 num_ctx，模型不会被重新加载
+
+    model, settings = router.settings_for("writing", "chat", model="small")  # 降级时按降级模型的 num_ctx
+    assert (model, settings["num_ctx"]) == ("small", 4096)
+
+
+def test_dynamic_num_ctx_is_opt_in(monkeypatch):
+    monkeypatch.setattr(model_routing, "MODEL_NUM_CTX", {})
+    router = ModelRouter(ROUTES)
+    assert "num_ctx" not in router.settings_for("writing", "chat", prompt_tokens=20000)[1]
+
+    monkeypatch.setattr(model_routing, "DYNAMIC_NUM_CTX", True)
+    monkeypatch.setattr(model_routing, "MIN_NUM_CTX", 4096)
+    monkeypatch.setattr(model_routing, "MAX_NUM_CTX", 32768)
+    assert router.settings_for("writing", "chat", prompt_tokens=100)[1]["num_ctx"] == 4096
+    assert router.settings_for("writing", "chat", prompt_tokens=5000)[1]["num_ctx"] == 8192
+    assert router.settings_for("writing", "chat", prompt_tokens=10 ** 6)[1]["num_ctx"] == 32768
+
+
+def test_missing_optional_model_degrades_to_the_default(fake):
+    # 替身的 /api/tags 只列出 qwen3:latest
+    router = ModelRouter(dict(ROUTES, default=dict(ROUTES["default"], model=model_routing.DEFAULT_MODEL)),
+                         optional_models=["small", "qwen3"], base_url=fake.url)
+    route = router.resolve("writing", "topic")
+    assert route["model"] == model_routing.DEFAULT_MODEL
+    assert router.resolve("writing", "chat")["fallback"] == model_routing.DEFAULT_MODEL  # 与所用模型相同，不降级
+    assert router.missing_models() == {"small"}  # 未写标签的 qwen3 即 qwen3:latest
+
+
+def test_unreachable_ollama_keeps_the_configured_models(monkeypatch):
+    monkeypatch.setattr(model_routing, "TAGS_TIMEOUT", 0.2)
+    router = ModelRouter(ROUTES, optional_models=["small"], base_url="http://127.0.0.1:9")
+    assert router.resolve("writing", "topic")["model"] == "small"
+    assert router._missing is None  # 稍后重试
@@ -0,0 +1,87 @@
+import time
+
+from agents.prefetch import ActivityMonitor, Prefetcher, PrefetchPool
+from agents.session_history import get_session_history
+
+
+def _pool(depth=2, max_age=3600):
+    produced = []
+
+    def producer(key):
+        produced.append(key)
+        return f"{key}-{len(produced)}"
+
+    return PrefetchPool("test", producer, ["a", "b"], depth=depth, max_age=max_age), produced
+
+
+def test_pool_refills_the_emptiest_key_up_to_depth():
+    pool, produced = _pool(depth=2)
+    while (key := pool.next_key_to_fill()) is not None:
+        pool.fill(key)
+    assert sorted(produced) == ["a", "a", "b", "b"]
+    assert pool.take("a") == "a-1"
+    assert pool.next_key_to_fill() == "a"  # 取走后优先补充该键
+
+
+def test_empty_or_stale_pool_returns_none():
+    pool, _ = _pool(max_age=0.01)
+    assert pool.take("a") is None
+    pool.fill("a")
+    time.sleep(0.02)
+    assert pool.take("a") is None
+
+
+def test_prefetcher_fills_only_when_idle(monkeypatch):
+    import agents.prefetch as prefetch
+
+    monitor = ActivityMonitor()
+    monkeypatch.setattr(prefetch, "activity", monitor)
+    monkeypatch.setattr(prefetch, "POLL_INTERVAL", 0.01)
+    pool, produced = _pool(depth=1)
+    prefetcher = Prefetcher(enabled=True)
+    prefetcher.register(pool)
+    with monitor.track():
+        prefetcher.start()
+        time.sleep(0.05)
+        assert produced == []  # 前台请求进行中不预取
+    monkeypatch.setattr(prefetch, "IDLE_GRACE", 0)
+    deadline = time.monotonic() + 5
+    while len(produced) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    prefetcher.stop()
+    assert sorted(produced) == ["a", "b"]
+
+
+def test_prefetched_set_is_recorded_in_the_taking_session(fake):
+    from agents.vocab_agent import VocabAgent
+
+    agent = VocabAgent()
+    agent.use_lexicon = False
+    agent.prefetch_pool = PrefetchPool("vocabulary", agent.produce_vocabulary, [5], depth=1)
+    agent.prefetch_pool.fill(5)
+    requests = fake.requests
+
+    first, second = agent.new_session("u1"), agent.new_session("u2")
+    text = agent.generate_vocabulary(first, 5)
+    assert fake.requests == requests  # 命中预取，不再请求模型
+    assert len(first.current_words) == 5 and text.count(" - ") >= 5
+    assert get_session_history(first.session_id).messages[-1].content == text
+    assert get_session_history(second.session_id).messages == []
+
+    # 池已空：退回模型生成
+    agent.generate_vocabulary(second, 5)
+    assert fake.requests > requests and len(second.current_words) == 5
+
+
+def test_lexicon_sets_are_prefetched_with_examples(fake):
+    from agents.vocab_agent import VocabAgent
+
+    agent = VocabAgent()
+    agent.use_lexicon = True
+    text = agent.produce_vocabulary(3)
+    assert text.count(" - ") >= 3 and "例句：" in text and text.count("  · ") == 3
+    assert "中文翻译" in fake.last_request["messages"][-1]["content"]
+
+    state = agent.new_session("u3")
+    state.level = "高中"
+    assert not agent.prefetchable(state)  # 限定难度时不使用预取的单词组
@@ -0,0 +1,35 @@
+from langchain_core.messages import AIMessageChunk
+
+from agents.reasoning import ThinkFilter, create_think_filter, strip_think
+
+
+def _feed_all(parts):
+    think_filter = ThinkFilter()
+    return "".join(think_filter.feed(part) for part in parts) + think_filter.flush()
+
+
+def test_filter_handles_tags_split_across_chunks():
+    parts = ["<thi", "nk>plan", "ning</th", "ink>\n\n", "Hello", " <", "world>"]
+    assert _feed_all(parts) == "Hello <world>"
+
+
+def test_filter_character_by_character():
+    text = "前言<think>推理</think>  正文<think>再想想</think>结尾"
+    assert _feed_all(list(text)) == "前言正文结尾"
+
+
+def test_unclosed_think_is_dropped():
+    assert _feed_all(["answer<think>never closed"]) == "answer"
+    assert strip_think("<think>x</think> summary") == "summary"
+
+
+def test_runnable_filter_keeps_usage_metadata():
+    usage = {"input_tokens": 3, "output_tokens": 5, "total_tokens": 8}
+    chunks = [
+        AIMessageChunk(content="<think>hidden</think>"),
+        AIMessageChunk(content="shown"),
+        AIMessageChunk(content="", usage_metadata=usage),
+    ]
+    out = list(create_think_filter().transform(iter(chunks)))
+    assert "".join(chunk.content for chunk in out) == "shown"
+    assert out[-1].usage_metadata == usage
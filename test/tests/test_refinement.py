@@ -0,0 +1,52 @@
+from agents.cancellation import CancellationRegistry
+from agents.refinement import RefinementStopper, build_reflection_prompt, parse_score
+
+
+def test_parse_score_prefers_machine_readable_line():
+    assert parse_score("总分：75\n...\nSCORE: 82") == 82
+    assert parse_score("score：90") == 90
+    assert parse_score("内容 26/30，总分 **78**") == 78
+    assert parse_score("SCORE: 120") is None
+    assert parse_score("没有评分") is None
+    assert parse_score(None) is None
+
+
+def test_prompt_asks_for_score_line():
+    assert "SCORE:" in build_reflection_prompt("essay", "高中")
+
+
+def test_stops_when_target_reached():
+    stopper = RefinementStopper(5, target_score=90, min_gain=2)
+    assert not stopper.should_stop(80)
+    assert stopper.should_stop(91)
+    assert "已达到目标" in stopper.reason
+
+
+def test_stops_when_score_stalls_and_ignores_unparsed_rounds():
+    stopper = RefinementStopper(5, target_score=95, min_gain=2)
+    assert not stopper.should_stop(None)
+    assert not stopper.should_stop(80)
+    assert not stopper.should_stop(85)
+    assert stopper.should_stop(86)
+    summary = stopper.summary()
+    assert "实际 4 / 计划 5 轮" in summary and "? → 80 → 85 → 86" in summary and "提前结束" in summary
+
+
+def test_summary_records_round_durations():
+    stopper = RefinementStopper(2)
+    for score in (60, 70):
+        stopper.begin_round()
+        stopper.should_stop(score)
+    summary = stopper.summary()
+    assert len(stopper.round_durations) == 2 and "各轮耗时" in summary
+    assert "提前结束" not in summary
+
+
+def test_begin_round_stops_after_cancel():
+    stopper = RefinementStopper(3)
+    rounds = []
+    with CancellationRegistry().scope("s", "mode1") as token:  # 取消范围吞掉 GenerationCancelled
+        token.cancel()
+        stopper.begin_round()
+        rounds.append(1)
+    assert rounds == [] and stopper.rounds_run == 0
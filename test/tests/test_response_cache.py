@@ -0,0 +1,55 @@
+import sqlite3
+
+from langchain_core.messages import HumanMessage
+
+from agents.response_cache import ResponseCache, cache_scope, make_cache_key
+
+
+def _key(scope=None):
+    return make_cache_key("writing", "system", "qwen3", {"num_predict": 64}, [HumanMessage(content="topic")], scope)
+
+
+def test_random_tasks_are_scoped_per_session():
+    assert cache_scope("topic", "writing:a") == "writing:a"
+    assert cache_scope("vocabulary", "vocab:a") == "vocab:a"
+    assert cache_scope("suggestion", "reflection:a") is None
+    assert _key(cache_scope("topic", "writing:a")) != _key(cache_scope("topic", "writing:b"))
+    assert _key(cache_scope("suggestion", "writing:a")) == _key(cache_scope("suggestion", "writing:b"))
+
+
+def test_memory_cache_expires():
+    cache = ResponseCache(db_path="", ttl=60, session_ttl=0)
+    cache.set("shared", "value")
+    cache.set("scoped", "value", scoped=True)
+    assert cache.get("shared") == "value"
+    assert cache.get("scoped") is None
+
+
+def test_disk_writes_happen_in_background(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(db_path=db_path, ttl=60)
+    cache.complete("shared", "kept")
+    cache.complete("scoped", "memory only", scoped=True)
+    cache.flush()
+
+    rows = sqlite3.connect(db_path).execute("SELECT key, value FROM responses").fetchall()
+    assert rows == [("shared", "kept")]
+    assert ResponseCache(db_path=db_path, ttl=60).get("shared") == "kept"
+
+
+def test_single_flight_shares_result():
+    cache = ResponseCache(db_path="")
+    future, leader = cache.begin("k")
+    other, follower_leads = cache.begin("k")
+    assert leader and not follower_leads and other is future
+    cache.complete("k", "text")
+    assert future.result(timeout=1) == "text"
+    assert cache.get("k") == "text"
+
+
+def test_failed_generation_is_not_cached():
+    cache = ResponseCache(db_path="")
+    future, _ = cache.begin("k")
+    cache.fail("k", RuntimeError("partial"))
+    assert isinstance(future.exception(timeout=1), RuntimeError)
+    assert cache.get("k") is None
@@ -0,0 +1,108 @@
+import time
+
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    ChatMessage,
+    HumanMessage,
+    HumanMessageChunk,
+    SystemMessage,
+)
+
+from agents.session_history import CompactChatMessageHistory, MessageRecord, SessionStore
+
+
+def test_record_round_trip():
+    for message in (HumanMessage(content="hi"), AIMessage(content="hello"), SystemMessage(content="sys")):
+        restored = MessageRecord.from_message(message).to_message()
+        assert type(restored) is type(message)
+        assert restored.content == message.content
+
+
+def test_streamed_chunk_is_stored_as_base_role():
+    # 流式回复合并后是 AIMessageChunk，应按 "ai" 保存并还原为 AIMessage
+    chunk = AIMessageChunk(content="par") + AIMessageChunk(content="tial")
+    record = MessageRecord.from_message(chunk)
+    assert record.role == "ai"
+    restored = record.to_message()
+    assert type(restored) is AIMessage
+    assert restored.content == "partial"
+
+    assert MessageRecord.from_message(HumanMessageChunk(content="q")).role == "human"
+
+
+def test_chat_message_keeps_custom_role():
+    record = MessageRecord.from_message(ChatMessage(role="critic", content="ok"))
+    assert record.role == "critic"
+    restored = record.to_message()
+    assert isinstance(restored, ChatMessage) and restored.role == "critic"
+
+
+def test_history_restores_messages():
+    history = CompactChatMessageHistory("s1")
+    history.add_messages([HumanMessage(content="q"), AIMessageChunk(content="a")])
+    assert [type(m) for m in history.messages] == [HumanMessage, AIMessage]
+    assert history.size > 0
+    history.clear()
+    assert history.messages == [] and history.size == 0
+
+
+def test_store_evicts_least_recently_used():
+    store = SessionStore(max_sessions=2, max_bytes=1 << 20, ttl=3600)
+    first = store.get("a")
+    store.get("b")
+    assert store.get("a") is first  # a 变为最近使用
+    store.get("c")
+    assert "b" not in store
+    assert "a" in store and "c" in store
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    from agents.sqlite_history import SQLiteSessionStore
+
+    store = SQLiteSessionStore(db_path=str(tmp_path / "history.sqlite3"))
+    store.get("a").add_messages([HumanMessage(content="q"), AIMessageChunk(content="a")])
+    store.get("b").add_messages([HumanMessage(content="other")])
+    store.pop("a")  # 从内存淘汰，再次访问时从磁盘加载
+
+    history = store.get("a")
+    assert [(type(m), m.content) for m in history.messages] == [(HumanMessage, "q"), (AIMessage, "a")]
+    store.writer.flush()
+    assert store.read_rows("b") == [("human", "other", 0)]
+
+
+def test_sqlite_prune_keeps_live_and_recent_sessions(tmp_path):
+    from agents.sqlite_history import SQLiteSessionStore
+
+    store = SQLiteSessionStore(db_path=str(tmp_path / "history.sqlite3"))
+    for session_id in ("old", "live", "recent"):
+        store.get(session_id).add_messages([HumanMessage(content=session_id)])
+        store.writer.flush(session_id)
+
+    store.writer.prune(time.time() + 1, 0, ["live"])  # 全部过期，只保留仍在内存中的会话
+    store.writer.flush()
+    assert store.read_rows("old") == [] and store.read_rows("recent") == []
+    assert store.read_rows("live") == [("human", "live", 0)]
+
+    store.get("newer").add_messages([HumanMessage(content="newer")])
+    store.writer.prune(None, 1, [])  # 只保留最近写入的一个会话
+    store.writer.flush()
+    assert store.read_rows("live") == []
+    assert store.read_rows("newer") == [("human", "newer", 0)]
+
+
+def test_sqlite_store_persists_rolling_summary(tmp_path):
+    from agents.sqlite_history import DB_TTL, SQLiteSessionStore
+
+    assert DB_TTL >= 7 * 24 * 3600  # 磁盘上的会话远比内存中的会话保留得久
+    store = SQLiteSessionStore(db_path=str(tmp_path / "history.sqlite3"))
+    history = store.get("a")
+    history.add_messages([HumanMessage(content="q1"), AIMessage(content="a1"), HumanMessage(content="q2")])
+    history.set_summary("earlier", 2)
+    store.pop("a")
+
+    reloaded = store.get("a")
+    assert (reloaded.summary, reloaded.summarized_upto) == ("earlier", 2)
+    reloaded.clear()
+    store.writer.flush()
+    assert store.read_summary("a") is None
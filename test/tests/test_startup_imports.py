@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def test_startup_modules_do_not_import_langchain():
+    # 启动阶段就会导入的模块不应拉入 LangChain（在新进程中检查，不受其他测试已导入的模块影响）
+    code = (
+        "import sys\n"
+        "import agents.deadlines, agents.model_lifecycle, agents.model_routing, agents.admission\n"
+        "print(sorted(m for m in sys.modules if m.startswith('langchain')))\n"
+    )
+    env = dict(os.environ, TIRO_LOG_FILE="", PYTHONPATH=os.pathsep.join([SRC] + sys.path))
+    result = subprocess.run([sys.executable, "-c", code], cwd=SRC, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "[]"  # 之前的输出为启动日志
@@ -0,0 +1,78 @@
+import json
+
+from agents.vocab_cards import CardStreamParser, format_card, parse_card
+
+CARDS = [
+    {"word": "achieve", "ipa": "/əˈtʃiːv/", "pos": "v.", "meaning": "实现",
+     "example": "She achieved {her goal}.", "translation": "她实现了\"目标\"。"},
+    {"word": "benefit", "ipa": "/ˈbenɪfɪt/", "pos": "n.", "meaning": "益处",
+     "example": "Reading has many benefits.", "translation": "阅读有很多益处。"},
+]
+
+
+def test_parser_emits_each_card_as_soon_as_it_closes():
+    text = json.dumps(CARDS, ensure_ascii=False, indent=1)
+    parser = CardStreamParser()
+    emitted = []
+    for char in text:  # 逐字符输入，模拟最碎的流式切分
+        for raw in parser.feed(char):
+            emitted.append((len(parser.text), raw))
+    assert [json.loads(raw) for _, raw in emitted] == CARDS
+    assert emitted[0][0] < len(text)  # 第一张卡片在整个数组结束前就已产出
+    assert parser.objects_seen == 2
+
+
+def test_parser_ignores_braces_inside_strings_and_nested_objects():
+    parser = CardStreamParser()
+    raw = '[{"word": "x}", "extra": {"a": [1, 2]}, "note": "\\"}"}]'
+    assert parser.feed(raw) == [raw[1:-1]]
+
+
+def test_parse_card_repairs_common_mistakes():
+    card, error = parse_card('好的：{“word”: “use”, "Phonetic": "[juːz]", "part_of_speech": "v.", '
+                             '"definition": "使用", "example": "I use it.", "translation": "我用它。",}')
+    assert error == ""
+    assert card["word"] == "use" and card["ipa"] == "juːz" and card["pos"] == "v." and card["meaning"] == "使用"
+
+
+def test_parse_card_reports_missing_fields():
+    card, error = parse_card('{"word": "use", "ipa": "/juːz/"}')
+    assert card is None and "pos" in error
+    assert parse_card("no json here") == (None, "缺少 JSON 对象")
+
+
+def test_format_card_matches_display_format():
+    line = format_card(parse_card(json.dumps(CARDS[1], ensure_ascii=False))[0])
+    assert line.startswith("benefit - ") and "例句：Reading has many benefits." in line
+
+
+def _stream(cards, broken=""):
+    items = [json.dumps(card, ensure_ascii=False) for card in cards] + ([broken] if broken else [])
+    return "[" + ", ".join(items) + "]"
+
+
+def test_missing_and_broken_cards_are_repaired_in_one_call(fake):
+    from agents.vocab_agent import VocabAgent
+
+    broken = '{"word": "curious", "ipa": "/ˈkjʊəriəs/"}'
+    lines = list(VocabAgent().stream_cards(iter(_stream(CARDS, broken)), 5))
+    assert len(lines) == 5 and len({line.split(" - ")[0] for line in lines}) == 5
+    assert fake.requests == 1
+    prompt = fake.last_request["messages"][-1]["content"]
+    assert "生成3个" in prompt and "achieve, benefit" in prompt and broken in prompt
+
+
+def test_repair_stops_when_no_new_cards_arrive(fake):
+    import asyncio
+    from agents.vocab_agent import VocabAgent
+    from fake_ollama import _WORDS, _card
+
+    async def deltas():
+        yield _stream([_card(*word) for word in _WORDS])
+
+    async def collect():
+        return [line async for line in VocabAgent().astream_cards(deltas(), len(_WORDS) + 2)]
+
+    # 替身的词表已全部用完，补齐调用没有新单词，不再继续重试
+    assert len(asyncio.run(collect())) == len(_WORDS)
+    assert fake.requests == 1
@@ -0,0 +1,54 @@
+from agents.vocab_matcher import ADJECTIVE, NOUN, VERB, VocabMatcher, inflections, pos_classes, tokenize
+
+
+def test_pos_classes():
+    assert pos_classes("n.") == {NOUN}
+    assert pos_classes("vt.") == {VERB}
+    assert pos_classes("adj./adv.") == {ADJECTIVE, "adverb"}
+    assert pos_classes("形容词") == {ADJECTIVE}
+    assert pos_classes("") == set()
+
+
+def test_verb_forms():
+    assert {"uses", "used", "using"} <= inflections("use", {VERB})
+    assert {"studies", "studied", "studying"} <= inflections("study", {VERB})
+    assert {"stopped", "stopping"} <= inflections("stop", {VERB})
+    assert {"saw", "seen", "seeing"} <= inflections("see", {VERB})
+    assert "dying" in inflections("die", {VERB})
+
+
+def test_no_overgeneration_for_nouns_and_verbs():
+    assert not {"seed", "seer", "seest"} & inflections("see", {VERB})
+    assert not {"user", "usest", "usely"} & inflections("use", {VERB})
+    assert not {"childs", "childer"} & inflections("child", {NOUN})
+    # 词性未知时按名词与动词处理，不生成比较级与副词
+    assert not {"user", "usely"} & inflections("use")
+
+
+def test_adjective_forms():
+    assert {"happier", "happiest", "happily"} <= inflections("happy", {ADJECTIVE})
+    assert {"bigger", "biggest"} <= inflections("big", {ADJECTIVE})
+    assert {"nicer", "nicest", "nicely"} <= inflections("nice", {ADJECTIVE})
+    assert "gently" in inflections("gentle", {ADJECTIVE})
+    assert {"better", "best"} <= inflections("good", {ADJECTIVE})
+    assert "gooder" not in inflections("good", {ADJECTIVE})
+
+
+def test_noun_plurals():
+    assert "leaves" in inflections("leaf", {NOUN})
+    assert "knives" in inflections("knife", {NOUN})
+    assert "boxes" in inflections("box", {NOUN})
+    assert "children" in inflections("child", {NOUN})
+
+
+def test_matcher_counts_whole_tokens_and_phrases():
+    matcher = VocabMatcher(["use", "take care of", "happy"], {"use": "v.", "take care of": "phr.", "happy": "adj."})
+    assert matcher.feed("Because I was happier, I used it.") == ["happy", "use"]
+    assert matcher.feed("She takes care of the user.") == ["take care of"]
+    assert matcher.counts["use"] == 1  # "user" 不算 use 的用法
+    assert matcher.unused_words() == []
+    assert matcher.score() == 100.0
+
+
+def test_tokenize_lowercases():
+    assert tokenize("Hello, World!") == ["hello", "world"]